@@ -0,0 +1,119 @@
+"""
+组件注册表 - 从已索引的文件中发现组件，在内存中缓存组件指南
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from document_processor import DocumentProcessor
+from generations import current_generation
+from manifest import IndexManifest
+
+
+class ComponentRegistry:
+    """
+    组件指南注册表
+
+    组件集合取自索引清单中组件目录下的文件（尚未构建索引时扫描组件目录），组件名为文件名（不含扩展名）。
+    清单或目录变化时重新发现组件；指南内容缓存在内存中，文件修改时间或大小变化时重新读取。
+    """
+
+    def __init__(self, components_dir: Path, manifest_path: Optional[Path] = None):
+        """
+        初始化组件注册表
+
+        Args:
+            components_dir: 组件文档目录
+            manifest_path: 索引清单路径，None 表示跟随当前索引代的清单
+        """
+        self.components_dir = Path(components_dir)
+        self._manifest_path = Path(manifest_path) if manifest_path else None
+        self._signature: Optional[Tuple] = None
+        self._paths: Dict[str, Path] = {}
+        # 组件名 -> (修改时间, 大小, 内容)
+        self._guides: Dict[str, Tuple[int, int, str]] = {}
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self._manifest_path or current_generation().manifest_path
+
+    def refresh(self) -> bool:
+        """
+        清单或组件目录变化时重新发现组件
+
+        Returns:
+            组件集合被重新发现时返回True
+        """
+        manifest_path = self.manifest_path
+        signature = (manifest_path, self._mtime(manifest_path), self._mtime(self.components_dir))
+        if signature == self._signature:
+            return False
+
+        prefix = f"{self.components_dir.name}/"
+        indexed = [
+            self.components_dir.parent / rel_path
+            for rel_path in IndexManifest(manifest_path).paths() if rel_path.startswith(prefix)
+        ]
+        if not indexed and self.components_dir.exists():
+            indexed = DocumentProcessor().iter_source_files(self.components_dir)
+
+        paths = {}
+        for path in sorted(indexed):
+            if path.is_file():
+                paths.setdefault(path.stem, path)
+
+        self._signature = signature
+        self._paths = paths
+        self._guides = {name: guide for name, guide in self._guides.items() if name in paths}
+        return True
+
+    def names(self) -> List[str]:
+        """已发现的组件名"""
+        self.refresh()
+        return sorted(self._paths)
+
+    def resolve(self, component: str) -> Optional[str]:
+        """将组件名规范为注册表中的名称（不区分大小写），未找到时返回None"""
+        self.refresh()
+        if component in self._paths:
+            return component
+        lowered = component.lower()
+        return next((name for name in self._paths if name.lower() == lowered), None)
+
+    def get(self, component: str) -> Optional[str]:
+        """
+        获取组件指南内容
+
+        Args:
+            component: 组件名
+
+        Returns:
+            指南内容，组件不存在时返回None
+        """
+        name = self.resolve(component)
+        if name is None:
+            return None
+
+        path = self._paths[name]
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._guides.pop(name, None)
+            return None
+
+        guide = self._guides.get(name)
+        if guide is None or guide[:2] != (stat.st_mtime_ns, stat.st_size):
+            guide = (stat.st_mtime_ns, stat.st_size, path.read_text(encoding='utf-8'))
+            self._guides[name] = guide
+        return guide[2]
+
+    def path(self, component: str) -> Optional[Path]:
+        """组件指南的文件路径"""
+        name = self.resolve(component)
+        return self._paths[name] if name else None
@@ -0,0 +1,143 @@
+"""
+核心架构摘要 - 按章节拆分 core/ 文档，生成带 ETag 的有界摘要并缓存
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import CORE_DIGEST_MAX_CHARS
+from document_processor import DocumentProcessor, SECTION_PATH_SEPARATOR
+
+
+class CoreDigest:
+    """
+    核心架构文档摘要
+
+    文档按markdown标题拆分为章节，章节路径形如 “Architecture.md > 核心分层结构 > Activity 层”。
+    摘要按文档顺序放入完整章节直至字符上限，放不下的章节只列出路径。
+    文件修改时间或大小变化时重新拆分，同一（章节选择, 字符上限）的摘要只生成一次。
+    """
+
+    def __init__(self, core_dir: Path, max_chars: int = CORE_DIGEST_MAX_CHARS):
+        """
+        初始化核心架构摘要
+
+        Args:
+            core_dir: 核心文档目录
+            max_chars: 默认的摘要字符上限
+        """
+        self.core_dir = Path(core_dir)
+        self.max_chars = max_chars
+        self.version = ""
+        self._signature: Optional[Tuple] = None
+        self._sections: List[Dict[str, str]] = []
+        self._cache: Dict[Tuple, Tuple[str, str]] = {}
+
+    def _source_files(self) -> List[Path]:
+        """核心文档目录下支持的文档文件"""
+        if not self.core_dir.exists():
+            return []
+        return sorted(
+            path for path in self.core_dir.iterdir()
+            if path.is_file() and DocumentProcessor.is_source_file(path)
+        )
+
+    def refresh(self) -> bool:
+        """
+        检查文档是否变化，变化时重新拆分章节并清空摘要缓存
+
+        Returns:
+            文档发生变化时返回True
+        """
+        files = self._source_files()
+        signature = tuple((path.name, path.stat().st_mtime_ns, path.stat().st_size) for path in files)
+        if signature == self._signature:
+            return False
+
+        sections = []
+        version = hashlib.sha1()
+        for path in files:
+            content = path.read_text(encoding='utf-8')
+            version.update(path.name.encode('utf-8') + b'\0' + content.encode('utf-8'))
+            sections.extend(self._split_sections(path.name, content))
+
+        self._signature = signature
+        self._sections = sections
+        self.version = version.hexdigest()[:12]
+        self._cache = {}
+        return True
+
+    @staticmethod
+    def _split_sections(filename: str, content: str) -> List[Dict[str, str]]:
+        """按标题拆分文档，每个章节只包含到下一个标题之前的正文（子章节单独成节）"""
+        headings = DocumentProcessor._heading_index(content)
+        starts = [0] + [offset for offset, _, _ in headings if offset > 0]
+        sections = []
+        for start, end in zip(starts, starts[1:] + [len(content)]):
+            text = content[start:end].strip()
+            if not text:
+                continue
+            # 第一个标题之前的内容没有章节路径，以文件名标识
+            section_path = DocumentProcessor._section_path(headings, start)
+            sections.append({
+                'path': SECTION_PATH_SEPARATOR.join(part for part in (filename, section_path) if part),
+                'text': text,
+            })
+        return sections
+
+    def section_paths(self) -> List[str]:
+        """所有章节的路径"""
+        self.refresh()
+        return [section['path'] for section in self._sections]
+
+    def render(self, sections: Optional[Sequence[str]] = None,
+               max_chars: Optional[int] = None) -> Tuple[str, str]:
+        """
+        生成摘要
+
+        Args:
+            sections: 章节选择，按章节路径做不区分大小写的子串匹配（匹配父章节时包含其子章节），
+                None 或空表示全部章节
+            max_chars: 正文字符上限，None 使用默认值
+
+        Returns:
+            (摘要文本, ETag)，ETag 由摘要正文计算，内容不变时保持不变
+        """
+        self.refresh()
+        max_chars = max_chars or self.max_chars
+        selectors = tuple(sorted({selector.strip().lower() for selector in sections or () if selector.strip()}))
+        key = (selectors, max_chars)
+        if key in self._cache:
+            return self._cache[key]
+
+        selected = [
+            section for section in self._sections
+            if not selectors or any(selector in section['path'].lower() for selector in selectors)
+        ]
+
+        parts = []
+        omitted = []
+        used = 0
+        for section in selected:
+            block = f"<!-- {section['path']} -->\n{section['text']}\n\n"
+            if used + len(block) > max_chars:
+                omitted.append(section['path'])
+                continue
+            parts.append(block)
+            used += len(block)
+
+        if omitted:
+            parts.append(
+                f"---\n⚠️ 以下 {len(omitted)} 个章节超出 {max_chars} 字符上限未返回，"
+                f"可通过 sections 参数指定章节获取：\n" + "\n".join(f"- {path}" for path in omitted) + "\n"
+            )
+        if not selected:
+            parts.append(f"⚠️ 没有与 {', '.join(selectors)} 匹配的章节，可选章节：\n"
+                         + "\n".join(f"- {section['path']}" for section in self._sections) + "\n")
+
+        body = "".join(parts)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+        text = f"## 核心架构规范 (版本: {self.version}, ETag: {etag})\n\n{body}"
+        self._cache[key] = (text, etag)
+        return self._cache[key]
+
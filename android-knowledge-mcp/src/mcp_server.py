@@ -6,7 +6,9 @@ Android知识库MCP服务器
 
 import sys
 import asyncio
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -20,7 +22,16 @@ import mcp.types as types
 # 导入现有RAG系统
 sys.path.append(str(Path(__file__).parent.parent.parent / "android-knowledge-rag" / "src"))
 from vector_store import VectorStore
-from config import KNOWLEDGE_DIR
+from search_filters import SearchFilter
+from metrics import metrics
+from config import (
+    KNOWLEDGE_DIRS, CORE_DIGEST_MAX_CHARS, SEARCH_MAX_WORKERS, SEARCH_TIMEOUT_SECONDS, SEARCH_MODES, DEFAULT_SEARCH_MODE,
+    WATCH_ENABLED, MCP_RESPONSE_MAX_TOKENS, COMPONENT_GUIDE_MAX_TOKENS
+)
+from document_processor import DocumentProcessor
+from core_digest import CoreDigest
+from component_registry import ComponentRegistry
+from response_builder import ResponseBuilder, SourceFiles
 
 class AndroidKnowledgeMCPServer:
     """Android知识库MCP服务器"""
@@ -28,16 +39,39 @@ class AndroidKnowledgeMCPServer:
     def __init__(self):
         self.server = Server("android-knowledge-rag")
         self.vector_store: Optional[VectorStore] = None
-        self.core_knowledge_cache: Dict[str, str] = {}
+        self.core_digest = CoreDigest(KNOWLEDGE_DIRS["core"])
+        self.component_registry = ComponentRegistry(KNOWLEDGE_DIRS["components"])
+        # 检索结果所在文件的内容缓存，组装响应时用于合并相邻分块
+        self.source_files = SourceFiles(KNOWLEDGE_DIRS)
+        # 检索在线程池中执行，避免同步的嵌入和HNSW查询阻塞事件循环
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=SEARCH_MAX_WORKERS,
+            thread_name_prefix="knowledge-search"
+        )
+        self.watcher = None
         
-    async def initialize(self):
-        """初始化服务器和RAG系统"""
+    async def initialize(self, watch: bool = WATCH_ENABLED):
+        """
+        初始化服务器和RAG系统
+
+        Args:
+            watch: 是否监听知识库目录，文档变化时在后台增量更新索引（检索不中断）
+        """
         try:
-            # 初始化向量存储
-            self.vector_store = VectorStore()
+            # 初始化向量存储（标准输出被MCP协议占用，日志写入标准错误）
+            self.vector_store = VectorStore(output=sys.stderr)
+
+            # 嵌入模型延迟加载，服务启动时预热，避免首次检索付出模型加载开销
+            await asyncio.get_running_loop().run_in_executor(
+                self.search_executor, self.vector_store.embedding_function.load
+            )
             
-            # 预加载核心架构知识
+            # 预加载核心架构知识和组件指南
             await self._preload_core_knowledge()
+            self._preload_component_guides()
+
+            if watch:
+                self._start_watcher()
             
             print("✅ Android知识库MCP服务器初始化成功", file=sys.stderr)
             
@@ -46,22 +80,76 @@ class AndroidKnowledgeMCPServer:
             raise
     
     async def _preload_core_knowledge(self):
-        """预加载核心架构知识到缓存"""
-        core_files = [
-            "core/Architecture.md",
-            "core/KotlinCodeRules.md"
-        ]
-        
-        for file_path in core_files:
-            try:
-                full_path = Path(__file__).parent.parent.parent / file_path
-                if full_path.exists():
-                    content = full_path.read_text(encoding='utf-8')
-                    self.core_knowledge_cache[file_path] = content
-                    print(f"✅ 已缓存核心知识: {file_path}", file=sys.stderr)
-            except Exception as e:
-                print(f"❌ 缓存失败 {file_path}: {e}", file=sys.stderr)
+        """预先拆分核心架构文档并生成默认摘要"""
+        try:
+            _, etag = self.core_digest.render()
+            print(f"✅ 已缓存核心知识: {len(self.core_digest.section_paths())} 个章节 (ETag: {etag})", file=sys.stderr)
+        except Exception as e:
+            print(f"❌ 缓存核心知识失败: {e}", file=sys.stderr)
     
+    def _preload_component_guides(self):
+        """发现组件并将组件指南读入内存"""
+        names = self.component_registry.names()
+        for name in names:
+            self.component_registry.get(name)
+        print(f"✅ 已缓存组件指南: {', '.join(names) or '无'}", file=sys.stderr)
+
+    def _start_watcher(self):
+        """在后台线程中监听知识库目录（标准输出被MCP协议占用，同步日志写入标准错误）"""
+        from indexer import describe_sync
+        from watcher import create_index_watcher
+
+        self.watcher = create_index_watcher(
+            self.vector_store,
+            output=sys.stderr,
+            on_synced=lambda summary: print(f"🔄 知识库索引已同步: {describe_sync(summary)}", file=sys.stderr)
+        )
+        self.watcher.start()
+        print(f"👀 正在监听知识库变化: {', '.join(str(path) for path in self.watcher.directories)}", file=sys.stderr)
+
+    async def _search(self, query: str, top_k: int, where: Optional[SearchFilter] = None,
+                      mode: str = DEFAULT_SEARCH_MODE) -> List[Dict[str, Any]]:
+        """
+        在线程池中执行向量检索，带超时控制
+
+        超时或调用被取消时，尚未开始执行的检索任务会从线程池队列中撤销。
+        检索在当前上下文的副本中执行，分阶段耗时计入当前请求的指标。
+
+        Args:
+            query: 查询字符串
+            top_k: 返回结果数量
+            where: 检索过滤条件
+            mode: 检索模式
+
+        Returns:
+            搜索结果列表
+
+        Raises:
+            asyncio.TimeoutError: 检索超过 SEARCH_TIMEOUT_SECONDS
+        """
+        context = contextvars.copy_context()
+        future = self.search_executor.submit(context.run, self.vector_store.search, query, top_k, where, mode)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=SEARCH_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            metrics.incr('mcp.search_timeouts')
+            raise
+        finally:
+            future.cancel()
+
+    @staticmethod
+    def _record_response(builder: ResponseBuilder):
+        """记录检索结果原文和实际返回内容的token数"""
+        metrics.incr('mcp.response.source_tokens', builder.source_tokens)
+        metrics.incr('mcp.response.tokens', builder.tokens)
+
+    def shutdown(self):
+        """停止知识库监听，关闭检索线程池"""
+        if self.watcher:
+            self.watcher.stop(timeout=5)
+        self.search_executor.shutdown(wait=False, cancel_futures=True)
+        metrics.maybe_export(force=True)
+
     def setup_handlers(self):
         """设置MCP处理器"""
         
@@ -71,10 +159,27 @@ class AndroidKnowledgeMCPServer:
             return [
                 types.Tool(
                     name="search_core_architecture",
-                    description="查询Android核心架构规范和Kotlin编码规则（每次Android编码必查）",
+                    description="查询Android核心架构规范和Kotlin编码规则（每次Android编码必查）。"
+                                "返回带 ETag 的摘要，内容未变化时传入 if_none_match 可跳过重复获取",
                     inputSchema={
                         "type": "object",
-                        "properties": {},
+                        "properties": {
+                            "sections": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "只返回标题路径包含这些关键词的章节（含子章节），如 [\"ViewModel 层\", \"编码规则\"]，默认全部"
+                            },
+                            "max_chars": {
+                                "type": "integer",
+                                "minimum": 500,
+                                "default": CORE_DIGEST_MAX_CHARS,
+                                "description": "返回内容的最大字符数，超出的章节只列出标题"
+                            },
+                            "if_none_match": {
+                                "type": "string",
+                                "description": "上次返回的 ETag，内容未变化时只返回确认信息"
+                            }
+                        },
                         "additionalProperties": False
                     }
                 ),
@@ -86,12 +191,18 @@ class AndroidKnowledgeMCPServer:
                         "properties": {
                             "component_type": {
                                 "type": "string",
-                                "enum": ["ViewModel", "Activity", "LiveData", "KotlinFlow", "UI"],
+                                "enum": self.component_registry.names(),
                                 "description": "组件类型"
                             },
                             "query": {
                                 "type": "string",
-                                "description": "具体查询内容（可选）"
+                                "description": "具体查询内容（可选），指定时优先返回相关章节"
+                            },
+                            "max_tokens": {
+                                "type": "integer",
+                                "minimum": 200,
+                                "description": f"返回内容的token预算，默认不带 query 时 {COMPONENT_GUIDE_MAX_TOKENS}、"
+                                               f"带 query 时 {MCP_RESPONSE_MAX_TOKENS}，超出的章节只列出标题"
                             }
                         },
                         "required": ["component_type"],
@@ -120,6 +231,18 @@ class AndroidKnowledgeMCPServer:
                                 "enum": ["core", "components", "all"],
                                 "default": "all",
                                 "description": "过滤类型"
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": list(SEARCH_MODES),
+                                "default": DEFAULT_SEARCH_MODE,
+                                "description": "检索模式：vector 语义检索，lexical 关键词(BM25)检索，hybrid 两者融合（API名称等精确词推荐）"
+                            },
+                            "max_tokens": {
+                                "type": "integer",
+                                "minimum": 200,
+                                "default": MCP_RESPONSE_MAX_TOKENS,
+                                "description": "返回内容的token预算，同一文件的相邻结果合并，超出预算的结果只返回与查询相关的段落"
                             }
                         },
                         "required": ["query"],
@@ -132,66 +255,65 @@ class AndroidKnowledgeMCPServer:
         async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
             """处理工具调用"""
             try:
-                if name == "search_core_architecture":
-                    return await self._handle_core_architecture_search()
-                elif name == "search_component_guide":
-                    return await self._handle_component_guide_search(arguments)
-                elif name == "search_knowledge":
-                    return await self._handle_knowledge_search(arguments)
-                else:
-                    raise ValueError(f"未知工具: {name}")
+                with metrics.request(name):
+                    if name == "search_core_architecture":
+                        return await self._handle_core_architecture_search(arguments)
+                    elif name == "search_component_guide":
+                        return await self._handle_component_guide_search(arguments)
+                    elif name == "search_knowledge":
+                        return await self._handle_knowledge_search(arguments)
+                    else:
+                        raise ValueError(f"未知工具: {name}")
                     
             except Exception as e:
+                metrics.incr('mcp.errors')
                 return [types.TextContent(
                     type="text",
                     text=f"工具调用失败: {str(e)}"
                 )]
     
-    async def _handle_core_architecture_search(self) -> list[types.TextContent]:
-        """处理核心架构查询"""
-        result_parts = []
-        
-        # 从缓存获取核心知识
-        for file_path, content in self.core_knowledge_cache.items():
-            result_parts.append(f"## {file_path}\n\n{content}\n\n")
-        
-        if not result_parts:
-            result_parts.append("⚠️ 核心架构知识未找到，请检查文件是否存在")
+    async def _handle_core_architecture_search(self, arguments: Optional[dict] = None) -> list[types.TextContent]:
+        """处理核心架构查询（按章节选择，返回缓存的有界摘要）"""
+        arguments = arguments or {}
+        text, etag = self.core_digest.render(arguments.get("sections"), arguments.get("max_chars"))
+
+        if not self.core_digest.section_paths():
+            text = "⚠️ 核心架构知识未找到，请检查文件是否存在"
+        elif arguments.get("if_none_match") == etag:
+            text = f"✅ 核心架构规范未变化 (ETag: {etag})，请沿用之前获取的内容"
         
         return [types.TextContent(
             type="text", 
-            text="".join(result_parts)
+            text=text
         )]
     
     async def _handle_component_guide_search(self, arguments: dict) -> list[types.TextContent]:
-        """处理组件指南查询"""
+        """处理组件指南查询（按token预算返回指南，带 query 时相关章节优先）"""
         component_type = arguments["component_type"]
         query = arguments.get("query", "")
-        
-        # 构建组件文件路径
-        component_file = f"components/{component_type}.md"
+        max_tokens = arguments.get("max_tokens") or (MCP_RESPONSE_MAX_TOKENS if query else COMPONENT_GUIDE_MAX_TOKENS)
         
         try:
-            # 直接读取组件文件
-            file_path = Path(__file__).parent.parent.parent / component_file
-            if file_path.exists():
-                content = file_path.read_text(encoding='utf-8')
+            # 从内存中的组件注册表获取指南（文件修改后自动重新读取）
+            content = self.component_registry.get(component_type)
+            if content is not None:
+                component_type = self.component_registry.resolve(component_type)
                 
-                # 如果有具体查询，使用RAG搜索相关部分
+                # 如果有具体查询，使用RAG搜索相关部分，决定指南中章节的优先级
+                search_results = []
                 if query and self.vector_store:
                     search_query = f"{component_type} {query}"
-                    search_results = self.vector_store.search(
-                        search_query, 
+                    search_results = await self._search(
+                        search_query,
                         top_k=3,
-                        where={"file_path": {"$regex": f".*{component_type}.*"}}
+                        where=SearchFilter(component=component_type)
                     )
-                    
-                    if search_results:
-                        relevant_content = "\n\n".join([
-                            f"### 相关内容 {i+1}\n{result['content']}" 
-                            for i, result in enumerate(search_results)
-                        ])
-                        content = f"{content}\n\n## 相关搜索结果\n\n{relevant_content}"
+
+                with metrics.timer('mcp.format'):
+                    builder = ResponseBuilder(query, self.source_files)
+                    _, rel_path = DocumentProcessor().locate(self.component_registry.path(component_type))
+                    content = builder.render_document(rel_path, content, search_results, max_tokens)
+                    self._record_response(builder)
                 
                 return [types.TextContent(
                     type="text",
@@ -200,10 +322,16 @@ class AndroidKnowledgeMCPServer:
             else:
                 return [types.TextContent(
                     type="text",
-                    text=f"❌ 组件指南文件未找到: {component_file}"
+                    text=f"❌ 组件指南未找到: {component_type}，可用组件: {', '.join(self.component_registry.names())}"
                 )]
                 
+        except asyncio.TimeoutError:
+            return [types.TextContent(
+                type="text",
+                text=f"⏱️ 组件指南检索超时（{SEARCH_TIMEOUT_SECONDS:g}秒），请稍后重试"
+            )]
         except Exception as e:
+            metrics.incr('mcp.errors')
             return [types.TextContent(
                 type="text",
                 text=f"❌ 查询组件指南失败: {str(e)}"
@@ -214,6 +342,7 @@ class AndroidKnowledgeMCPServer:
         query = arguments["query"]
         top_k = arguments.get("top_k", 5)
         filter_type = arguments.get("filter_type", "all")
+        mode = arguments.get("mode", DEFAULT_SEARCH_MODE)
         
         if not self.vector_store:
             return [types.TextContent(
@@ -222,18 +351,15 @@ class AndroidKnowledgeMCPServer:
             )]
         
         try:
-            # 构建过滤条件
-            where_condition = None
-            if filter_type == "core":
-                where_condition = {"file_path": {"$regex": ".*core.*"}}
-            elif filter_type == "components":
-                where_condition = {"file_path": {"$regex": ".*components.*"}}
+            # 构建过滤条件（按 scope 元数据字段精确过滤）
+            where_condition = SearchFilter.for_scope(filter_type)
             
             # 执行搜索
-            search_results = self.vector_store.search(
-                query, 
+            search_results = await self._search(
+                query,
                 top_k=top_k,
-                where=where_condition
+                where=where_condition,
+                mode=mode
             )
             
             if not search_results:
@@ -242,25 +368,24 @@ class AndroidKnowledgeMCPServer:
                     text=f"🔍 未找到与 '{query}' 相关的知识"
                 )]
             
-            # 格式化结果
-            formatted_results = []
-            for i, result in enumerate(search_results, 1):
-                metadata = result.get('metadata', {})
-                file_path = metadata.get('file_path', '未知文件')
-                distance = result.get('distance', 0)
-                
-                formatted_results.append(
-                    f"### 结果 {i} (相似度: {1-distance:.3f})\n"
-                    f"**来源**: {file_path}\n\n"
-                    f"{result['content']}\n"
-                )
+            # 组装结果：合并同一文件的相邻分块，按token预算提取相关段落
+            with metrics.timer('mcp.format'):
+                builder = ResponseBuilder(query, self.source_files)
+                text = builder.render_results(search_results, arguments.get("max_tokens") or MCP_RESPONSE_MAX_TOKENS)
+                self._record_response(builder)
             
             return [types.TextContent(
                 type="text",
-                text=f"## 搜索结果: {query}\n\n" + "\n---\n\n".join(formatted_results)
+                text=f"## 搜索结果: {query}\n\n{text}"
             )]
             
+        except asyncio.TimeoutError:
+            return [types.TextContent(
+                type="text",
+                text=f"⏱️ 知识搜索超时（{SEARCH_TIMEOUT_SECONDS:g}秒），请缩小查询范围后重试"
+            )]
         except Exception as e:
+            metrics.incr('mcp.errors')
             return [types.TextContent(
                 type="text",
                 text=f"❌ 知识搜索失败: {str(e)}"
@@ -278,19 +403,22 @@ async def main():
     mcp_server.setup_handlers()
     
     # 启动stdio服务器
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await mcp_server.server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="android-knowledge-rag",
-                server_version="1.0.0",
-                capabilities=mcp_server.server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={}
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await mcp_server.server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="android-knowledge-rag",
+                    server_version="1.0.0",
+                    capabilities=mcp_server.server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={}
+                    )
                 )
             )
-        )
+    finally:
+        mcp_server.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
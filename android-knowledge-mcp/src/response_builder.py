@@ -0,0 +1,446 @@
+"""
+响应组装 - 在token预算内组装检索结果：合并同一文件中重叠或相邻的分块、按查询提取片段、不重复返回已包含的内容
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import KNOWLEDGE_DIRS, MCP_MERGE_GAP_TOKENS, MCP_SNIPPET_MIN_TOKENS
+from document_processor import DocumentProcessor, SECTION_PATH_SEPARATOR, estimate_tokens
+from lexical_index import tokenize
+
+# 片段之间省略内容的标记
+ELLIPSIS = "…"
+# 拆开的代码块片段补全的起止标记
+CODE_FENCE = "```"
+
+
+class SourceFiles:
+    """
+    检索结果的源文件内容缓存，用于定位分块在原文中的位置
+
+    内容与分块时一致（去除首尾空白），章节分块的 char_start/char_end 即为该内容中的位置。
+    文件修改时间或大小变化时重新读取，无法按文本读取的文件（如PDF）返回None。
+    """
+
+    def __init__(self, roots: Optional[Dict[str, Path]] = None):
+        """
+        Args:
+            roots: 范围标签 -> 知识库根目录，None 使用配置的 KNOWLEDGE_DIRS
+        """
+        self.roots = {scope: Path(root) for scope, root in (roots or KNOWLEDGE_DIRS).items()}
+        # 相对路径 -> (修改时间, 大小, 内容)
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+
+    def get(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        读取分块所在文件的内容
+
+        Args:
+            metadata: 分块元数据（使用 scope 和 file_path）
+
+        Returns:
+            文件内容，文件不存在或无法读取时返回None
+        """
+        rel_path = metadata.get('file_path')
+        root = self.roots.get(metadata.get('scope'))
+        if not rel_path or root is None:
+            return None
+
+        path = root.parent / rel_path
+        try:
+            stat = path.stat()
+        except OSError:
+            self._files.pop(rel_path, None)
+            return None
+
+        cached = self._files.get(rel_path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            try:
+                cached = (stat.st_mtime_ns, stat.st_size, path.read_text(encoding='utf-8').strip())
+            except (OSError, UnicodeDecodeError):
+                return None
+            self._files[rel_path] = cached
+        return cached[2]
+
+
+def format_relevance(result: Dict[str, Any]) -> str:
+    """结果的相关度说明：向量结果为相似度，词法结果为关键词得分"""
+    similarity = result.get('similarity')
+    if similarity is not None:
+        return f"相似度: {similarity:.3f}"
+    return f"关键词得分: {result.get('score', 0):.3f}"
+
+
+class ResponseBuilder:
+    """
+    在token预算内组装一次工具调用的响应
+
+    1. 定位：在源文件中找到每个分块的位置，找不到（如索引尚未同步）时作为独立片段
+    2. 合并：同一文件中重叠或间隔不超过 merge_gap_tokens 的片段连同中间内容合并为一段，
+       按其中排名最靠前的分块排序
+    3. 去重：本次响应已包含的内容（如组件指南中已返回的章节）和内容相同的片段不再返回
+    4. 分配预算：各片段平分预算，放得下的完整返回，余量分给其余片段；超出分配的片段按查询词提取相关段落。
+       预算不足以给每个片段 min_snippet_tokens 时，靠后的片段只列出来源
+    """
+
+    def __init__(self, query: str = "", sources: Optional[SourceFiles] = None,
+                 merge_gap_tokens: int = MCP_MERGE_GAP_TOKENS, min_snippet_tokens: int = MCP_SNIPPET_MIN_TOKENS):
+        """
+        初始化响应组装器
+
+        Args:
+            query: 查询字符串，用于提取相关片段
+            sources: 源文件内容缓存，None 表示新建
+            merge_gap_tokens: 合并相邻片段的最大间隔
+            min_snippet_tokens: 每个片段至少分配的token数
+        """
+        terms = set(tokenize(query))
+        # 中文单字区分度低，查询中有双字词或英文词时只用它们打分
+        self.query_terms = {term for term in terms if len(term) > 1 or term.isascii()} or terms
+        self.sources = sources or SourceFiles()
+        self.merge_gap_tokens = merge_gap_tokens
+        self.min_snippet_tokens = min_snippet_tokens
+        # 文件 -> 已返回的区间；已返回内容的规范化文本（用于无法定位的片段去重）
+        self._included: Dict[str, List[Tuple[int, int]]] = {}
+        self._included_texts: List[str] = []
+        # 逐条返回原文时的token数和实际返回正文的token数，用于统计压缩效果
+        self.source_tokens = 0
+        self.tokens = 0
+
+    # 片段定位、合并与去重
+
+    def _locate(self, result: Dict[str, Any]) -> Tuple[Optional[str], int, int]:
+        """分块在源文件中的位置，返回 (源文件内容, 起始, 结束)，无法定位时源文件内容为None"""
+        metadata = result.get('metadata') or {}
+        content = (result.get('content') or '').strip()
+        source = self.sources.get(metadata) if content else None
+        if source is None:
+            return None, 0, 0
+
+        start = metadata.get('char_start')
+        if isinstance(start, int) and source[start:metadata.get('char_end', start)].strip() == content:
+            offset = source.index(content, start)
+        else:
+            offset = source.find(content)
+        if offset < 0:
+            return None, 0, 0
+        return source, offset, offset + len(content)
+
+    def passages(self, results: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        将检索结果整理为不重复的片段
+
+        Args:
+            results: 按相关度排序的检索结果
+
+        Returns:
+            片段列表（按排名排序），每个片段包含 file_path、section_path、text、rank、result（排名最靠前的分块）、
+            chunks（合并的分块数），能在源文件中定位的片段还包含 source、start、end
+        """
+        located: Dict[str, List[Dict[str, Any]]] = {}
+        passages = []
+        for rank, result in enumerate(results):
+            metadata = result.get('metadata') or {}
+            passage = {
+                'file_path': metadata.get('file_path', '未知文件'),
+                'section_path': metadata.get('section_path', ''),
+                'rank': rank,
+                'result': result,
+                'chunks': 1,
+            }
+            source, start, end = self._locate(result)
+            if source is None:
+                passage['text'] = (result.get('content') or '').strip()
+                passages.append(passage)
+            else:
+                passage.update(source=source, start=start, end=end)
+                located.setdefault(passage['file_path'], []).append(passage)
+
+        for file_passages in located.values():
+            passages.extend(self._merge(file_passages))
+
+        unique = []
+        seen_texts = set()
+        for passage in sorted(passages, key=lambda passage: passage['rank']):
+            for piece in self._exclude_included(passage):
+                key = " ".join(piece['text'].split())
+                if key and key not in seen_texts:
+                    seen_texts.add(key)
+                    unique.append(piece)
+        return unique
+
+    def _merge(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """合并同一文件中重叠或相邻的片段"""
+        merged: List[Dict[str, Any]] = []
+        for passage in sorted(passages, key=lambda passage: passage['start']):
+            previous = merged[-1] if merged else None
+            if previous is not None and (
+                passage['start'] <= previous['end']
+                or estimate_tokens(passage['source'][previous['end']:passage['start']]) <= self.merge_gap_tokens
+            ):
+                previous['end'] = max(previous['end'], passage['end'])
+                previous['chunks'] += 1
+                if passage['rank'] < previous['rank']:
+                    previous.update(rank=passage['rank'], result=passage['result'],
+                                    section_path=passage['section_path'])
+            else:
+                merged.append(dict(passage))
+
+        for passage in merged:
+            passage['text'] = passage['source'][passage['start']:passage['end']].strip()
+        return merged
+
+    def _exclude_included(self, passage: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """去掉片段中已返回的部分，剩余部分可能被分为多段"""
+        if 'source' not in passage:
+            normalized = " ".join(passage['text'].split())
+            if any(normalized in text for text in self._included_texts):
+                return []
+            return [passage]
+
+        pieces = []
+        start = passage['start']
+        for included_start, included_end in sorted(self._included.get(passage['file_path'], [])):
+            if included_end <= start or included_start >= passage['end']:
+                continue
+            if included_start > start:
+                pieces.append((start, included_start))
+            start = max(start, included_end)
+        if start < passage['end']:
+            pieces.append((start, passage['end']))
+
+        result = []
+        for piece_start, piece_end in pieces:
+            text = passage['source'][piece_start:piece_end].strip()
+            if estimate_tokens(text) >= 1:
+                result.append({**passage, 'start': piece_start, 'end': piece_end, 'text': text})
+        return result
+
+    def _mark_included(self, passage: Dict[str, Any]):
+        """记录已返回的片段，之后的片段不再重复返回"""
+        if 'source' in passage:
+            self._included.setdefault(passage['file_path'], []).append((passage['start'], passage['end']))
+        # 无法定位的片段也可能是已返回内容的一部分，按文本包含关系去重
+        self._included_texts.append(" ".join(passage['text'].split()))
+
+    # 片段提取
+
+    def _score(self, text: str) -> int:
+        """文本包含的查询词数"""
+        return len(self.query_terms & set(tokenize(text))) if self.query_terms else 0
+
+    def snippet(self, text: str, max_tokens: int) -> str:
+        """
+        按查询提取不超过 max_tokens 的片段
+
+        文本按标题、代码块和段落拆分为单元（超出预算的单元按行拆分），包含查询词最多的单元优先，
+        得分相同时靠前的单元优先，没有单元包含查询词时从头选取；选中单元之前的标题在预算内一并返回。
+        选中的单元按原文顺序拼接，不连续处以省略号分隔。
+
+        Args:
+            text: 原文
+            max_tokens: token上限
+
+        Returns:
+            提取的片段，原文不超过上限时返回原文
+        """
+        if estimate_tokens(text) <= max_tokens:
+            return text
+
+        units = []
+        for start, end, kind in DocumentProcessor._parse_blocks(text):
+            # 超长代码块按行拆分后，记录片段是否缺少起始或结束标记；拆分时为两端补全的标记留出预算
+            units.extend(
+                (piece_start, piece_end, kind, kind == 'code' and piece_start > start, kind == 'code' and piece_end < end)
+                for piece_start, piece_end in DocumentProcessor._split_to_budget(
+                    text, start, end, max(1, max_tokens - 2 - 2 * estimate_tokens(CODE_FENCE))
+                )
+            )
+        if not units:
+            return ""
+
+        # 标题不单独入选，只随其后的内容一起返回
+        scored = sorted(
+            ((self._score(text[start:end]), index) for index, (start, end, kind, _, _) in enumerate(units) if kind != 'heading'),
+            key=lambda item: (-item[0], item[1])
+        ) or [(0, 0)]
+        # 有单元包含查询词时只取这些单元，否则从头取
+        if scored[0][0] > 0:
+            scored = [item for item in scored if item[0] > 0]
+
+        chosen = set()
+        used = 0
+
+        def take(index: int) -> bool:
+            nonlocal used
+            # 每个不连续处多一个省略号，拆开的代码块片段还要补全起止标记
+            start, end, _, missing_open, missing_close = units[index]
+            tokens = estimate_tokens(text[start:end]) + 1 + estimate_tokens(CODE_FENCE) * (missing_open + missing_close)
+            if used + tokens > max_tokens:
+                return False
+            chosen.add(index)
+            used += tokens
+            return True
+
+        for _, index in scored:
+            take(index)
+        if not chosen:
+            chosen.add(scored[0][1])
+        for index in sorted(chosen):
+            heading = index - 1
+            while heading >= 0 and heading not in chosen and units[heading][2] == 'heading' and take(heading):
+                heading -= 1
+        chosen = sorted(chosen)
+
+        spans: List[List[int]] = []
+        for index in chosen:
+            if spans and spans[-1][1] == index - 1:
+                spans[-1][1] = index
+            else:
+                spans.append([index, index])
+        parts = []
+        for first, last in spans:
+            part = text[units[first][0]:units[last][1]].strip()
+            if units[first][3]:
+                part = f"{CODE_FENCE}\n{part}"
+            if units[last][4]:
+                part += f"\n{CODE_FENCE}"
+            parts.append(part)
+        if chosen[0] > 0:
+            parts.insert(0, ELLIPSIS)
+        if chosen[-1] < len(units) - 1:
+            parts.append(ELLIPSIS)
+        return "\n\n".join(parts)
+
+    # 响应组装
+
+    def render_results(self, results: Sequence[Dict[str, Any]], max_tokens: int) -> str:
+        """
+        组装检索结果
+
+        Args:
+            results: 按相关度排序的检索结果
+            max_tokens: 正文（含每个结果的标题行）的token上限
+
+        Returns:
+            各结果以分隔线连接的markdown文本
+        """
+        self.source_tokens += sum(estimate_tokens(result.get('content') or '') for result in results)
+        passages = self.passages(results)
+        keep = min(len(passages), max(1, max_tokens // self.min_snippet_tokens))
+        selected, omitted = passages[:keep], passages[keep:]
+
+        headers = []
+        for i, passage in enumerate(selected, 1):
+            location = SECTION_PATH_SEPARATOR.join(
+                part for part in (passage['file_path'], passage['section_path']) if part
+            )
+            merged = f"，合并 {passage['chunks']} 个分块" if passage['chunks'] > 1 else ""
+            headers.append(f"### 结果 {i} ({format_relevance(passage['result'])}{merged})\n**来源**: {location}\n\n")
+
+        sizes = [estimate_tokens(header) + estimate_tokens(passage['text']) for header, passage in zip(headers, selected)]
+        blocks = []
+        for header, passage, allocation in zip(headers, selected, self._allocate(sizes, max_tokens)):
+            body = self.snippet(passage['text'], max(1, allocation - estimate_tokens(header)))
+            self._mark_included(passage)
+            self.tokens += estimate_tokens(body)
+            blocks.append(f"{header}{body}\n")
+
+        text = "\n---\n\n".join(blocks)
+        if omitted:
+            text += (f"\n---\n⚠️ 以下 {len(omitted)} 个结果超出 {max_tokens} token 预算未返回正文，"
+                     f"可增大 max_tokens 或缩小查询获取：\n")
+            text += "\n".join(
+                f"- {SECTION_PATH_SEPARATOR.join(part for part in (passage['file_path'], passage['section_path']) if part)}"
+                for passage in omitted
+            ) + "\n"
+        return text
+
+    @staticmethod
+    def _allocate(sizes: List[int], budget: int) -> List[int]:
+        """平分预算：放得下的片段取其实际大小，余量分给其余片段"""
+        allocations = list(sizes)
+        pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        remaining = budget
+        while pending:
+            share = remaining // len(pending)
+            if sizes[pending[0]] > share:
+                for i in pending:
+                    allocations[i] = share
+                break
+            remaining -= sizes[pending[0]]
+            pending.pop(0)
+        return allocations
+
+    def render_document(self, file_path: str, text: str, results: Sequence[Dict[str, Any]],
+                        max_tokens: int) -> str:
+        """
+        在预算内返回整篇文档
+
+        文档不超过预算时原样返回。否则按标题拆分为章节，与检索结果重叠的章节（按结果排名）优先，
+        其次是包含查询词的章节，其余章节按文档顺序补充；放不下的相关章节按查询提取片段，其他章节只列出标题。
+        选中的章节按文档顺序输出。返回的内容记为已包含，检索结果中与其重复的部分不会再次返回。
+
+        Args:
+            file_path: 文档的相对路径（与分块元数据的 file_path 一致）
+            text: 文档内容
+            results: 检索结果，其中属于该文档的分块决定章节的优先级
+            max_tokens: token上限
+
+        Returns:
+            文档内容或按章节选取的内容
+        """
+        text = text.strip()
+        self.source_tokens += estimate_tokens(text) + sum(
+            estimate_tokens(result.get('content') or '') for result in results
+        )
+        document = {'file_path': file_path, 'source': text, 'section_path': '', 'chunks': 1}
+        if estimate_tokens(text) <= max_tokens:
+            self._mark_included({**document, 'start': 0, 'end': len(text), 'text': text})
+            self.tokens += estimate_tokens(text)
+            return text
+
+        hits = [passage for passage in self.passages(results)
+                if passage['file_path'] == file_path and passage.get('source') == text]
+        headings = DocumentProcessor._heading_index(text)
+        starts = [0] + [offset for offset, _, _ in headings if offset > 0]
+        sections = []
+        for start, end in zip(starts, starts[1:] + [len(text)]):
+            if not text[start:end].strip():
+                continue
+            hit_ranks = [hit['rank'] for hit in hits if hit['start'] < end and hit['end'] > start]
+            score = self._score(text[start:end])
+            if hit_ranks:
+                priority = (0, min(hit_ranks))
+            elif score:
+                priority = (1, -score)
+            else:
+                priority = (2, start)
+            sections.append({
+                'start': start,
+                'end': end,
+                'path': DocumentProcessor._section_path(headings, start) or file_path,
+                'priority': priority,
+            })
+
+        used = 0
+        for section in sorted(sections, key=lambda section: section['priority']):
+            section_text = text[section['start']:section['end']].strip()
+            tokens = estimate_tokens(section_text)
+            remaining = max_tokens - used
+            if tokens <= remaining:
+                section['body'] = section_text
+            elif section['priority'][0] < 2 and remaining >= self.min_snippet_tokens:
+                section['body'] = self.snippet(section_text, remaining)
+            else:
+                continue
+            used += estimate_tokens(section['body'])
+            self._mark_included({**document, 'start': section['start'], 'end': section['end'], 'text': section_text})
+
+        self.tokens += used
+        body = "\n\n".join(section['body'] for section in sections if 'body' in section)
+        omitted = [section['path'] for section in sections if 'body' not in section]
+        if omitted:
+            body += (f"\n\n---\n⚠️ 以下 {len(omitted)} 个章节超出 {max_tokens} token 预算未返回，"
+                     f"可通过 query 指定关注点或增大 max_tokens 获取：\n" + "\n".join(f"- {path}" for path in omitted))
+        return body
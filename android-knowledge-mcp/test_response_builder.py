@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+响应组装测试脚本
+
+覆盖token预算内的片段提取（按查询词选取段落、不连续处的省略号、拆开的代码块补全标记）、
+多个结果平分预算和超出预算的结果只列出来源、同一文件相邻分块的合并，以及整篇文档返回后不再重复返回其中的分块。
+
+用法: pytest test_response_builder.py
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+sys.path.append(str(Path(__file__).parent.parent / "android-knowledge-rag" / "src"))
+
+from config import GRANULARITY_SECTION
+from document_processor import DocumentProcessor, estimate_tokens
+from response_builder import ELLIPSIS, ResponseBuilder, SourceFiles
+
+GUIDE = "# ViewModel\n\n## 作用域\n\nviewModelScope 在 ViewModel 清除时取消协程。\n\n## 状态\n\n" + "\n\n".join(
+    f"第 {i} 段：界面状态说明，与主题无关的补充内容。" for i in range(10)
+) + "\n\n用 SavedStateHandle 在进程重建后恢复状态。\n\n" + "\n\n".join(
+    f"第 {i} 段：另一些补充说明。" for i in range(10, 16)
+)
+
+CODE_GUIDE = "# 收集\n\n```kotlin\n" + "\n".join(
+    f"val value{i} = flow{i}.first()" for i in range(30)
+) + "\nlifecycleScope.launch { repeatOnLifecycle(Lifecycle.State.STARTED) { collect() } }\n" + "\n".join(
+    f"val other{i} = flow{i}.last()" for i in range(30)
+) + "\n```"
+
+
+def _write(root: Path, rel_path: str, text: str) -> Path:
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _results(root: Path, rel_path: str, text: str, budget: int = 60):
+    """将文件按章节分块，作为按文档顺序排名的检索结果"""
+    processor = DocumentProcessor(granularities=GRANULARITY_SECTION, section_token_budget=budget, workers=1,
+                                  roots={"components": root / "components"})
+    chunks = processor.process_file(_write(root, rel_path, text), text)
+    return [{'content': chunk['content'], 'metadata': chunk['metadata'], 'similarity': 0.9 - 0.01 * rank}
+            for rank, chunk in enumerate(chunks)]
+
+
+def _builder(root: Path, query: str = "", **kwargs) -> ResponseBuilder:
+    return ResponseBuilder(query, SourceFiles({"components": root / "components"}), **kwargs)
+
+
+def _blocks(text: str):
+    """响应中各结果的正文（含标题行），不含超出预算的来源列表"""
+    return text.split("\n---\n⚠️")[0].split("\n---\n\n")
+
+
+def test_snippet_within_budget_unchanged(tmp_path):
+    """原文不超过上限时原样返回"""
+    builder = _builder(tmp_path, "SavedStateHandle")
+    assert builder.snippet(GUIDE, estimate_tokens(GUIDE)) == GUIDE
+
+
+@pytest.mark.parametrize("max_tokens", [20, 40, 80])
+def test_snippet_selects_query_units(tmp_path, max_tokens):
+    """超出上限时只提取包含查询词的段落，前后省略的内容以省略号标记"""
+    snippet = _builder(tmp_path, "SavedStateHandle 进程重建").snippet(GUIDE, max_tokens)
+    assert estimate_tokens(snippet) <= max_tokens
+    parts = snippet.split("\n\n")
+    assert parts == [ELLIPSIS, "用 SavedStateHandle 在进程重建后恢复状态。", ELLIPSIS]
+
+
+@pytest.mark.parametrize("max_tokens", [30, 60, 120])
+def test_snippet_without_query_terms_takes_from_start(tmp_path, max_tokens):
+    """没有段落包含查询词时从头选取，放不下全文时末尾以省略号标记"""
+    snippet = _builder(tmp_path, "蓝牙").snippet(GUIDE, max_tokens)
+    assert estimate_tokens(snippet) <= max_tokens
+    assert "viewModelScope 在 ViewModel 清除时取消协程。" in snippet
+    assert "第 15 段" not in snippet
+    assert snippet.endswith(f"\n\n{ELLIPSIS}")
+
+
+@pytest.mark.parametrize("max_tokens", [30, 60, 100])
+def test_snippet_split_code_block_keeps_fences(tmp_path, max_tokens):
+    """超长代码块按行拆分后，提取的片段补全代码块的起止标记"""
+    assert estimate_tokens(CODE_GUIDE) > max_tokens
+    snippet = _builder(tmp_path, "repeatOnLifecycle").snippet(CODE_GUIDE, max_tokens)
+    assert estimate_tokens(snippet) <= max_tokens
+    assert "repeatOnLifecycle(Lifecycle.State.STARTED)" in snippet
+    assert snippet.startswith(ELLIPSIS) and snippet.endswith(ELLIPSIS)
+    assert len(re.findall(r"^```", snippet, re.MULTILINE)) == 2
+
+
+@pytest.mark.parametrize("max_tokens", [240, 400, 800])
+def test_render_results_within_budget(tmp_path, max_tokens):
+    """多个文件的结果平分预算，每个结果的标题行和正文合计不超过预算"""
+    results = []
+    for name in ("ViewModel", "Fragment", "Activity"):
+        text = GUIDE.replace("ViewModel", name).replace("第 ", f"{name} 第 ")
+        results.extend(_results(tmp_path, f"components/{name.lower()}/{name}.md", text, budget=10_000))
+
+    builder = _builder(tmp_path, "SavedStateHandle 进程重建")
+    text = builder.render_results(results, max_tokens)
+    blocks = _blocks(text)
+    assert len(blocks) == 3
+    assert sum(estimate_tokens(block) for block in blocks) <= max_tokens
+    assert all("SavedStateHandle" in block for block in blocks)
+    assert builder.tokens < builder.source_tokens
+    assert "⚠️" not in text
+
+
+def test_render_results_lists_omitted_sources(tmp_path):
+    """预算不足以给每个结果分配 min_snippet_tokens 时，靠后的结果只列出来源"""
+    results = []
+    for name in ("ViewModel", "Fragment", "Activity", "Service"):
+        results.extend(_results(tmp_path, f"components/{name.lower()}/{name}.md", f"# {name}\n\n{name} 的说明。\n"))
+
+    text = _builder(tmp_path, min_snippet_tokens=80).render_results(results, 170)
+    assert len(_blocks(text)) == 2
+    assert "以下 2 个结果超出 170 token 预算" in text
+    assert text.rstrip().splitlines()[-2:] == [
+        "- components/activity/Activity.md > Activity", "- components/service/Service.md > Service"
+    ]
+
+
+def test_merge_adjacent_chunks(tmp_path):
+    """同一文件中相邻的分块合并为一个结果，按排名最靠前的分块标注来源"""
+    results = _results(tmp_path, "components/viewmodel/ViewModel.md", GUIDE)
+    assert len(results) > 3
+    adjacent = [results[2], results[1]]
+
+    text = _builder(tmp_path).render_results(adjacent, 10_000)
+    assert len(_blocks(text)) == 1
+    assert "合并 2 个分块" in text
+    assert f"相似度: {results[2]['similarity']:.3f}" in text
+    merged = GUIDE[results[1]['metadata']['char_start']:results[2]['metadata']['char_end']].strip()
+    assert merged in text
+
+
+def test_render_document_excludes_returned_content(tmp_path):
+    """整篇文档放得下时原样返回，之后同一文档的分块不再重复返回"""
+    results = _results(tmp_path, "components/viewmodel/ViewModel.md", GUIDE)
+    builder = _builder(tmp_path, "SavedStateHandle")
+    assert builder.render_document("components/viewmodel/ViewModel.md", GUIDE, results, 10_000) == GUIDE
+    assert builder.render_results(results, 10_000) == ""
+
+
+def test_render_document_over_budget(tmp_path):
+    """文档超出预算时优先返回命中的章节，放不下的章节只列出标题，检索结果只返回未包含的部分"""
+    results = _results(tmp_path, "components/viewmodel/ViewModel.md", GUIDE)
+    hit = [result for result in results if "SavedStateHandle" in result['content']]
+    builder = _builder(tmp_path, "SavedStateHandle", min_snippet_tokens=10)
+
+    body = builder.render_document("components/viewmodel/ViewModel.md", GUIDE, hit, 30)
+    returned, omitted = body.split("\n\n---\n⚠️")
+    assert estimate_tokens(returned) <= 30
+    assert "用 SavedStateHandle 在进程重建后恢复状态。" in returned
+    assert omitted.splitlines()[-1] == "- ViewModel > 作用域"
+
+    text = builder.render_results(results, 10_000)
+    assert "SavedStateHandle" not in text
+    assert "viewModelScope" in text
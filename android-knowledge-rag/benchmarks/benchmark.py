@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+检索性能与质量基准测试
+
+用现有知识库文档生成指定规模的合成语料，测量：
+- 构建吞吐量（分块/秒）和峰值内存
+- VectorStore 冷启动与热启动耗时
+- 不同 top_k 和并发数下的检索延迟 p50/p95/p99
+- 标注查询集上的 recall@k
+
+每个阶段在独立进程中运行，使用独立的数据目录（ANDROID_KNOWLEDGE_DATA_DIR），
+不会影响 data/ 下的正式索引。结果写入JSON文件，可与上一次的结果对比以发现性能回退。
+
+用法:
+    python benchmarks/benchmark.py run --copies 1 --copies 10 --top-k 1 --top-k 5 --concurrency 1 --concurrency 4
+    python benchmarks/benchmark.py run --baseline benchmark_results.json -o new_results.json
+"""
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCHMARK_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "src"))
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from config import (
+    KNOWLEDGE_DIRS, EMBEDDING_MODEL, EMBEDDING_BACKEND, VECTOR_BACKEND, FLAT_INDEX_DTYPE, DEFAULT_GRANULARITY,
+    INDEX_GRANULARITIES, SEARCH_MODES, DEFAULT_SEARCH_MODE
+)
+
+console = Console()
+
+BENCHMARK_VERSION = 1
+DEFAULT_QUERIES_PATH = BENCHMARK_DIR / "queries.json"
+
+_FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+
+def generate_corpus(target_dir: Path, copies: int) -> Dict[str, Path]:
+    """
+    生成合成语料：每个知识库根目录下的文档复制 copies 份
+
+    第 k 份（k > 0）放在 copy_k 子目录中，代码块以外的每一行追加副本标记，
+    保证各副本的分块内容不同（不会命中嵌入缓存），同时保留文件名以便计算召回率。
+
+    Args:
+        target_dir: 语料目录
+        copies: 副本数
+
+    Returns:
+        范围标签 -> 语料中的根目录
+    """
+    from document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(workers=1)
+    roots = {}
+    for scope, source_dir in KNOWLEDGE_DIRS.items():
+        if not source_dir.exists():
+            continue
+        root = target_dir / scope
+        for file_path in processor.iter_source_files(source_dir):
+            rel_path = file_path.relative_to(source_dir)
+            text = file_path.read_text(encoding='utf-8')
+            for k in range(copies):
+                dest = root / (f"copy_{k:03d}" if k else "") / rel_path
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                dest.write_text(_mark_copy(text, k) if k else text, encoding='utf-8')
+        roots[scope] = root
+    return roots
+
+
+def _mark_copy(text: str, k: int) -> str:
+    """在代码块以外的非空行末尾追加副本标记"""
+    lines = []
+    in_fence = False
+    for line in text.splitlines():
+        if _FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        elif line.strip() and not in_fence:
+            line = f"{line} (副本{k})"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值百分位数"""
+    import numpy as np
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """进程（或已结束的子进程中）的峰值常驻内存，单位MB"""
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_phase(phase: str, data_dir: Path, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    在独立进程中运行一个测量阶段
+
+    Args:
+        phase: 阶段名（build 或 search）
+        data_dir: 该阶段使用的数据目录
+        params: 阶段参数
+
+    Returns:
+        阶段测量结果
+    """
+    result_path = data_dir / f"{phase}_result.json"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, ANDROID_KNOWLEDGE_DATA_DIR=str(data_dir))
+    completed = subprocess.run(
+        [sys.executable, __file__, "phase", phase, json.dumps(params), str(result_path)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    if completed.returncode != 0 or not result_path.exists():
+        raise click.ClickException(f"{phase} 阶段失败:\n{completed.stdout[-2000:]}")
+    return json.loads(result_path.read_text(encoding='utf-8'))
+
+
+def build_phase(params: Dict[str, Any]) -> Dict[str, Any]:
+    """构建索引，测量吞吐量和峰值内存（模型加载耗时单独统计）"""
+    from document_processor import DocumentProcessor
+    from indexer import KnowledgeIndexer
+    from manifest import IndexManifest
+    from vector_store import VectorStore
+
+    roots = {scope: Path(path) for scope, path in params['roots'].items()}
+    vector_store = VectorStore()
+
+    start = time.perf_counter()
+    vector_store.embedding_function.load()
+    model_load_seconds = time.perf_counter() - start
+
+    processor = DocumentProcessor(granularities=params['granularities'], workers=params['workers'], roots=roots)
+    indexer = KnowledgeIndexer(processor, vector_store, IndexManifest(vector_store.manifest_path))
+    start = time.perf_counter()
+    summary = indexer.sync(list(roots.values()))
+    seconds = time.perf_counter() - start
+
+    return {
+        'files': summary['added'],
+        'failed': summary['failed'],
+        'chunks': summary['chunks_upserted'],
+        'seconds': round(seconds, 3),
+        'chunks_per_second': round(summary['chunks_upserted'] / seconds, 1) if seconds else 0.0,
+        'model_load_seconds': round(model_load_seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_worker_rss_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+
+
+def search_phase(params: Dict[str, Any]) -> Dict[str, Any]:
+    """测量冷/热启动、检索延迟和召回率"""
+    process_start = time.perf_counter()
+    from query_cache import LRUCache
+    from vector_store import VectorStore
+
+    queries = params['queries']
+    mode = params['mode']
+    granularity = params['granularity']
+
+    def search(store, query: str, top_k: int) -> List[Dict[str, Any]]:
+        return store.search(query, top_k=top_k, mode=mode, granularity=granularity)
+
+    # 冷启动：新进程中导入模块、打开数据库、加载模型，以及第一次检索
+    vector_store = VectorStore()
+    vector_store.embedding_function.load()
+    cold_init = time.perf_counter() - process_start
+    start = time.perf_counter()
+    search(vector_store, queries[0]['query'], 5)
+    cold_first_query = time.perf_counter() - start
+
+    # 热启动：同一进程中再次创建 VectorStore（模块和嵌入模型已加载）
+    start = time.perf_counter()
+    warm_store = VectorStore()
+    warm_store.embedding_function.load()
+    warm_init = time.perf_counter() - start
+    start = time.perf_counter()
+    search(warm_store, queries[1 % len(queries)]['query'], 5)
+    warm_first_query = time.perf_counter() - start
+
+    if not params['with_cache']:
+        # 关闭查询缓存，测量的是每次都执行嵌入和检索的延迟
+        vector_store.result_cache = LRUCache(0)
+        vector_store.embedding_cache = LRUCache(0)
+
+    latency = []
+    for top_k in params['top_k']:
+        for concurrency in params['concurrency']:
+            workload = [item['query'] for item in queries] * params['repeats']
+            # 预热一轮，不计入统计
+            for item in queries:
+                search(vector_store, item['query'], top_k)
+
+            def timed(query: str) -> float:
+                start = time.perf_counter()
+                search(vector_store, query, top_k)
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                durations = [duration * 1000 for duration in executor.map(timed, workload)]
+            wall = time.perf_counter() - start
+
+            latency.append({
+                'top_k': top_k,
+                'concurrency': concurrency,
+                'queries': len(durations),
+                'p50_ms': round(percentile(durations, 50), 2),
+                'p95_ms': round(percentile(durations, 95), 2),
+                'p99_ms': round(percentile(durations, 99), 2),
+                'mean_ms': round(sum(durations) / len(durations), 2),
+                'qps': round(len(durations) / wall, 1) if wall else 0.0,
+            })
+
+    # recall@k：前k个结果所属的文件中，标注的相关文件所占比例（按 范围/文件名 匹配，副本同样计为命中）
+    recall = {}
+    for top_k in params['top_k']:
+        scores = []
+        for item in queries:
+            retrieved = {
+                f"{result['metadata'].get('scope')}/{result['metadata'].get('filename')}"
+                for result in search(vector_store, item['query'], top_k)
+            }
+            relevant = {f"{Path(path).parent.name}/{Path(path).name}" for path in item['relevant']}
+            scores.append(len(relevant & retrieved) / len(relevant))
+        recall[f"@{top_k}"] = round(sum(scores) / len(scores), 4)
+
+    return {
+        'startup': {
+            'cold_init_seconds': round(cold_init, 3),
+            'cold_first_query_ms': round(cold_first_query * 1000, 2),
+            'warm_init_seconds': round(warm_init, 3),
+            'warm_first_query_ms': round(warm_first_query * 1000, 2),
+        },
+        'latency': latency,
+        'recall': recall,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+                    recall_tolerance: float) -> List[str]:
+    """
+    与基线结果对比，找出性能或质量回退
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果
+        tolerance: 吞吐量和延迟允许的相对变化
+        recall_tolerance: 召回率允许的绝对下降
+
+    Returns:
+        回退描述列表，为空表示没有回退
+    """
+    regressions = []
+    baseline_runs = {run['copies']: run for run in baseline.get('runs', [])}
+    for run in results['runs']:
+        base = baseline_runs.get(run['copies'])
+        if base is None:
+            continue
+        label = f"copies={run['copies']}"
+
+        throughput, base_throughput = run['build']['chunks_per_second'], base['build']['chunks_per_second']
+        if throughput < base_throughput * (1 - tolerance):
+            regressions.append(f"{label} 构建吞吐量 {base_throughput} -> {throughput} 分块/秒")
+
+        base_latency = {(item['top_k'], item['concurrency']): item for item in base['latency']}
+        for item in run['latency']:
+            base_item = base_latency.get((item['top_k'], item['concurrency']))
+            if base_item and item['p95_ms'] > base_item['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f"{label} top_k={item['top_k']} concurrency={item['concurrency']} "
+                    f"p95 {base_item['p95_ms']}ms -> {item['p95_ms']}ms"
+                )
+
+        for key, value in run['recall'].items():
+            base_value = base['recall'].get(key)
+            if base_value is not None and value < base_value - recall_tolerance:
+                regressions.append(f"{label} recall{key} {base_value} -> {value}")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_results(results: Dict[str, Any]):
+    """以表格形式输出结果"""
+    table = Table(title="📊 构建与启动", show_header=True, header_style="bold magenta")
+    for column in ("副本数", "文件", "分块", "分块/秒", "峰值内存(MB)", "冷启动(s)", "热启动(s)", "召回率"):
+        table.add_column(column, justify="right")
+    for run in results['runs']:
+        build, startup = run['build'], run['startup']
+        table.add_row(
+            str(run['copies']), str(build['files']), str(build['chunks']), str(build['chunks_per_second']),
+            str(max(build['peak_rss_mb'], build['peak_worker_rss_mb'])),
+            str(startup['cold_init_seconds']), str(startup['warm_init_seconds']),
+            " ".join(f"{key}={value}" for key, value in run['recall'].items())
+        )
+    console.print(table)
+
+    table = Table(title="⏱️  检索延迟", show_header=True, header_style="bold magenta")
+    for column in ("副本数", "top_k", "并发", "p50(ms)", "p95(ms)", "p99(ms)", "QPS"):
+        table.add_column(column, justify="right")
+    for run in results['runs']:
+        for item in run['latency']:
+            table.add_row(
+                str(run['copies']), str(item['top_k']), str(item['concurrency']),
+                str(item['p50_ms']), str(item['p95_ms']), str(item['p99_ms']), str(item['qps'])
+            )
+    console.print(table)
+
+
+@click.group()
+def cli():
+    """Android知识库检索基准测试"""
+    pass
+
+
+@cli.command()
+@click.option('--copies', '-n', multiple=True, type=int, help='合成语料的副本数（可重复指定），默认 1 和 10')
+@click.option('--top-k', '-k', 'top_k', multiple=True, type=int, help='测量的 top_k（可重复指定），默认 1、5、10')
+@click.option('--concurrency', '-c', multiple=True, type=int, help='并发检索线程数（可重复指定），默认 1 和 4')
+@click.option('--repeats', '-r', default=5, show_default=True, help='每种配置下查询集的重复次数')
+@click.option('--mode', '-m', type=click.Choice(list(SEARCH_MODES)), default=DEFAULT_SEARCH_MODE, show_default=True,
+              help='检索模式')
+@click.option('--granularity', '-g', type=click.Choice(INDEX_GRANULARITIES), default=DEFAULT_GRANULARITY,
+              show_default=True, help='检索粒度')
+@click.option('--workers', '-j', type=int, default=None, help='构建时读取和分块文档的进程数，默认为CPU核数')
+@click.option('--with-cache', is_flag=True, help='测量延迟时保留查询缓存（默认关闭，测量完整检索路径）')
+@click.option('--queries', 'queries_path', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              default=DEFAULT_QUERIES_PATH, show_default=True, help='标注查询集')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, path_type=Path),
+              default=Path("benchmark_results.json"), show_default=True, help='结果JSON文件')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help='与该结果文件对比，发现回退时以非零状态退出')
+@click.option('--tolerance', default=0.2, show_default=True, help='吞吐量和p95延迟允许的相对变化')
+@click.option('--recall-tolerance', default=0.02, show_default=True, help='召回率允许的绝对下降')
+@click.option('--work-dir', type=click.Path(file_okay=False, path_type=Path), help='语料和索引的工作目录，默认使用临时目录')
+@click.option('--keep', is_flag=True, help='保留工作目录')
+def run(copies, top_k, concurrency, repeats, mode, granularity, workers, with_cache, queries_path, output,
+        baseline, tolerance, recall_tolerance, work_dir, keep):
+    """生成合成语料，测量构建、启动、延迟和召回率"""
+    copies = sorted(set(copies or (1, 10)))
+    top_k = sorted(set(top_k or (1, 5, 10)))
+    concurrency = sorted(set(concurrency or (1, 4)))
+    queries = json.loads(queries_path.read_text(encoding='utf-8'))
+
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="knowledge-bench-"))
+    results = {
+        'version': BENCHMARK_VERSION,
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'embedding_model': EMBEDDING_MODEL,
+            'embedding_backend': EMBEDDING_BACKEND,
+            'vector_backend': VECTOR_BACKEND,
+            'flat_index_dtype': FLAT_INDEX_DTYPE,
+            'params': {
+                'top_k': top_k, 'concurrency': concurrency, 'repeats': repeats, 'mode': mode,
+                'granularity': granularity, 'with_cache': with_cache, 'queries': len(queries),
+            },
+        },
+        'runs': [],
+    }
+
+    try:
+        for count in copies:
+            run_dir = work_dir / f"copies_{count}"
+            console.print(f"[bold blue]📦 副本数 {count}: 生成语料...[/bold blue]")
+            roots = generate_corpus(run_dir / "knowledge", count)
+
+            console.print(f"[bold blue]🔨 副本数 {count}: 构建索引...[/bold blue]")
+            build = run_phase("build", run_dir / "data", {
+                'roots': {scope: str(path) for scope, path in roots.items()},
+                'granularities': list(INDEX_GRANULARITIES),
+                'workers': workers,
+            })
+
+            console.print(f"[bold blue]🔍 副本数 {count}: 测量检索...[/bold blue]")
+            search = run_phase("search", run_dir / "data", {
+                'queries': queries, 'top_k': top_k, 'concurrency': concurrency, 'repeats': repeats,
+                'mode': mode, 'granularity': granularity, 'with_cache': with_cache,
+            })
+
+            results['runs'].append({'copies': count, 'build': build, **search})
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    print_results(results)
+    console.print(f"[green]✅ 结果已写入: {output}[/green]")
+
+    if baseline:
+        regressions = compare_results(
+            results, json.loads(baseline.read_text(encoding='utf-8')), tolerance, recall_tolerance
+        )
+        if regressions:
+            console.print(f"[red]❌ 与基线 {baseline} 相比发现 {len(regressions)} 处回退:[/red]")
+            for regression in regressions:
+                console.print(f"[red]   • {regression}[/red]")
+            sys.exit(1)
+        console.print(f"[green]✅ 与基线 {baseline} 相比没有回退[/green]")
+
+
+@cli.command(hidden=True)
+@click.argument('name', type=click.Choice(['build', 'search']))
+@click.argument('params')
+@click.argument('result_path', type=click.Path(dir_okay=False, path_type=Path))
+def phase(name, params, result_path):
+    """在独立进程中运行测量阶段（由 run 调用）"""
+    handler = build_phase if name == 'build' else search_phase
+    result = handler(json.loads(params))
+    result_path.write_text(json.dumps(result, ensure_ascii=False), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    cli()
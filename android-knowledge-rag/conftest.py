@@ -0,0 +1,72 @@
+"""
+pytest 公共配置
+
+测试使用临时数据目录（在导入 config 之前通过 ANDROID_KNOWLEDGE_DATA_DIR 指定），不影响现有索引；
+已导出的ONNX模型链接到临时数据目录，一致性测试仍可运行。嵌入模型替换为按文本哈希生成的向量，不需要下载模型。
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_SOURCE_DATA_DIR = Path(os.environ.get("ANDROID_KNOWLEDGE_DATA_DIR", Path(__file__).parent / "data"))
+_TEST_DATA_DIR = Path(tempfile.mkdtemp(prefix="android-knowledge-test-"))
+os.environ["ANDROID_KNOWLEDGE_DATA_DIR"] = str(_TEST_DATA_DIR)
+if (_SOURCE_DATA_DIR / "onnx").is_dir():
+    (_TEST_DATA_DIR / "onnx").symlink_to((_SOURCE_DATA_DIR / "onnx").resolve(), target_is_directory=True)
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+DIMENSION = 32
+
+
+def hash_encode(self, texts):
+    """按文本哈希生成的确定性单位向量，相同文本的向量相同"""
+    import numpy as np
+
+    vectors = np.array([
+        np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)[:DIMENSION]
+        for text in texts
+    ], dtype=np.float32) - 127.5
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _clear_data_dir():
+    for path in _TEST_DATA_DIR.iterdir():
+        if path.name == "onnx":
+            continue
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+
+@pytest.fixture
+def data_dir():
+    """空的数据目录（已导出的ONNX模型除外），测试结束后清空"""
+    import generations
+
+    _clear_data_dir()
+    generations._published_signature = None
+    yield _TEST_DATA_DIR
+    _clear_data_dir()
+
+
+@pytest.fixture
+def hash_embeddings(monkeypatch):
+    """嵌入引擎（torch 和 onnx 后端）改用哈希向量"""
+    from embedding_engine import EmbeddingEngine
+    from onnx_embedding import OnnxEmbeddingEngine
+
+    monkeypatch.setattr(EmbeddingEngine, "encode", hash_encode)
+    monkeypatch.setattr(OnnxEmbeddingEngine, "encode", hash_encode)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TEST_DATA_DIR, ignore_errors=True)
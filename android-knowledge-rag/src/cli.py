@@ -1,8 +1,14 @@
 """
 命令行接口 - knowledge-search 命令
 """
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import click
 import json
+import subprocess
+import sys
+from itertools import islice
 from pathlib import Path
 from rich.console import Console
 from rich.table import Table
@@ -11,105 +17,197 @@ from rich.progress import track
 from rich import print as rprint
 
 from config import (
-    KNOWLEDGE_DIR, DEFAULT_TOP_K,
-    GRANULARITY_FILE, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE,
-    DEFAULT_GRANULARITY
+    KNOWLEDGE_DIRS, DEFAULT_TOP_K,
+    GRANULARITY_FILE, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE, GRANULARITY_SECTION,
+    DEFAULT_GRANULARITY, INDEX_GRANULARITIES, COARSE_TO_FINE_TOP_FILES, LOADER_WORKERS, STARTUP_BUDGET_SECONDS,
+    DAEMON_LOG_PATH, DAEMON_START_TIMEOUT, BATCH_QUERY_SIZE,
+    SEARCH_MODES, DEFAULT_SEARCH_MODE, SIMILARITY_THRESHOLD, VECTOR_BACKEND, VECTOR_BACKEND_FLAT, HNSW_SEARCH_EF,
+    TUNE_TARGET_RECALL, TUNE_SEARCH_EF_CANDIDATES, TUNE_SAMPLE_QUERIES,
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_BACKEND_ONNX
 )
 from document_processor import DocumentProcessor
+from generations import (
+    create_generation, activate_generation, scratch_generation, collect_garbage, generation_write_lock
+)
+from indexer import describe_sync, sync_generation
+from search_daemon import SearchDaemon, DaemonClient, DaemonUnavailable
+from search_filters import SearchFilter, SCOPE_CORE, SCOPE_COMPONENTS
 from vector_store import VectorStore
+from watcher import create_index_watcher
 
 console = Console()
 
 @click.group()
 @click.version_option(version="1.0.0", prog_name="Android Knowledge RAG")
-def cli():
+@click.option('--timing', is_flag=True, help='显示启动耗时和命令耗时')
+@click.pass_context
+def cli(ctx, timing):
     """
     Android开发知识库RAG检索系统
 
     用于快速检索Android开发相关知识的智能搜索引擎
     """
-    pass
+    if timing:
+        command_started = time.perf_counter()
+        ctx.call_on_close(lambda: _print_timing(command_started))
+
+def _print_timing(command_started):
+    """输出启动耗时与命令耗时，启动耗时超出预算时给出警告"""
+    startup = command_started - _IMPORT_STARTED
+    command = time.perf_counter() - command_started
+    budget_style = "green" if startup <= STARTUP_BUDGET_SECONDS else "red"
+    console.print(
+        f"[dim]⏱️  启动耗时: [{budget_style}]{startup * 1000:.0f}ms[/{budget_style}] "
+        f"(预算 {STARTUP_BUDGET_SECONDS * 1000:.0f}ms)，命令耗时: {command * 1000:.0f}ms[/dim]",
+        highlight=False
+    )
+    if startup > STARTUP_BUDGET_SECONDS:
+        console.print("[yellow]⚠️  启动耗时超出预算，请检查是否有重量级模块在导入时被加载[/yellow]")
 
 @cli.command()
-@click.option('--granularity', '-g',
-              type=click.Choice(['file', 'paragraph', 'sentence']),
-              default=DEFAULT_GRANULARITY,
-              help='文档分块粒度')
-@click.option('--reset', is_flag=True, help='重置数据库')
-def build(granularity, reset):
-    """构建知识库索引"""
+@click.option('--granularity', '-g', 'granularities', multiple=True,
+              type=click.Choice([GRANULARITY_FILE, GRANULARITY_SECTION, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE]),
+              help='只构建指定粒度（可重复指定），默认同时构建配置中的所有粒度')
+@click.option('--workers', '-j', type=int, default=LOADER_WORKERS,
+              help='读取和分块文档的进程数，默认为CPU核数')
+@click.option('--reset', is_flag=True, help='重置数据库并全量重建')
+def build(granularities, workers, reset):
+    """构建知识库索引（默认增量构建，只处理变化的文件）"""
     console.print("[bold blue]🔨 开始构建Android知识库索引...[/bold blue]")
 
     try:
-        # 检查知识库目录
-        knowledge_path = KNOWLEDGE_DIR
-        if not knowledge_path.exists():
-            console.print(f"[red]❌ 知识库目录不存在: {knowledge_path}[/red]")
+        # 检查知识库目录，缺失的根目录跳过
+        knowledge_paths = []
+        for scope, knowledge_path in KNOWLEDGE_DIRS.items():
+            if knowledge_path.exists():
+                knowledge_paths.append(knowledge_path)
+            else:
+                console.print(f"[yellow]⚠️  知识库目录不存在，跳过 {scope}: {knowledge_path}[/yellow]")
+        if not knowledge_paths:
+            console.print("[red]❌ 没有可用的知识库目录[/red]")
             return
 
         # 初始化文档处理器
-        processor = DocumentProcessor(granularity=granularity)
-        console.print(f"📝 使用粒度模式: [green]{granularity}[/green]")
-
-        # 加载文档
-        with console.status("[bold green]📚 加载知识库文档..."):
-            documents = processor.load_documents(knowledge_path)
-
-        if not documents:
-            console.print("[yellow]⚠️  没有找到任何文档[/yellow]")
-            return
+        processor = DocumentProcessor(granularities=granularities or INDEX_GRANULARITIES, workers=workers)
+        console.print(f"📝 使用粒度模式: [green]{', '.join(processor.granularities)}[/green]")
 
-        console.print(f"✅ 成功加载 [green]{len(documents)}[/green] 个文档片段")
-
-        # 初始化向量数据库
+        # 在新的一代中构建，正在运行的检索进程继续使用当前代；增量构建先对比当前代的清单，有变化才复制当前代
         console.print("[bold blue]🗄️  初始化向量数据库...[/bold blue]")
-        vector_store = VectorStore(reset_db=reset)
+        with console.status("[bold green]📊 正在增量更新向量索引...") as status:
+            result = sync_generation(
+                processor,
+                knowledge_paths,
+                reset=reset,
+                search_ef=HNSW_SEARCH_EF,
+                progress_callback=lambda written: status.update(
+                    f"[bold green]📊 正在增量更新向量索引... 已写入 {written} 个分块"
+                )
+            )
+        summary, stats, generation, changed = result['summary'], result['stats'], result['generation'], result['activated']
+
+        if result['problems']:
+            console.print("[red]❌ 新索引校验失败，继续使用当前索引:[/red]")
+            for problem in result['problems']:
+                console.print(f"[red]   • {problem}[/red]")
+            return
 
-        # 添加文档到数据库
-        with console.status("[bold green]📊 正在建立向量索引..."):
-            vector_store.add_documents(documents)
+        if not (summary['added'] or summary['updated'] or summary['unchanged']):
+            console.print("[yellow]⚠️  没有找到任何文档[/yellow]")
 
         # 显示统计信息
-        stats = vector_store.get_stats()
         console.print(Panel(
             f"[bold green]✅ 知识库构建完成！[/bold green]\n\n"
             f"📊 统计信息:\n"
+            f"• 新增文件: {summary['added']}\n"
+            f"• 更新文件: {summary['updated']}\n"
+            f"• 删除文件: {summary['removed']}\n"
+            f"• 未变化文件: {summary['unchanged']}\n"
+            f"• 处理失败文件: {summary['failed']}\n"
+            f"• 写入分块: {summary['chunks_upserted']}，删除分块: {summary['chunks_deleted']}，"
+            f"未变化分块: {summary['chunks_kept']}\n"
             f"• 总文档数: {stats.get('total_documents', 0)}\n"
-            f"• 分块粒度: {granularity}\n"
-            f"• 嵌入模型: {stats.get('embedding_model', 'unknown')}\n"
-            f"• 数据库路径: {stats.get('db_path', 'unknown')}",
+            f"• 分块粒度: {', '.join(processor.granularities)}\n"
+            f"• 嵌入模型: {stats.get('embedding_model', 'unknown')}（{stats.get('embedding_backend', 'torch')}）\n"
+            f"• 数据库路径: {generation.db_path(stats.get('backend', VECTOR_BACKEND))}\n"
+            f"• 索引代: {generation.name or 'legacy'}"
+            f"{'（已切换）' if changed else '（无变化，未切换）'}\n"
+            f"• 清理旧索引代: {', '.join(result['removed_generations']) or '无'}",
             title="构建完成",
             border_style="green"
         ))
 
+        # 汇总报告处理失败的文件
+        if summary['errors']:
+            table = Table(title=f"❌ {summary['failed']} 个文件处理失败", show_header=True, header_style="bold red")
+            table.add_column("文件", style="yellow")
+            table.add_column("错误", style="white")
+            for error in summary['errors']:
+                table.add_row(error['file'], error['error'])
+            console.print(table)
+
     except Exception as e:
         console.print(f"[red]❌ 构建失败: {e}[/red]")
         raise
 
 @cli.command()
-@click.argument('query')
+@click.argument('query', required=False)
 @click.option('--top-k', '-k', default=DEFAULT_TOP_K, help='返回结果数量')
 @click.option('--format', 'output_format',
               type=click.Choice(['table', 'json', 'simple']),
               default='table', help='输出格式')
 @click.option('--file-type', type=click.Choice(['md', 'txt', 'pdf']),
               help='按文件类型过滤')
-def search(query, top_k, output_format, file_type):
-    """检索知识库"""
+@click.option('--scope', type=click.Choice([SCOPE_CORE, SCOPE_COMPONENTS]), help='按知识库范围过滤')
+@click.option('--component', help='按组件过滤（如 ViewModel）')
+@click.option('--mode', type=click.Choice(SEARCH_MODES), default=DEFAULT_SEARCH_MODE,
+              show_default=True, help='检索模式：vector 向量、lexical BM25词法、hybrid 混合')
+@click.option('--granularity', '-g', type=click.Choice(INDEX_GRANULARITIES), default=DEFAULT_GRANULARITY,
+              show_default=True, help='返回结果的分块粒度')
+@click.option('--coarse-top-files', default=COARSE_TO_FINE_TOP_FILES, show_default=True,
+              help='由粗到细检索：先选出的文件数，0 表示直接检索该粒度的全部分块')
+@click.option('--min-similarity', type=float, default=SIMILARITY_THRESHOLD, show_default=True,
+              help='向量结果的最低相似度，0 表示不过滤')
+@click.option('--no-daemon', is_flag=True, help='不使用守护进程，直接在当前进程检索')
+@click.option('--batch', 'batch_file', type=click.File('r', encoding='utf-8'),
+              help='批量检索：从文件读取查询（- 表示标准输入），每行一个查询或一个JSON对象，结果以JSONL输出')
+@click.option('--batch-size', default=BATCH_QUERY_SIZE, show_default=True, help='批量检索时每批的查询数')
+def search(query, top_k, output_format, file_type, scope, component, mode, granularity, coarse_top_files,
+           min_similarity, no_daemon, batch_file, batch_size):
+    """检索知识库（守护进程运行时自动转发给守护进程）"""
+    # 构建过滤条件（元数据中的文件类型带点号，如 .md）
+    where_filter = SearchFilter(
+        scope=scope,
+        component=component,
+        file_type=f".{file_type}" if file_type else None
+    ).to_where()
+
+    if batch_file is not None:
+        _search_batch(batch_file, top_k, where_filter, mode, granularity, coarse_top_files, min_similarity,
+                      no_daemon, batch_size)
+        return
+
+    if not query:
+        raise click.UsageError("请提供查询内容，或使用 --batch 指定批量查询文件")
+
     console.print(f"[bold blue]🔍 搜索: '{query}'[/bold blue]")
 
     try:
-        # 初始化向量数据库
-        vector_store = VectorStore()
-
-        # 构建过滤条件
-        where_filter = None
-        if file_type:
-            where_filter = {"file_type": file_type}
-
         # 执行搜索
         with console.status("[bold green]🧠 正在搜索相关知识..."):
-            results = vector_store.search(query, top_k=top_k, where=where_filter)
+            results = None
+            if not no_daemon:
+                try:
+                    results = DaemonClient().search(query, top_k=top_k, where=where_filter, mode=mode,
+                                                    granularity=granularity, coarse_top_files=coarse_top_files,
+                                                    min_similarity=min_similarity)
+                except DaemonUnavailable:
+                    pass
+
+            if results is None:
+                vector_store = VectorStore()
+                results = vector_store.search(query, top_k=top_k, where=where_filter, mode=mode,
+                                              granularity=granularity, coarse_top_files=coarse_top_files,
+                                              min_similarity=min_similarity)
 
         if not results:
             console.print("[yellow]😔 没有找到相关知识[/yellow]")
@@ -126,6 +224,66 @@ def search(query, top_k, output_format, file_type):
     except Exception as e:
         console.print(f"[red]❌ 搜索失败: {e}[/red]")
 
+def _search_batch(batch_file, top_k, default_where, mode, granularity, coarse_top_files, min_similarity,
+                  no_daemon, batch_size):
+    """
+    批量检索：逐批读取查询，批量编码和检索，以JSONL流式输出结果
+
+    输入每行可以是纯文本查询，也可以是JSON对象:
+        {"id": "q1", "query": "...", "top_k": 3, "mode": "hybrid", "granularity": "paragraph",
+         "min_similarity": 0.3, "filters": {"scope": "core"}}
+
+    filters 为类型化过滤条件（字段见 SearchFilter），也可直接给出ChromaDB where条件 "where"。
+    """
+    err_console = Console(stderr=True)
+
+    searcher = None
+    if not no_daemon:
+        client = DaemonClient()
+        if client.is_running():
+            searcher = client.search_batch
+
+    if searcher is None:
+        # 标准输出只输出JSONL结果，初始化和检索日志写入标准错误
+        searcher = VectorStore(output=sys.stderr).search_batch
+
+    lines = (line.strip() for line in batch_file)
+    defaults = {'top_k': top_k, 'mode': mode, 'granularity': granularity, 'coarse_top_files': coarse_top_files,
+                'min_similarity': min_similarity}
+    requests = (_parse_batch_line(line, defaults, default_where) for line in lines if line)
+
+    total = 0
+    while True:
+        batch = list(islice(requests, batch_size))
+        if not batch:
+            break
+
+        batch_results = searcher([{key: value for key, value in item.items() if key != 'id'} for item in batch])
+
+        for item, results in zip(batch, batch_results):
+            click.echo(json.dumps({**item, 'results': results}, ensure_ascii=False))
+        total += len(batch)
+
+    err_console.print(f"[dim]✅ 批量检索完成，共 {total} 个查询[/dim]")
+
+def _parse_batch_line(line, defaults, default_where):
+    """解析批量检索输入中的一行，未给出的参数使用命令行选项的值"""
+    if line.startswith('{'):
+        item = json.loads(line)
+        where = item.get('where')
+        if where is None and item.get('filters'):
+            where = SearchFilter.from_dict(item['filters']).to_where()
+        parsed = {
+            'query': item['query'],
+            **{key: item.get(key, value) for key, value in defaults.items()},
+            'where': where if where is not None else default_where,
+        }
+        if 'id' in item:
+            parsed['id'] = item['id']
+        return parsed
+
+    return {'query': line, **defaults, 'where': default_where}
+
 def _print_results_table(query, results):
     """以表格格式显示搜索结果"""
     table = Table(title=f"🔍 搜索结果: '{query}'", show_header=True, header_style="bold magenta")
@@ -141,8 +299,13 @@ def _print_results_table(query, results):
         # 截取内容作为摘要
         summary = content[:100] + "..." if len(content) > 100 else content
 
-        # 获取相似度分数（如果有的话）
-        similarity = f"{result.get('distance', 'N/A')}"
+        # 获取相似度分数（如果有的话），词法命中只有融合/BM25得分
+        if result.get('similarity') is not None:
+            similarity = f"{result['similarity']:.4f}"
+        elif result.get('score') is not None:
+            similarity = f"{result['score']:.4f}"
+        else:
+            similarity = "N/A"
 
         # 文件名
         filename = metadata.get('filename', 'unknown')
@@ -167,7 +330,9 @@ def _print_results_json(results):
             'id': result['id'],
             'content': result['content'],
             'metadata': result['metadata'],
-            'similarity': result.get('distance')
+            'similarity': result.get('similarity'),
+            'distance': result.get('distance'),
+            'score': result.get('score')
         })
 
     console.print(json.dumps(formatted_results, ensure_ascii=False, indent=2))
@@ -189,11 +354,22 @@ def _print_results_simple(results):
         console.print()
 
 @cli.command()
-def stats():
+@click.option('--no-daemon', is_flag=True, help='不使用守护进程，直接在当前进程读取')
+@click.option('--metrics', 'show_metrics', is_flag=True,
+              help='显示运行指标（分阶段耗时、计数器），守护进程需以 ANDROID_KNOWLEDGE_METRICS=1 启动')
+def stats(no_daemon, show_metrics):
     """显示知识库统计信息"""
     try:
-        vector_store = VectorStore()
-        stats = vector_store.get_stats()
+        stats = None
+        if not no_daemon:
+            try:
+                stats = DaemonClient().stats()
+            except DaemonUnavailable:
+                pass
+
+        if stats is None:
+            vector_store = VectorStore()
+            stats = vector_store.get_stats()
 
         if not stats:
             console.print("[yellow]⚠️  无法获取统计信息，可能需要先构建知识库[/yellow]")
@@ -203,26 +379,228 @@ def stats():
             f"[bold]📊 知识库统计信息[/bold]\n\n"
             f"📁 总文档数: [green]{stats.get('total_documents', 0)}[/green]\n"
             f"🏷️  集合名称: {stats.get('collection_name', 'unknown')}\n"
-            f"🤖 嵌入模型: {stats.get('embedding_model', 'unknown')}\n"
+            f"🤖 嵌入模型: {stats.get('embedding_model', 'unknown')}（{stats.get('embedding_backend', 'torch')}）\n"
             f"💾 数据库路径: {stats.get('db_path', 'unknown')}",
             title="统计信息",
             border_style="blue"
         ))
 
+        if show_metrics:
+            _print_metrics(stats.get('metrics') or {})
+
     except Exception as e:
         console.print(f"[red]❌ 获取统计信息失败: {e}[/red]")
 
+def _print_metrics(snapshot):
+    """以表格形式输出指标快照"""
+    if not snapshot.get('enabled'):
+        console.print("[yellow]⚠️  指标采集未开启，设置环境变量 ANDROID_KNOWLEDGE_METRICS=1 后"
+                      "启动守护进程或MCP服务[/yellow]")
+        return
+
+    console.print(f"[dim]进程运行时长: {snapshot.get('uptime_seconds', 0)}s[/dim]")
+    table = Table(title="⏱️  分阶段耗时", show_header=True, header_style="bold magenta")
+    for column in ("阶段", "次数", "总计(ms)", "平均(ms)", "p95≤(ms)", "最大(ms)"):
+        table.add_column(column, justify="left" if column == "阶段" else "right")
+    for name, timing in snapshot.get('timings', {}).items():
+        p95 = timing.get('p95_ms')
+        table.add_row(
+            name, str(timing['count']), f"{timing['total_ms']:.1f}", f"{timing['mean_ms']:.2f}",
+            f"{p95:g}" if p95 is not None else "-", f"{timing['max_ms']:.1f}"
+        )
+    console.print(table)
+
+    table = Table(title="🔢 计数器", show_header=True, header_style="bold magenta")
+    table.add_column("名称")
+    table.add_column("值", justify="right")
+    for name, value in {**snapshot.get('counters', {}), **snapshot.get('gauges', {})}.items():
+        table.add_row(name, f"{value:g}")
+    console.print(table)
+
+@cli.command()
+@click.option('--target-recall', default=TUNE_TARGET_RECALL, show_default=True, help='目标召回率')
+@click.option('--top-k', '-k', default=10, show_default=True, help='按 recall@k 计算召回率')
+@click.option('--queries', 'sample_size', default=TUNE_SAMPLE_QUERIES, show_default=True,
+              help='从集合中抽样作为查询的向量数')
+@click.option('--ef', 'ef_values', type=int, multiple=True,
+              help=f"待比较的 search_ef（可多次指定），默认 {', '.join(map(str, TUNE_SEARCH_EF_CANDIDATES))}")
+@click.option('--repeats', default=3, show_default=True, help='每个查询的重复次数，延迟取中位数')
+def tune(target_recall, top_k, sample_size, ef_values, repeats):
+    """扫描HNSW的 search_ef，选出满足目标召回率的最快设置"""
+    from hnsw_tuner import tune_search_ef
+
+    if VECTOR_BACKEND == VECTOR_BACKEND_FLAT:
+        console.print("[yellow]⚠️  flat 后端为精确检索，无需调优[/yellow]")
+        return
+
+    try:
+        # 扫描会改写集合的 search_ef，在当前代的临时副本上进行，检索进程使用的当前代不受影响
+        with scratch_generation() as scratch:
+            vector_store = VectorStore(generation=scratch, output=sys.stderr)
+            try:
+                with console.status("[bold green]⏱️  正在扫描 search_ef..."):
+                    report = tune_search_ef(
+                        vector_store, target_recall=target_recall, candidates=ef_values or TUNE_SEARCH_EF_CANDIDATES,
+                        top_k=top_k, sample_size=sample_size, repeats=repeats
+                    )
+            finally:
+                vector_store.close()
+    except Exception as e:
+        console.print(f"[red]❌ 调优失败: {e}[/red]")
+        return
+
+    best = report['best']
+    table = Table(
+        title=f"🎯 search_ef 扫描（{report['documents']} 个分块，{report['queries']} 个查询，recall@{report['top_k']}）",
+        show_header=True, header_style="bold magenta"
+    )
+    table.add_column("search_ef", justify="right", style="cyan")
+    table.add_column("召回率", justify="right")
+    table.add_column("p50(ms)", justify="right")
+    table.add_column("p95(ms)", justify="right")
+    for result in report['results']:
+        marker = " ⭐" if result['search_ef'] == best['search_ef'] else ""
+        recall_style = "green" if result['recall'] >= target_recall else "red"
+        table.add_row(
+            f"{result['search_ef']}{marker}", f"[{recall_style}]{result['recall']:.4f}[/{recall_style}]",
+            f"{result['p50_ms']:.3f}", f"{result['p95_ms']:.3f}"
+        )
+    console.print(table)
+
+    if best['meets_target']:
+        console.print(f"[green]✅ 满足召回率 {target_recall} 的最快设置: search_ef={best['search_ef']}[/green]")
+    else:
+        console.print(f"[yellow]⚠️  没有设置达到召回率 {target_recall}，召回率最高的是 "
+                      f"search_ef={best['search_ef']}（{best['recall']:.4f}）[/yellow]")
+    if best['search_ef'] != report['current_search_ef']:
+        console.print(f"[dim]提示: 在 config.py 中设置 HNSW_SEARCH_EF = {best['search_ef']}"
+                      f"（当前为 {report['current_search_ef']}），下次 build 时生效[/dim]")
+
+@cli.command('export-onnx')
+@click.option('--model', 'model_name', default=EMBEDDING_MODEL, show_default=True, help='要导出的嵌入模型')
+@click.option('--quantize/--no-quantize', default=True, show_default=True, help='是否同时生成int8量化模型')
+def export_onnx(model_name, quantize):
+    """将嵌入模型导出为ONNX，供 onnx 嵌入后端使用（需要 torch 和 onnx）"""
+    from onnx_embedding import export_onnx_model
+
+    try:
+        info = export_onnx_model(model_name, quantize=quantize)
+    except Exception as e:
+        console.print(f"[red]❌ 导出失败: {e}[/red]")
+        return
+
+    agreement = "，".join(f"{variant} {value:.6f}" for variant, value in info['min_cosine'].items())
+    console.print(Panel(
+        f"[green]✅ ONNX模型导出完成[/green]\n\n"
+        f"• 模型: {info['model_name']}（{info['dimension']} 维，最大序列长度 {info['max_seq_length']}）\n"
+        f"• 导出目录: {info['output_dir']}\n"
+        f"• 与torch向量的最低余弦相似度: {agreement}",
+        title="导出完成",
+        border_style="green"
+    ))
+    if EMBEDDING_BACKEND != EMBEDDING_BACKEND_ONNX:
+        console.print("[dim]提示: 设置 EMBEDDING_BACKEND = \"onnx\"（或环境变量 "
+                      "ANDROID_KNOWLEDGE_EMBEDDING_BACKEND=onnx）启用ONNX嵌入后端[/dim]")
+
 @cli.command()
 @click.confirmation_option(prompt='确定要重置数据库吗？这将删除所有索引数据。')
 def reset():
     """重置知识库数据库"""
     try:
         console.print("[bold red]🗑️  重置知识库数据库...[/bold red]")
-        vector_store = VectorStore(reset_db=True)
+        # 激活一个空的代，旧的代由垃圾回收清理，正在进行的检索不受影响
+        with generation_write_lock():
+            generation = create_generation()
+            VectorStore(generation=generation).close()
+            activate_generation(generation)
+            collect_garbage()
         console.print("[green]✅ 数据库已重置[/green]")
         console.print("[dim]提示: 使用 'python cli.py build' 重新构建知识库[/dim]")
     except Exception as e:
         console.print(f"[red]❌ 重置失败: {e}[/red]")
 
+@cli.command()
+def watch():
+    """监听知识库目录，文档变化时自动增量更新索引（Ctrl+C 退出）"""
+    def report(summary):
+        console.print(f"[green]🔄 {time.strftime('%H:%M:%S')} {describe_sync(summary)}[/green]")
+        for error in summary['errors']:
+            console.print(f"[red]   ❌ {error['file']}: {error['error']}[/red]")
+
+    try:
+        vector_store = VectorStore()
+        watcher = create_index_watcher(vector_store, on_synced=report)
+        console.print(f"[bold blue]👀 正在监听: {', '.join(str(path) for path in watcher.directories)}[/bold blue]")
+        watcher.run()
+    except KeyboardInterrupt:
+        console.print("[dim]已停止监听[/dim]")
+    except Exception as e:
+        console.print(f"[red]❌ 监听失败: {e}[/red]")
+
+@cli.group()
+def daemon():
+    """管理常驻检索守护进程（保持向量数据库和嵌入模型常驻内存）"""
+    pass
+
+@daemon.command('start')
+@click.option('--background', '-b', is_flag=True, help='在后台启动，日志写入守护进程日志文件')
+@click.option('--watch', 'watch_files', is_flag=True, help='同时监听知识库目录，文档变化时自动增量更新索引')
+def daemon_start(background, watch_files):
+    """启动检索守护进程"""
+    client = DaemonClient()
+    if client.is_running():
+        console.print("[yellow]⚠️  守护进程已在运行[/yellow]")
+        return
+
+    if not background:
+        try:
+            SearchDaemon(watch=watch_files).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            console.print(f"[red]❌ 守护进程启动失败: {e}[/red]")
+        return
+
+    DAEMON_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(DAEMON_LOG_PATH, 'ab') as log_file:
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), 'daemon', 'start'] + (['--watch'] if watch_files else []),
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+    # 等待守护进程加载完成
+    with console.status("[bold green]🚀 正在启动检索守护进程..."):
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if client.is_running():
+                console.print(f"[green]✅ 守护进程已启动 (pid {process.pid})[/green]")
+                return
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+
+    console.print(f"[red]❌ 守护进程启动失败，请查看日志: {DAEMON_LOG_PATH}[/red]")
+
+@daemon.command('stop')
+def daemon_stop():
+    """停止检索守护进程"""
+    try:
+        result = DaemonClient().shutdown()
+        console.print(f"[green]✅ 守护进程已停止 (pid {result['pid']})[/green]")
+    except DaemonUnavailable:
+        console.print("[yellow]⚠️  守护进程未运行[/yellow]")
+
+@daemon.command('status')
+def daemon_status():
+    """查看检索守护进程状态"""
+    try:
+        result = DaemonClient().request('ping')
+        console.print(f"[green]✅ 守护进程运行中 (pid {result['pid']})[/green]")
+    except DaemonUnavailable:
+        console.print("[yellow]⚠️  守护进程未运行[/yellow]")
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -6,19 +6,65 @@ from pathlib import Path
 
 # 基础路径配置
 BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / "data"
-KNOWLEDGE_DIR = Path(__file__).parent.parent.parent / "components"
+# 数据目录可通过环境变量 ANDROID_KNOWLEDGE_DATA_DIR 指定（如基准测试使用独立的数据目录）
+DATA_DIR = Path(os.environ.get("ANDROID_KNOWLEDGE_DATA_DIR", BASE_DIR / "data"))
+KNOWLEDGE_BASE_DIR = Path(__file__).parent.parent.parent
+# 知识库根目录：范围标签 -> 目录，分块元数据的 scope 字段取自范围标签
+KNOWLEDGE_DIRS = {
+    "core": KNOWLEDGE_BASE_DIR / "core",              # 核心架构规范和编码规则
+    "components": KNOWLEDGE_BASE_DIR / "components",  # 组件使用指南
+}
+KNOWLEDGE_DIR = KNOWLEDGE_DIRS["components"]
 
 # ChromaDB配置
 CHROMA_PATH = DATA_DIR / "chroma_db"
 COLLECTION_NAME = "android_knowledge"
 
+# 向量存储后端：chroma（ChromaDB + HNSW）或 flat（NumPy平面索引，内存映射的 .npy 文件，暴力检索）
+# 中小规模语料下 flat 打开更快、结果精确；切换后端后需执行 build --reset
+# 可通过环境变量 ANDROID_KNOWLEDGE_VECTOR_BACKEND 覆盖（如基准测试对比两种后端）
+VECTOR_BACKEND_CHROMA = "chroma"
+VECTOR_BACKEND_FLAT = "flat"
+VECTOR_BACKENDS = (VECTOR_BACKEND_CHROMA, VECTOR_BACKEND_FLAT)
+VECTOR_BACKEND = os.environ.get("ANDROID_KNOWLEDGE_VECTOR_BACKEND", VECTOR_BACKEND_CHROMA)
+FLAT_INDEX_PATH = DATA_DIR / "flat_index"
+FLAT_INDEX_DTYPE = "float32"     # 向量存储类型：float32、float16（体积减半）或 int8（体积1/4，距离有量化误差）
+FLAT_INDEX_BLOCK_ROWS = 65536    # 量化存储按块解码计算内积，限制查询时的临时内存
+
+# 距离空间：cosine、l2 或 ip，两种后端都按此计算距离，修改后需执行 build --reset
+VECTOR_SPACE = "cosine"
+# HNSW索引参数（chroma 后端）：M 和 construction_ef 在创建集合时写入，修改后需执行 build --reset；
+# search_ef 在每次 build 时写入新一代的集合配置，可用 tune 命令按目标召回率选取
+HNSW_M = 16                 # 每个节点的邻居数
+HNSW_CONSTRUCTION_EF = 100  # 构建时的候选列表大小
+HNSW_SEARCH_EF = 100        # 检索时的候选列表大小，越大召回率越高、延迟越高
+# tune 命令配置：用集合中抽样的向量作为查询，与暴力检索的精确结果对比召回率
+TUNE_TARGET_RECALL = 0.99
+TUNE_SEARCH_EF_CANDIDATES = (10, 16, 24, 32, 48, 64, 96, 128, 192, 256)
+TUNE_SAMPLE_QUERIES = 200
+
 # 嵌入模型配置
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # 轻量级多语言模型，支持中文
+EMBEDDING_DEVICE = "cpu"        # 推理设备
+EMBEDDING_BATCH_SIZE = 32       # 模型单次编码的文本数
+EMBEDDING_NUM_THREADS = None    # CPU推理线程数，None 表示使用推理运行时的默认值
+EMBEDDING_NORMALIZE = True      # 是否对向量做L2归一化
+
+# 嵌入后端：torch（sentence-transformers）或 onnx（onnxruntime 运行导出的模型，只依赖 tokenizers，不导入torch）
+# 使用 onnx 前需先执行 export-onnx 导出模型；可通过环境变量 ANDROID_KNOWLEDGE_EMBEDDING_BACKEND 覆盖
+EMBEDDING_BACKEND_TORCH = "torch"
+EMBEDDING_BACKEND_ONNX = "onnx"
+EMBEDDING_BACKENDS = (EMBEDDING_BACKEND_TORCH, EMBEDDING_BACKEND_ONNX)
+EMBEDDING_BACKEND = os.environ.get("ANDROID_KNOWLEDGE_EMBEDDING_BACKEND", EMBEDDING_BACKEND_TORCH)
+EMBEDDING_ONNX_DIR = DATA_DIR / "onnx"      # 导出的ONNX模型目录，每个模型一个子目录
+EMBEDDING_ONNX_QUANTIZED = True             # 使用int8动态量化的模型（更小更快，向量与torch有微小差异）
+EMBEDDING_ONNX_MIN_COSINE = 0.99            # 导出校验和一致性测试要求的与torch向量的最低余弦相似度
 
 # 检索配置
 DEFAULT_TOP_K = 5
-SIMILARITY_THRESHOLD = 0.7
+# 向量检索结果的最低相似度（由距离换算的余弦相似度），低于该值的结果不返回，0 表示不过滤；
+# 词法检索结果没有相似度，不受影响。all-MiniLM-L6-v2 对中文文本的相似度普遍偏低，阈值不宜过高
+SIMILARITY_THRESHOLD = 0.25
 
 # 支持的文件类型
 SUPPORTED_EXTENSIONS = {'.md', '.txt', '.pdf'}
@@ -27,4 +73,88 @@ SUPPORTED_EXTENSIONS = {'.md', '.txt', '.pdf'}
 GRANULARITY_FILE = "file"      # 文件级别
 GRANULARITY_PARAGRAPH = "paragraph"  # 段落级别
 GRANULARITY_SENTENCE = "sentence"    # 句子级别
-DEFAULT_GRANULARITY = GRANULARITY_FILE
\ No newline at end of file
+GRANULARITY_SECTION = "section"      # 章节级别：按标题和代码块结构切分，并受token预算约束
+DEFAULT_GRANULARITY = GRANULARITY_SECTION   # 检索默认返回的粒度
+# build 同时维护的粒度，所有粒度写入同一个集合，以 granularity 元数据区分
+INDEX_GRANULARITIES = [GRANULARITY_FILE, GRANULARITY_SECTION, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE]
+# 由粗到细检索：先按文件级别分块排序，只在排名靠前的文件内检索细粒度分块，0 表示不启用
+COARSE_TO_FINE_TOP_FILES = 5
+
+# 章节分块配置（all-MiniLM-L6-v2 最多编码256个token，超出部分会被截断）
+SECTION_TOKEN_BUDGET = 200      # 每个分块的token预算
+SECTION_OVERLAP_TOKENS = 0      # 同一章节内相邻分块的重叠token数，0 表示每段内容只嵌入一次
+
+# 文档加载配置
+LOADER_WORKERS = None           # 读取和分块文档的进程数，None 表示CPU核数，1 表示在当前进程内串行处理
+LOADER_PARALLEL_MIN_FILES = 16  # 待处理文件少于该数量时不启动进程池（进程启动开销大于收益）
+# 增量构建清单
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+
+# 索引代（蓝绿切换）：每次 build 在新的代目录中构建并校验，通过后原子更新 CURRENT 指针，
+# 检索进程在下一次查询时切换到新的代。未创建过代时使用上面 data/ 下的旧布局
+GENERATIONS_DIR = DATA_DIR / "generations"
+CURRENT_GENERATION_PATH = DATA_DIR / "CURRENT"
+GENERATIONS_LOCK_PATH = DATA_DIR / "generations.lock"  # 索引代写锁，build 和监听进程依次基于当前代构建新的一代
+GENERATIONS_KEEP = 2            # 保留的代数（含当前代），更早的代被清理；上一代留给切换前已开始的查询
+
+# MCP服务检索配置
+SEARCH_MAX_WORKERS = 4          # 检索线程池大小，限制并发的嵌入和HNSW查询数量
+SEARCH_TIMEOUT_SECONDS = 10.0   # 单次检索超时时间
+CORE_DIGEST_MAX_CHARS = 8000    # search_core_architecture 默认返回的最大字符数，超出的章节只列出标题
+# MCP工具响应的token预算（按 estimate_tokens 估算）：同一文件中重叠或相邻的分块合并，已返回的内容不重复，
+# 超出预算的内容按查询提取片段
+MCP_RESPONSE_MAX_TOKENS = 800       # search_knowledge 和带 query 的 search_component_guide 的默认预算
+COMPONENT_GUIDE_MAX_TOKENS = 4000   # 不带 query 时返回组件指南的预算，超出的章节只列出标题
+MCP_MERGE_GAP_TOKENS = 20           # 同一文件中间隔不超过该token数的两个片段连同中间内容合并为一段（如中间只隔一个标题）
+MCP_SNIPPET_MIN_TOKENS = 80         # 每个结果至少分配的token数，预算不足时靠后的结果只列出来源
+
+# 查询缓存配置
+QUERY_CACHE_SIZE = 512              # 结果缓存条目数
+QUERY_CACHE_TTL_SECONDS = 600       # 结果缓存存活时间
+EMBEDDING_CACHE_SIZE = 2048         # 查询向量缓存条目数
+INDEX_VERSION_PATH = DATA_DIR / "index_version"  # 索引版本标记，激活索引代（或原地更新当前代）时更新，用于跨进程失效缓存
+
+# 文档向量磁盘缓存：按 模型+文本内容 的哈希缓存向量，重建索引和切换粒度时复用
+EMBEDDING_DISK_CACHE_DIR = DATA_DIR / "embedding_cache"
+EMBEDDING_DISK_CACHE_MAX_ENTRIES = 100000   # 最大条目数（384维约占150MB），超出时淘汰最久未使用的条目
+
+# 索引写入配置
+EMBED_BATCH_SIZE = 64      # 每批嵌入的分块数
+WRITE_BATCH_SIZE = 1000    # 每批写入ChromaDB的分块数（不超过ChromaDB的最大批量）
+
+# CLI启动预算：命令开始执行前的导入耗时上限（秒），超出时 --timing 给出警告
+STARTUP_BUDGET_SECONDS = 0.5
+
+# 知识库文件监听配置
+WATCH_DEBOUNCE_SECONDS = 1.0    # 防抖时间：文件停止变化该时长后才重建索引，合并连续保存产生的多次事件
+WATCH_POLL_INTERVAL = 1.0       # 未安装 watchfiles 时轮询文件变化的间隔
+# MCP服务是否监听知识库变化并自动更新索引（设置环境变量 ANDROID_KNOWLEDGE_WATCH=1 开启）
+WATCH_ENABLED = os.environ.get("ANDROID_KNOWLEDGE_WATCH", "").lower() in ("1", "true", "yes")
+
+# 指标采集配置（默认关闭，关闭时埋点几乎没有开销）
+METRICS_ENABLED = os.environ.get("ANDROID_KNOWLEDGE_METRICS", "").lower() in ("1", "true", "yes")
+# 每个请求完成后向标准错误输出一行JSON（包含各阶段耗时），开启时同时开启指标采集
+METRICS_REQUEST_LOG = os.environ.get("ANDROID_KNOWLEDGE_METRICS_LOG", "").lower() in ("1", "true", "yes")
+# Prometheus文本格式的指标文件路径（供 node_exporter textfile collector 采集），未设置时不导出
+METRICS_PROMETHEUS_PATH = os.environ.get("ANDROID_KNOWLEDGE_METRICS_FILE") or None
+METRICS_EXPORT_INTERVAL = 10.0  # 指标文件的最短重写间隔（秒）
+
+# 常驻检索守护进程配置
+DAEMON_SOCKET_PATH = DATA_DIR / "search_daemon.sock"
+DAEMON_LOG_PATH = DATA_DIR / "search_daemon.log"
+DAEMON_CONNECT_TIMEOUT = 0.2      # 连接超时，守护进程未运行时快速回退到进程内检索
+DAEMON_REQUEST_TIMEOUT = 30.0     # 单次请求超时
+DAEMON_START_TIMEOUT = 60.0       # 后台启动时等待守护进程就绪的时间
+
+# 批量检索配置
+BATCH_QUERY_SIZE = 64      # 批量检索时每批处理的查询数
+
+# 检索模式
+SEARCH_MODE_VECTOR = "vector"      # 向量检索
+SEARCH_MODE_LEXICAL = "lexical"    # BM25词法检索
+SEARCH_MODE_HYBRID = "hybrid"      # 向量+词法，倒数排名融合
+SEARCH_MODES = (SEARCH_MODE_VECTOR, SEARCH_MODE_LEXICAL, SEARCH_MODE_HYBRID)
+DEFAULT_SEARCH_MODE = SEARCH_MODE_HYBRID
+LEXICAL_INDEX_PATH = DATA_DIR / "bm25_index.json"
+HYBRID_CANDIDATE_MULTIPLIER = 3    # 混合检索时每路召回 top_k 的倍数
+RRF_K = 60                         # 倒数排名融合常数
@@ -1,52 +1,275 @@
 """
 文档处理器 - 支持不同粒度的文档分块处理
 """
+import hashlib
 import os
 import re
+import time
+from collections import deque
 from pathlib import Path
-from typing import List, Dict, Any
-import markdown
-from config import SUPPORTED_EXTENSIONS, GRANULARITY_FILE, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+from config import (
+    SUPPORTED_EXTENSIONS, GRANULARITY_FILE, GRANULARITY_PARAGRAPH, GRANULARITY_SENTENCE, GRANULARITY_SECTION,
+    INDEX_GRANULARITIES, SECTION_TOKEN_BUDGET, SECTION_OVERLAP_TOKENS, LOADER_WORKERS, LOADER_PARALLEL_MIN_FILES,
+    KNOWLEDGE_DIRS
+)
+from manifest import compute_content_hash
+from metrics import metrics
+
+# 标题行与代码围栏
+_HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+# 元数据中章节路径的分隔符
+SECTION_PATH_SEPARATOR = " > "
+
+# token估算：中日韩字符、ASCII单词、其他符号
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9]+')
+_SYMBOL_PATTERN = re.compile(r'[^\sA-Za-z0-9\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的WordPiece token数（偏保守）
+
+    中日韩字符每字一个token，ASCII单词按每5个字符一个子词估算，标点符号各算一个token。
+    """
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = sum((len(word) + 4) // 5 for word in _WORD_PATTERN.findall(text))
+    symbols = len(_SYMBOL_PATTERN.findall(text))
+    return cjk + words + symbols
+
+
+# 进程池工作进程中的文档处理器（由 _init_worker 设置）
+_worker_processor: Optional["DocumentProcessor"] = None
+
+
+def _init_worker(processor: "DocumentProcessor"):
+    """进程池初始化：每个工作进程只接收一次处理器配置"""
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _load_file_in_worker(file_path: Path) -> Dict[str, Any]:
+    """在工作进程中读取并分块单个文件"""
+    return _worker_processor.load_file(file_path)
+
+
+def content_chunk_id(rel_path: str, granularity: str, content: str, occurrence: int = 1) -> str:
+    """
+    分块ID：文件相对路径 + 粒度 + 内容哈希
+
+    分块内容不变时ID不变，与分块在文件中的位置无关；同一文件中重复出现的相同内容以出现次序区分。
+    ID相同即内容相同，增量构建时已存在的ID无需重新嵌入。
+
+    Args:
+        rel_path: 文件相对路径（见 DocumentProcessor.locate）
+        granularity: 分块粒度
+        content: 分块内容
+        occurrence: 相同内容在该文件该粒度中第几次出现
+
+    Returns:
+        分块ID，如 components/ViewModel.md#paragraph:3fa2c1d4e5b6a7f8
+    """
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    suffix = f"~{occurrence}" if occurrence > 1 else ""
+    return f"{rel_path}#{granularity}:{digest}{suffix}"
+
 
 class DocumentProcessor:
-    """文档处理器，支持文件级别、段落级别、句子级别的分块"""
+    """文档处理器，支持文件级别、章节级别、段落级别、句子级别的分块，可同时产出多个粒度"""
+
+    # 分块逻辑或元数据结构变化时递增，索引清单据此判断已索引文件需要重新分块
+    CHUNKER_VERSION = 5
+
+    def __init__(self, granularities: Union[str, Sequence[str]] = INDEX_GRANULARITIES,
+                 section_token_budget: int = SECTION_TOKEN_BUDGET,
+                 section_overlap_tokens: int = SECTION_OVERLAP_TOKENS,
+                 workers: Optional[int] = LOADER_WORKERS,
+                 roots: Optional[Dict[str, Path]] = None):
+        """
+        初始化文档处理器
+
+        Args:
+            granularities: 分块粒度，单个粒度或粒度列表（每个文件按每个粒度各分块一次）
+            section_token_budget: 章节分块的token预算
+            section_overlap_tokens: 章节分块的重叠token数
+            workers: 读取和分块文档的进程数，None 表示CPU核数
+            roots: 知识库根目录（范围标签 -> 目录），默认为配置中的 KNOWLEDGE_DIRS
+        """
+        if isinstance(granularities, str):
+            granularities = [granularities]
+        self.granularities = tuple(dict.fromkeys(granularities))
+        self.section_token_budget = section_token_budget
+        self.section_overlap_tokens = section_overlap_tokens
+        self.workers = workers or os.cpu_count() or 1
+        self.roots = {scope: Path(root).resolve() for scope, root in (roots or KNOWLEDGE_DIRS).items()}
+        # 最近一次 load_documents 中处理失败的文件及原因
+        self.errors: List[Tuple[Path, str]] = []
 
-    def __init__(self, granularity: str = GRANULARITY_FILE):
-        self.granularity = granularity
+    @property
+    def granularity(self) -> str:
+        """粒度组合的标识，记录在索引清单中，粒度组合变化时文件需要重新分块"""
+        return ",".join(self.granularities)
 
-    def load_documents(self, knowledge_dir: Path) -> List[Dict[str, Any]]:
+    def load_documents(self, knowledge_dir: Path) -> Iterator[Dict[str, Any]]:
         """
         从指定目录加载所有支持的文档
 
+        以生成器方式按文件路径顺序产出分块，文件的读取和分块在进程池中并行执行。
+        处理失败的文件记录在 self.errors 中，全部处理完后统一报告。
+
+        Args:
+            knowledge_dir: 知识库目录路径
+
+        Yields:
+            文档分块，包含内容和元数据
+        """
+        self.errors = []
+        for file_path, result in self.process_files(self.iter_source_files(knowledge_dir)):
+            if 'error' in result:
+                self.errors.append((file_path, result['error']))
+                continue
+            yield from result['chunks']
+
+        if self.errors:
+            print(f"❌ {len(self.errors)} 个文件处理失败:")
+            for file_path, error in self.errors:
+                print(f"   • {file_path}: {error}")
+
+    def process_files(self, file_paths: Iterable[Path]) -> Iterator[Tuple[Path, Dict[str, Any]]]:
+        """
+        并行读取并分块多个文件，按输入顺序产出结果
+
+        同时在途的文件数限制为工作进程数的若干倍，下游（嵌入和写入）较慢时不会堆积全部文件的分块。
+
+        Args:
+            file_paths: 文件路径
+
+        Yields:
+            (文件路径, 处理结果)，处理结果见 load_file
+        """
+        file_paths = list(file_paths)
+        workers = min(self.workers, len(file_paths))
+        if workers <= 1 or len(file_paths) < LOADER_PARALLEL_MIN_FILES:
+            for file_path in file_paths:
+                yield file_path, self._record_metrics(self.load_file(file_path))
+            return
+
+        # 延迟导入：multiprocessing 导入耗时较长，只在需要并行时才加载
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,))
+        try:
+            pending = deque()
+            paths = iter(file_paths)
+            for file_path in paths:
+                pending.append((file_path, executor.submit(_load_file_in_worker, file_path)))
+                if len(pending) >= workers * 4:
+                    break
+
+            while pending:
+                file_path, future = pending.popleft()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(_load_file_in_worker, next_path)))
+                yield file_path, self._record_metrics(future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def load_file(self, file_path: Path) -> Dict[str, Any]:
+        """
+        读取并分块单个文件，异常不会抛出而是记录在结果中
+
+        Returns:
+            {'content_hash': 内容哈希, 'chunks': 分块列表, 'seconds': 耗时}，
+            处理失败时为 {'error': 错误信息, 'seconds': 耗时}
+        """
+        start = time.perf_counter()
+        try:
+            data = file_path.read_bytes()
+            result = {
+                'content_hash': compute_content_hash(data),
+                'chunks': self.process_file(file_path, data.decode('utf-8')),
+            }
+        except Exception as e:
+            result = {'error': str(e)}
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _record_metrics(result: Dict[str, Any]) -> Dict[str, Any]:
+        """在主进程中记录文件处理指标（工作进程中的耗时随结果返回）"""
+        if 'error' in result:
+            metrics.incr('processor.errors')
+        else:
+            metrics.incr('processor.files')
+            metrics.incr('processor.chunks', len(result['chunks']))
+        metrics.observe('processor.load_file', result['seconds'])
+        return result
+
+    def iter_source_files(self, knowledge_dir: Path) -> List[Path]:
+        """
+        列出目录下所有支持的文件（按路径排序，保证构建结果稳定）
+
         Args:
             knowledge_dir: 知识库目录路径
 
         Returns:
-            文档列表，每个文档包含内容和元数据
+            文件路径列表
+        """
+        return sorted(
+            file_path for file_path in knowledge_dir.rglob('*')
+            if file_path.is_file() and self.is_source_file(file_path)
+        )
+
+    def locate(self, file_path: Path) -> Tuple[str, str]:
+        """
+        确定文件所属的知识库范围和相对路径
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            (范围标签, 相对于知识库根目录上一级的路径，如 components/ViewModel.md)；
+            文件不在任何根目录下时，以所在目录名作为范围标签
         """
-        documents = []
+        resolved = file_path.resolve()
+        for scope, root in self.roots.items():
+            if resolved.is_relative_to(root):
+                return scope, resolved.relative_to(root.parent).as_posix()
+        return resolved.parent.name, resolved.relative_to(resolved.parent.parent).as_posix()
 
-        # 遍历所有支持的文件
-        for file_path in knowledge_dir.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                try:
-                    # 读取文件内容
-                    content = file_path.read_text(encoding='utf-8')
+    @staticmethod
+    def is_source_file(file_path: Path) -> bool:
+        """是否为支持的文件类型"""
+        return file_path.suffix.lower() in SUPPORTED_EXTENSIONS
 
-                    # 根据粒度设置分块
-                    chunks = self._chunk_document(content, file_path)
-                    documents.extend(chunks)
+    def process_file(self, file_path: Path, content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        读取并分块单个文件
 
-                    print(f"✅ 已处理文件: {file_path.name} ({len(chunks)} 个分块)")
+        Args:
+            file_path: 文件路径
+            content: 已读取的文件内容（可选，未提供时从磁盘读取）
 
-                except Exception as e:
-                    print(f"❌ 处理文件失败 {file_path}: {e}")
+        Returns:
+            分块列表
+        """
+        if content is None:
+            content = file_path.read_text(encoding='utf-8')
 
-        return documents
+        # 根据粒度设置分块
+        return self._chunk_document(content, file_path)
 
     def _chunk_document(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """
-        根据粒度设置对文档进行分块
+        按每个粒度设置对文档进行分块
+
+        每个分块的元数据记录所属粒度（granularity），非文件级别的分块通过 parent_id
+        指向所在文件的文件级别分块，检索时可以先定位文件再在文件内检索细粒度分块。
+        分块ID由文件相对路径和内容哈希生成，插入或删除段落不会改变其他分块的ID。
 
         Args:
             content: 文档内容
@@ -55,14 +278,34 @@ class DocumentProcessor:
         Returns:
             分块列表
         """
-        if self.granularity == GRANULARITY_FILE:
-            return self._chunk_by_file(content, file_path)
-        elif self.granularity == GRANULARITY_PARAGRAPH:
-            return self._chunk_by_paragraph(content, file_path)
-        elif self.granularity == GRANULARITY_SENTENCE:
-            return self._chunk_by_sentence(content, file_path)
-        else:
-            raise ValueError(f"不支持的粒度设置: {self.granularity}")
+        chunks = []
+        _, rel_path = self.locate(file_path)
+        # 文件级别分块的ID（无论是否构建文件级别分块），细粒度分块通过 parent_id 指向它
+        file_chunk_id = content_chunk_id(rel_path, GRANULARITY_FILE, content.strip())
+        for granularity in self.granularities:
+            if granularity == GRANULARITY_FILE:
+                granularity_chunks = self._chunk_by_file(content, file_path)
+            elif granularity == GRANULARITY_PARAGRAPH:
+                granularity_chunks = self._chunk_by_paragraph(content, file_path)
+            elif granularity == GRANULARITY_SENTENCE:
+                granularity_chunks = self._chunk_by_sentence(content, file_path)
+            elif granularity == GRANULARITY_SECTION:
+                granularity_chunks = self._chunk_by_section(content, file_path)
+            else:
+                raise ValueError(f"不支持的粒度设置: {granularity}")
+
+            parent_id = file_chunk_id if granularity != GRANULARITY_FILE else ''
+            occurrences: Dict[str, int] = {}
+            for chunk in granularity_chunks:
+                occurrences[chunk['content']] = occurrences.get(chunk['content'], 0) + 1
+                chunk['metadata']['chunk_id'] = content_chunk_id(
+                    rel_path, granularity, chunk['content'], occurrences[chunk['content']]
+                )
+                chunk['metadata']['granularity'] = granularity
+                chunk['metadata']['parent_id'] = parent_id
+            chunks.extend(granularity_chunks)
+
+        return chunks
 
     def _chunk_by_file(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """文件级别分块 - 整个文件作为一个分块"""
@@ -73,9 +316,8 @@ class DocumentProcessor:
             'content': content.strip(),
             'metadata': {
                 **metadata,
-                'chunk_id': f"{file_path.stem}_whole",
                 'chunk_type': 'file',
-                'file_path': str(file_path.relative_to(file_path.parent.parent))
+                'section_path': ''
             }
         }]
 
@@ -85,19 +327,20 @@ class DocumentProcessor:
         base_metadata = self._extract_metadata(content, file_path)
 
         # 分割段落（按空行分割）
-        paragraphs = re.split(r'\n\s*\n', content.strip())
+        text = content.strip()
+        headings = self._heading_index(text)
+        paragraphs = self._split_with_offsets(text, r'\n\s*\n')
         chunks = []
 
-        for i, paragraph in enumerate(paragraphs):
+        for i, (offset, paragraph) in enumerate(paragraphs):
             if paragraph.strip():  # 忽略空段落
                 chunks.append({
                     'content': paragraph.strip(),
                     'metadata': {
                         **base_metadata,
-                        'chunk_id': f"{file_path.stem}_para_{i+1}",
                         'chunk_type': 'paragraph',
                         'paragraph_index': i + 1,
-                        'file_path': str(file_path.relative_to(file_path.parent.parent))
+                        'section_path': self._section_path(headings, offset)
                     }
                 })
 
@@ -109,31 +352,249 @@ class DocumentProcessor:
         base_metadata = self._extract_metadata(content, file_path)
 
         # 简单的句子分割（针对中文优化）
-        sentences = re.split(r'[。！？\n]\s*', content.strip())
+        text = content.strip()
+        headings = self._heading_index(text)
+        sentences = self._split_with_offsets(text, r'[。！？\n]\s*')
         chunks = []
 
-        for i, sentence in enumerate(sentences):
+        for i, (offset, sentence) in enumerate(sentences):
             sentence = sentence.strip()
             if sentence and len(sentence) > 10:  # 忽略太短的句子
                 chunks.append({
                     'content': sentence,
                     'metadata': {
                         **base_metadata,
-                        'chunk_id': f"{file_path.stem}_sent_{i+1}",
                         'chunk_type': 'sentence',
                         'sentence_index': i + 1,
-                        'file_path': str(file_path.relative_to(file_path.parent.parent))
+                        'section_path': self._section_path(headings, offset)
                     }
                 })
 
         return chunks
 
+    def _chunk_by_section(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
+        """
+        章节级别分块 - 按markdown结构切分并受token预算约束
+
+        标题、代码块、文本段落作为不可分割的基本单元（超出预算时才按行拆分），
+        同一章节内的单元依次装入分块直到达到token预算，新标题总是开启新分块。
+        分块内容是原文的连续片段，所有内容都被嵌入且不会被模型截断。
+        """
+        # 提取基本元数据
+        base_metadata = self._extract_metadata(content, file_path)
+
+        text = content.strip()
+        budget = self.section_token_budget
+        spans = []
+        current = None
+        heading_stack: List[Tuple[int, str]] = []
+
+        for start, end, kind in self._parse_blocks(text):
+            if kind == 'heading':
+                match = _HEADING_PATTERN.match(text[start:end])
+                level = len(match.group(1))
+                while heading_stack and heading_stack[-1][0] >= level:
+                    heading_stack.pop()
+                heading_stack.append((level, match.group(2)))
+
+                # 新章节开始新分块；连续的标题（如一级标题紧跟二级标题）合并在一起
+                if current and not current['headings_only']:
+                    spans.append(current)
+                    current = None
+
+            section_path = SECTION_PATH_SEPARATOR.join(title for _, title in heading_stack)
+            for piece_start, piece_end in self._split_to_budget(text, start, end, budget):
+                tokens = estimate_tokens(text[piece_start:piece_end])
+                if current and current['tokens'] + tokens > budget:
+                    spans.append(current)
+                    current = self._overlap_span(text, current, section_path)
+
+                if current is None:
+                    current = {'start': piece_start, 'end': piece_end, 'tokens': tokens,
+                               'section_path': section_path, 'headings_only': kind == 'heading'}
+                else:
+                    current['end'] = piece_end
+                    current['tokens'] += tokens
+                    if current['headings_only']:
+                        current['section_path'] = section_path
+                    current['headings_only'] = current['headings_only'] and kind == 'heading'
+
+        if current:
+            spans.append(current)
+
+        chunks = []
+        for i, span in enumerate(spans):
+            chunks.append({
+                'content': text[span['start']:span['end']].strip(),
+                'metadata': {
+                    **base_metadata,
+                    'chunk_type': 'section',
+                    'section_index': i + 1,
+                    'section_path': span['section_path'],
+                    'char_start': span['start'],
+                    'char_end': span['end']
+                }
+            })
+
+        return chunks
+
+    def _overlap_span(self, text: str, previous: Dict[str, Any], section_path: str) -> Optional[Dict[str, Any]]:
+        """
+        按重叠设置，以上一个分块末尾的若干行作为新分块的开头
+
+        只在同一章节内重叠；未启用重叠时返回None，新分块从下一个单元开始。
+        """
+        if self.section_overlap_tokens <= 0 or previous['section_path'] != section_path:
+            return None
+
+        start = previous['end']
+        tokens = 0
+        for line in reversed(text[previous['start']:previous['end']].splitlines(keepends=True)):
+            line_tokens = estimate_tokens(line)
+            if tokens + line_tokens > self.section_overlap_tokens:
+                break
+            start -= len(line)
+            tokens += line_tokens
+
+        if start >= previous['end']:
+            return None
+        return {'start': start, 'end': previous['end'], 'tokens': tokens,
+                'section_path': section_path, 'headings_only': False}
+
+    @staticmethod
+    def _parse_blocks(text: str) -> List[Tuple[int, int, str]]:
+        """
+        将markdown文本解析为基本单元
+
+        Returns:
+            (起始位置, 结束位置, 类型) 列表，类型为 heading、code 或 text
+        """
+        blocks = []
+        offset = 0
+        block_start = None
+        block_kind = None
+        block_end = 0
+
+        def flush():
+            nonlocal block_start
+            if block_start is not None:
+                blocks.append((block_start, block_end, block_kind))
+                block_start = None
+
+        for line in text.splitlines(keepends=True):
+            line_end = offset + len(line.rstrip('\r\n'))
+            if block_kind == 'code' and block_start is not None:
+                block_end = line_end
+                if _FENCE_PATTERN.match(line):
+                    flush()
+            elif _FENCE_PATTERN.match(line):
+                flush()
+                block_start, block_kind, block_end = offset, 'code', line_end
+            elif _HEADING_PATTERN.match(line.rstrip('\r\n')):
+                flush()
+                blocks.append((offset, line_end, 'heading'))
+            elif not line.strip():
+                flush()
+            else:
+                if block_start is None:
+                    block_start, block_kind = offset, 'text'
+                block_end = line_end
+            offset += len(line)
+
+        flush()
+        return blocks
+
+    @staticmethod
+    def _split_to_budget(text: str, start: int, end: int, budget: int) -> List[Tuple[int, int]]:
+        """
+        将超出预算的单元按行拆分，单行仍超出预算时按字符等比例拆分
+
+        Returns:
+            (起始位置, 结束位置) 列表，首尾相接覆盖整个单元
+        """
+        tokens = estimate_tokens(text[start:end])
+        if tokens <= budget:
+            return [(start, end)]
+
+        pieces = []
+        piece_start = start
+        piece_tokens = 0
+        offset = start
+        for line in text[start:end].splitlines(keepends=True):
+            line_tokens = estimate_tokens(line)
+            if piece_tokens and piece_tokens + line_tokens > budget:
+                pieces.append((piece_start, offset))
+                piece_start, piece_tokens = offset, 0
+
+            if line_tokens > budget:
+                # 超长单行：按字符等比例切分
+                step = max(1, len(line) * budget // line_tokens)
+                for line_offset in range(0, len(line), step):
+                    pieces.append((offset + line_offset, offset + min(len(line), line_offset + step)))
+                piece_start = offset + len(line)
+            else:
+                piece_tokens += line_tokens
+            offset += len(line)
+
+        if piece_start < end:
+            pieces.append((piece_start, end))
+        return pieces
+
+    @staticmethod
+    def _split_with_offsets(text: str, pattern: str) -> List[Tuple[int, str]]:
+        """与 re.split 相同的切分，同时返回每段在原文中的起始位置"""
+        segments = []
+        start = 0
+        for match in re.finditer(pattern, text):
+            segments.append((start, text[start:match.start()]))
+            start = match.end()
+        segments.append((start, text[start:]))
+        return segments
+
+    @staticmethod
+    def _heading_index(text: str) -> List[Tuple[int, int, str]]:
+        """
+        提取markdown标题（跳过代码块中的 # 注释）
+
+        Returns:
+            (起始位置, 标题级别, 标题文本) 列表
+        """
+        headings = []
+        in_fence = False
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            if _FENCE_PATTERN.match(line):
+                in_fence = not in_fence
+            elif not in_fence:
+                match = _HEADING_PATTERN.match(line.rstrip('\r\n'))
+                if match:
+                    headings.append((offset, len(match.group(1)), match.group(2)))
+            offset += len(line)
+        return headings
+
+    @staticmethod
+    def _section_path(headings: List[Tuple[int, int, str]], offset: int) -> str:
+        """计算指定位置所在的章节路径，如 “AI 编程指南 > 2. 如何实现 ViewModel > 步骤 1”"""
+        stack: List[Tuple[int, str]] = []
+        for heading_offset, level, title in headings:
+            if heading_offset > offset:
+                break
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, title))
+        return SECTION_PATH_SEPARATOR.join(title for _, title in stack)
+
     def _extract_metadata(self, content: str, file_path: Path) -> Dict[str, Any]:
         """从文档内容中提取元数据"""
+        # scope: 文档所属的知识库范围（core/components），component: 组件文档对应的组件名
+        scope, rel_path = self.locate(file_path)
         metadata = {
             'filename': file_path.name,
+            'file_path': rel_path,
             'file_type': file_path.suffix.lower(),
             'file_size': len(content),
+            'scope': scope,
+            'component': file_path.stem if scope == 'components' else '',
         }
 
         # 如果是markdown文件，提取标题
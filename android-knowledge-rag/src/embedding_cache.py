@@ -0,0 +1,302 @@
+"""
+嵌入向量磁盘缓存 - 按内容寻址，跨构建和粒度复用已计算的文档向量
+"""
+import hashlib
+import json
+import os
+import time
+import unicodedata
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, TextIO
+
+from config import EMBEDDING_DISK_CACHE_DIR, EMBEDDING_DISK_CACHE_MAX_ENTRIES
+from file_lock import file_lock
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EMBEDDING_CACHE_VERSION = 2
+
+# 内存中待写入的向量达到该数量时自动写出一个段
+_PENDING_FLUSH_SIZE = 4096
+# 段文件数超过该值，或段中不再被引用的行超过该比例时压缩
+_MAX_SEGMENTS = 64
+_MAX_GARBAGE_RATIO = 0.5
+
+
+def embedding_cache_key(model_key: str, text: str) -> str:
+    """
+    计算缓存键：模型标识与规范化文本的哈希
+
+    规范化只做Unicode NFC和去除首尾空白，不改变模型实际看到的内容。
+    """
+    normalized = unicodedata.normalize('NFC', text).strip()
+    return hashlib.sha256(f"{model_key}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    嵌入向量磁盘缓存
+
+    向量存放在只追加的段文件中（segments/<名称>.npy，float32，每行一个向量，写出后不再修改），
+    键到段和行号的映射以及最近使用时间存放在JSON索引中。新向量先保存在内存中，flush 时在
+    跨进程文件锁内重新读取磁盘上的索引，写出新段并合并后原子替换索引，多个构建进程同时写入
+    不会覆盖彼此的向量；写出段后、替换索引前中断留下的段不被索引引用，下次压缩时删除。
+    条目数超过上限时淘汰最久未使用的条目，失效的行过多时把仍被引用的向量压缩到一个新段。
+    缓存不随 build --reset 清除，重建时只有新内容需要重新嵌入。
+    """
+
+    def __init__(self, cache_dir: Path = EMBEDDING_DISK_CACHE_DIR,
+                 max_entries: int = EMBEDDING_DISK_CACHE_MAX_ENTRIES, output: Optional[TextIO] = None):
+        """
+        初始化嵌入缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_entries: 最大条目数
+            output: 日志输出流，None 表示标准输出
+        """
+        self.cache_dir = Path(cache_dir)
+        self.segments_dir = self.cache_dir / "segments"
+        self.index_path = self.cache_dir / "index.json"
+        self.lock_path = self.cache_dir / "cache.lock"
+        self.max_entries = max_entries
+        self.output = output
+        self.hits = 0
+        self.misses = 0
+
+        self._dim: Optional[int] = None
+        # 键 -> [段名称, 行号, 最近使用时间]
+        self._entries: Dict[str, list] = {}
+        # 段名称 -> 内存映射的向量
+        self._segments: Dict[str, "np.ndarray"] = {}
+        # 尚未写出的新向量，以及本进程使用过的键的最近使用时间
+        self._pending: Dict[str, "np.ndarray"] = {}
+        self._used: Dict[str, float] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries) + sum(1 for key in self._pending if key not in self._entries)
+
+    def _load(self):
+        """读取索引并映射其引用的段，文件缺失或不一致时视为空缓存"""
+        if not self.index_path.exists():
+            return
+
+        # 共享锁：读取期间其他进程不会压缩并删除索引引用的段；映射后段文件被删除也不影响读取
+        with file_lock(self.lock_path, shared=True):
+            data = self._read_index()
+            try:
+                segments = {name: self._open_segment(name, data['dim']) for name in data['segments']}
+            except Exception as e:
+                print(f"⚠️  嵌入缓存损坏，将重新计算向量: {e}", file=self.output)
+                return
+
+        self._dim = data['dim']
+        self._entries = data['entries']
+        self._segments = segments
+
+    def _read_index(self) -> Dict[str, Any]:
+        """读取磁盘上的索引，缺失、版本不符或损坏时返回空索引"""
+        empty = {'version': EMBEDDING_CACHE_VERSION, 'dim': None, 'segments': {}, 'entries': {}}
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return empty
+        except Exception as e:
+            print(f"⚠️  嵌入缓存索引损坏，将重新计算向量: {e}", file=self.output)
+            return empty
+        if data.get('version') != EMBEDDING_CACHE_VERSION:
+            return empty
+        return data
+
+    def _segment_path(self, name: str) -> Path:
+        return self.segments_dir / f"{name}.npy"
+
+    def _open_segment(self, name: str, dim: int) -> "np.ndarray":
+        import numpy as np
+
+        vectors = np.load(self._segment_path(name), mmap_mode='r')
+        if vectors.ndim != 2 or vectors.shape[1] != dim:
+            raise ValueError(f"段 {name} 的形状 {vectors.shape} 与维度 {dim} 不一致")
+        return vectors
+
+    def get_many(self, keys: List[str]) -> List[Optional["np.ndarray"]]:
+        """
+        批量读取向量
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            与输入顺序一致的向量列表，未命中的位置为None
+        """
+        now = time.time()
+        vectors = []
+        for key in keys:
+            pending = self._pending.get(key)
+            entry = self._entries.get(key)
+            if pending is not None:
+                vector = pending.copy()
+            elif entry is not None:
+                vector = self._segments[entry[0]][entry[1]].copy()
+            else:
+                self.misses += 1
+                vectors.append(None)
+                continue
+
+            self.hits += 1
+            self._used[key] = now
+            vectors.append(vector)
+        return vectors
+
+    def put_many(self, keys: List[str], vectors: List["np.ndarray"]):
+        """
+        批量写入向量，已存在的键只刷新最近使用时间
+
+        Args:
+            keys: 缓存键列表
+            vectors: 向量列表
+        """
+        import numpy as np
+
+        if not keys:
+            return
+
+        dim = len(vectors[0])
+        if self._dim != dim:
+            # 首次写入或模型维度变化：不再读取旧维度的向量，flush 时丢弃旧缓存
+            self._dim = dim
+            self._entries = {}
+            self._segments = {}
+            self._pending = {}
+
+        now = time.time()
+        for key, vector in zip(keys, vectors):
+            self._used[key] = now
+            if key not in self._entries:
+                self._pending[key] = np.asarray(vector, dtype=np.float32)
+
+        if len(self._pending) >= _PENDING_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """在文件锁内把新向量写出为新段，与磁盘上的索引合并后原子替换索引"""
+        if not (self._pending or self._used) or self._dim is None:
+            return
+
+        with file_lock(self.lock_path):
+            data = self._read_index()
+            if data['dim'] != self._dim:
+                # 磁盘上的缓存为空或由其他维度的模型写入：以当前维度重新开始
+                data = {'version': EMBEDDING_CACHE_VERSION, 'dim': self._dim, 'segments': {}, 'entries': {}}
+            entries = data['entries']
+
+            new_keys = [key for key in self._pending if key not in entries]
+            if new_keys:
+                name = self._write_segment([self._pending[key] for key in new_keys])
+                data['segments'][name] = len(new_keys)
+                for row, key in enumerate(new_keys):
+                    entries[key] = [name, row, 0.0]
+
+            for key, used in self._used.items():
+                entry = entries.get(key)
+                if entry is not None and used > entry[2]:
+                    entry[2] = used
+
+            if len(entries) > self.max_entries:
+                self._evict(entries, len(entries) - self.max_entries + max(1, self.max_entries // 10))
+            live_rows = len(entries)
+            total_rows = sum(data['segments'].values())
+            if len(data['segments']) > _MAX_SEGMENTS or total_rows - live_rows > total_rows * _MAX_GARBAGE_RATIO:
+                self._compact(data)
+
+            self._write_index(data)
+            self._remove_unreferenced_segments(data['segments'])
+
+            self._dim = data['dim']
+            self._entries = entries
+            self._segments = {
+                name: self._segments[name] if name in self._segments else self._open_segment(name, self._dim)
+                for name in data['segments']
+            }
+
+        self._pending = {}
+        self._used = {}
+
+    @staticmethod
+    def _evict(entries: Dict[str, list], count: int):
+        """淘汰最久未使用的若干条目（只从索引中移除，行在压缩时回收）"""
+        oldest = sorted(entries.items(), key=lambda item: item[1][2])[:count]
+        for key, _ in oldest:
+            del entries[key]
+
+    def _compact(self, data: Dict[str, Any]):
+        """把仍被引用的向量写入一个新段，索引改为引用新段"""
+        import numpy as np
+
+        entries = data['entries']
+        keys = list(entries)
+        segments = {name: self._segments.get(name) for name in data['segments']}
+        for name, vectors in segments.items():
+            if vectors is None:
+                segments[name] = self._open_segment(name, data['dim'])
+
+        vectors = [segments[entries[key][0]][entries[key][1]] for key in keys]
+        data['segments'] = {}
+        if not keys:
+            return
+
+        name = self._write_segment(vectors)
+        data['segments'][name] = len(keys)
+        for row, key in enumerate(keys):
+            entries[key][0:2] = [name, row]
+
+    def _write_segment(self, vectors: List["np.ndarray"]) -> str:
+        """写出一个新段（先写临时文件并同步到磁盘，再改名），返回段名称"""
+        import numpy as np
+
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        name = uuid.uuid4().hex[:16]
+        tmp_path = self.segments_dir / f"{name}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self._dim))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._segment_path(name))
+        return name
+
+    def _write_index(self, data: Dict[str, Any]):
+        """原子替换索引"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _remove_unreferenced_segments(self, segments: Dict[str, int]):
+        """删除索引不再引用的段（持有写锁时调用，没有其他进程正在写出段）"""
+        if not self.segments_dir.exists():
+            return
+        for path in self.segments_dir.iterdir():
+            if path.suffix in ('.npy', '.tmp') and path.stem not in segments:
+                try:
+                    path.unlink()
+                except OSError:
+                    # Windows 上仍被其他进程映射的段无法删除，下次再删除
+                    pass
+        # 旧版本的单文件向量缓存
+        legacy_path = self.cache_dir / "vectors.npy"
+        if legacy_path.exists():
+            legacy_path.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,205 @@
+"""
+嵌入引擎 - 封装SentenceTransformer，同一进程内的构建、检索和MCP服务共享同一个模型实例
+
+EMBEDDING_BACKEND 为 onnx 时使用 onnx_embedding.OnnxEmbeddingEngine，接口相同。
+"""
+import sys
+import threading
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_NUM_THREADS, EMBEDDING_NORMALIZE, EMBEDDING_BACKEND, EMBEDDING_BACKEND_TORCH, EMBEDDING_BACKEND_ONNX,
+    EMBEDDING_BACKENDS
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 写入ChromaDB集合配置的嵌入函数名称，不能与ChromaDB内置的嵌入函数重名，
+# 否则重新打开集合时ChromaDB会按配置另外构造内置的 SentenceTransformerEmbeddingFunction
+EMBEDDING_FUNCTION_NAME = "android_knowledge_embedding"
+
+_engines: Dict[tuple, "EmbeddingEngine"] = {}
+_engines_lock = threading.Lock()
+_registered = False
+
+
+def get_embedding_engine(model_name: str = EMBEDDING_MODEL, backend: Optional[str] = None) -> "EmbeddingEngine":
+    """
+    获取进程内共享的嵌入引擎
+
+    Args:
+        model_name: 嵌入模型名称
+        backend: 嵌入后端，torch 或 onnx，None 使用配置的 EMBEDDING_BACKEND
+
+    Returns:
+        同一模型名称和后端始终返回同一个引擎实例
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"不支持的嵌入后端: {backend}")
+
+    with _engines_lock:
+        engine = _engines.get((backend, model_name))
+        if engine is None:
+            if backend == EMBEDDING_BACKEND_ONNX:
+                from onnx_embedding import OnnxEmbeddingEngine
+                engine = OnnxEmbeddingEngine(model_name=model_name)
+            else:
+                engine = EmbeddingEngine(model_name=model_name)
+            _engines[(backend, model_name)] = engine
+        return engine
+
+
+def register_embedding_functions():
+    """
+    将嵌入引擎注册到ChromaDB的嵌入函数注册表（重复调用不会重复注册）
+
+    ChromaDB 1.x 把集合的嵌入函数名称和配置写入数据库，重新打开集合时按名称在注册表中查找并调用
+    build_from_config；注册后得到的是本进程共享的嵌入引擎，而不是再加载一个模型。
+    """
+    global _registered
+    if _registered:
+        return
+
+    try:
+        from chromadb.utils.embedding_functions import register_embedding_function
+    except ImportError:
+        # ChromaDB 0.x 不持久化嵌入函数，无需注册
+        _registered = True
+        return
+
+    from onnx_embedding import OnnxEmbeddingEngine
+
+    register_embedding_function(EmbeddingEngine)
+    register_embedding_function(OnnxEmbeddingEngine)
+    _registered = True
+
+
+class EmbeddingEngine:
+    """
+    嵌入引擎
+
+    实现ChromaDB的embedding_function协议，创建集合时直接传入，
+    避免ChromaDB另行加载默认嵌入模型。模型和torch在第一次编码时才加载，
+    只读取统计信息或按ID取文档的命令不会付出模型加载的开销。
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, device: str = EMBEDDING_DEVICE,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, num_threads: Optional[int] = EMBEDDING_NUM_THREADS,
+                 normalize: bool = EMBEDDING_NORMALIZE):
+        """
+        初始化嵌入引擎
+
+        Args:
+            model_name: 嵌入模型名称
+            device: 推理设备
+            batch_size: 模型单次编码的文本数
+            num_threads: CPU推理线程数，None 表示使用torch默认值
+            normalize: 是否对向量做L2归一化
+        """
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.normalize = normalize
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """模型是否已加载"""
+        return self._model is not None
+
+    @property
+    def backend(self) -> str:
+        """嵌入后端名称"""
+        return EMBEDDING_BACKEND_TORCH
+
+    @property
+    def cache_key(self) -> str:
+        """向量缓存的模型标识，不同后端（或量化）产生的向量不混用"""
+        return f"{self.model_name}|normalize={self.normalize}"
+
+    def load(self):
+        """加载模型（重复调用不会重复加载）"""
+        if self._model is not None:
+            return
+
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            from sentence_transformers import SentenceTransformer
+
+            if self.num_threads:
+                import torch
+                torch.set_num_threads(self.num_threads)
+
+            # 引擎在进程内共享，可能在MCP服务的检索线程中第一次编码时加载，标准输出被MCP协议占用，日志写入标准错误
+            print(f"🔄 加载嵌入模型: {self.model_name}", file=sys.stderr)
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+            print(f"✅ 嵌入模型加载完成", file=sys.stderr)
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        """
+        将文本编码为向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            float32 向量矩阵，形状为 (len(texts), dim)
+        """
+        import numpy as np
+
+        self.load()
+        return self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+
+    # ChromaDB embedding_function 协议
+
+    def __call__(self, input: List[str]) -> List["np.ndarray"]:
+        return list(self.encode(list(input)))
+
+    def embed_query(self, input: List[str]) -> List["np.ndarray"]:
+        return self(input)
+
+    @staticmethod
+    def name() -> str:
+        return EMBEDDING_FUNCTION_NAME
+
+    def get_config(self) -> Dict[str, Any]:
+        return {
+            'model_name': self.model_name,
+            'backend': self.backend,
+            'device': self.device,
+            'normalize_embeddings': self.normalize,
+        }
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "EmbeddingEngine":
+        # 返回进程内共享的引擎，集合与构建、检索共用同一个模型
+        return get_embedding_engine(config['model_name'], EMBEDDING_BACKEND_TORCH)
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> List[str]:
+        return ["cosine", "l2", "ip"]
+
+    def validate_config_update(self, old_config: Dict[str, Any], new_config: Dict[str, Any]):
+        return
+
+    @staticmethod
+    def validate_config(config: Dict[str, Any]):
+        return
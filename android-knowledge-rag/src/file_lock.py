@@ -0,0 +1,34 @@
+"""
+跨进程文件锁 - 同一数据目录下的多个进程（构建、监视、MCP服务）对共享文件的读改写互斥
+"""
+import contextlib
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，退化为不加锁
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """
+    持有锁文件上的 flock，退出上下文时释放
+
+    锁绑定在本次打开的文件上，同一进程的不同线程各自加锁时同样互斥。
+
+    Args:
+        path: 锁文件路径，不存在时创建
+        shared: 是否为共享锁（读），否则为排他锁（写）
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
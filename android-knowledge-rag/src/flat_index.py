@@ -0,0 +1,469 @@
+"""
+NumPy平面索引 - 暴力检索的向量存储，适合中小规模语料
+
+目录结构:
+    flat_index/meta.json                元数据边车文件（ID、内容、元数据、向量文件名）
+    flat_index/vectors-<标记>.npy       单位向量矩阵（float32，可选 float16/int8 量化），内存映射加载
+    flat_index/norms-<标记>.npy         原始向量的L2范数（float32）
+
+实现 VectorStore 用到的 ChromaDB 集合接口（count/get/upsert/update/delete/query），
+查询是一次矩阵乘法加 argpartition，返回结构与 ChromaDB 相同。打开索引只需读取边车文件
+和映射向量文件，不需要导入 chromadb，也不需要加载SQLite和HNSW段。
+
+每次写入先写新的向量文件，再原子替换边车文件提交；其他进程发现边车文件变化后重新加载，
+正在使用旧向量文件的查询不受影响。提交需要重写全部文件，大量写入应放在 batch() 中，退出时只提交一次。
+"""
+import contextlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from config import FLAT_INDEX_DTYPE, FLAT_INDEX_BLOCK_ROWS
+from lexical_index import matches_where
+
+FLAT_INDEX_VERSION = 1
+FLAT_INDEX_DTYPES = ('float32', 'float16', 'int8')
+FLAT_INDEX_SPACES = ('cosine', 'l2', 'ip')
+
+# int8 量化的缩放系数：单位向量的分量在 [-1, 1] 内
+_INT8_SCALE = 127.0
+# 每个边车版本缓存的过滤掩码数
+_MASK_CACHE_SIZE = 256
+
+
+class _Snapshot:
+    """一个已提交版本的索引内容，读取时整体引用，不会看到写到一半的状态"""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 vectors: np.ndarray, norms: np.ndarray, positions: Optional[Dict[str, int]] = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.vectors = vectors
+        self.norms = norms
+        self.positions = positions if positions is not None else {doc_id: row for row, doc_id in enumerate(ids)}
+        self.masks: Dict[str, np.ndarray] = {}
+
+
+class _WorkingSet:
+    """
+    写入中的可修改副本
+
+    新增的行按块暂存，覆盖、删除、读取向量或提交时才拼接，一批写入中多次追加不会反复复制整个矩阵。
+    """
+
+    def __init__(self, snapshot: _Snapshot, vectors: np.ndarray):
+        self.ids = list(snapshot.ids)
+        self.documents = list(snapshot.documents)
+        self.metadatas = list(snapshot.metadatas)
+        self.positions = dict(snapshot.positions)
+        self._vectors = vectors
+        self._norms = np.array(snapshot.norms, dtype=np.float32)
+        self._blocks: List[tuple] = []
+        self._snapshot: Optional[_Snapshot] = None
+
+    @property
+    def dim(self) -> int:
+        vectors = self._blocks[0][0] if self._blocks else self._vectors
+        return int(vectors.shape[1]) if vectors.ndim == 2 else 0
+
+    def arrays(self) -> tuple:
+        """拼接暂存的块，返回（向量矩阵, 范数）"""
+        if self._blocks:
+            vectors = [self._vectors] if len(self._vectors) else []
+            self._vectors = np.concatenate(vectors + [block for block, _ in self._blocks])
+            self._norms = np.concatenate([self._norms] + [norms for _, norms in self._blocks])
+            self._blocks = []
+        return self._vectors, self._norms
+
+    def append(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               vectors: np.ndarray, norms: np.ndarray):
+        for doc_id in ids:
+            self.positions[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self._blocks.append((vectors, norms))
+        self.changed()
+
+    def keep(self, rows: List[int]):
+        """只保留指定的行"""
+        vectors, norms = self.arrays()
+        self.ids = [self.ids[row] for row in rows]
+        self.documents = [self.documents[row] for row in rows]
+        self.metadatas = [self.metadatas[row] for row in rows]
+        self.positions = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._vectors, self._norms = vectors[rows], norms[rows]
+        self.changed()
+
+    def changed(self):
+        self._snapshot = None
+
+    def snapshot(self) -> _Snapshot:
+        """当前内容的只读视图，供批量写入期间的读取使用"""
+        if self._snapshot is None:
+            vectors, norms = self.arrays()
+            self._snapshot = _Snapshot(self.ids, self.documents, self.metadatas, vectors, norms, self.positions)
+        return self._snapshot
+
+
+class FlatIndex:
+    """
+    平面向量索引
+
+    距离的定义与 ChromaDB 的同名距离空间一致：cosine 为 1 - 余弦相似度，l2 为平方欧氏距离，
+    ip 为 1 - 内积。检索是精确的，结果与HNSW在召回完整时的结果相同。
+    """
+
+    def __init__(self, path: Path, dtype: str = FLAT_INDEX_DTYPE, space: str = 'cosine'):
+        """
+        打开（或创建空的）平面索引
+
+        Args:
+            path: 索引目录
+            dtype: 向量的存储类型，float32、float16 或 int8；只影响之后的写入，已有索引按其记录的类型读取
+            space: 距离空间，cosine、l2 或 ip
+        """
+        if dtype not in FLAT_INDEX_DTYPES:
+            raise ValueError(f"不支持的平面索引存储类型: {dtype}")
+        if space not in FLAT_INDEX_SPACES:
+            raise ValueError(f"不支持的距离空间: {space}")
+        self.space = space
+        self.path = Path(path)
+        self.meta_path = self.path / "meta.json"
+        self.dtype = dtype
+        # 写入时在锁内重新加载，需可重入
+        self._lock = threading.RLock()
+        # batch() 期间的写入暂存于此，退出时一次提交
+        self._batch: Optional[_WorkingSet] = None
+        self._signature = None
+        self._snapshot = _Snapshot([], [], [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32))
+        self._reload()
+
+    def _meta_signature(self):
+        try:
+            stat = self.meta_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _reload(self) -> _Snapshot:
+        """边车文件变化时（本进程或其他进程提交了写入）重新加载，返回当前版本；批量写入期间返回未提交的内容"""
+        batch = self._batch
+        if batch is not None:
+            return batch.snapshot()
+        signature = self._meta_signature()
+        if signature == self._signature:
+            return self._snapshot
+
+        with self._lock:
+            signature = self._meta_signature()
+            if signature == self._signature:
+                return self._snapshot
+            if signature is None:
+                self._snapshot = _Snapshot([], [], [], np.zeros((0, 0), dtype=np.float32),
+                                           np.zeros(0, dtype=np.float32))
+            else:
+                meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+                if meta.get('version') != FLAT_INDEX_VERSION:
+                    raise ValueError(f"平面索引版本不匹配: {meta.get('version')}，请执行 build --reset 重建")
+                self._snapshot = _Snapshot(
+                    meta['ids'], meta['documents'], meta['metadatas'],
+                    np.load(self.path / meta['vectors'], mmap_mode='r'),
+                    np.load(self.path / meta['norms'], mmap_mode='r'),
+                )
+            self._signature = signature
+            return self._snapshot
+
+    # ---- 向量编解码 ----
+
+    def _encode(self, units: np.ndarray) -> np.ndarray:
+        """单位向量 -> 存储类型"""
+        if self.dtype == 'int8':
+            return np.clip(np.rint(units * _INT8_SCALE), -127, 127).astype(np.int8)
+        return units.astype(self.dtype)
+
+    @staticmethod
+    def _decode(stored: np.ndarray) -> np.ndarray:
+        """存储类型 -> float32 单位向量"""
+        if stored.dtype == np.int8:
+            return stored.astype(np.float32) / _INT8_SCALE
+        return np.asarray(stored, dtype=np.float32)
+
+    @staticmethod
+    def _normalize(embeddings: Sequence[Any]) -> tuple:
+        """拆分为单位向量和范数"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        units = matrix / np.maximum(norms, 1e-12)[:, None]
+        return units, norms
+
+    # ---- 写入 ----
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        批量写入：期间的 upsert/update/delete 只修改内存中的副本（本实例的读取可以看到），
+        正常退出时提交一次，异常退出时丢弃。其他进程在提交前看到的仍是批量写入之前的版本。
+        """
+        with self._lock:
+            if self._batch is not None:
+                # 嵌套的批量写入并入外层
+                yield
+                return
+            self._batch = self._working_set()
+            try:
+                yield
+                batch, self._batch = self._batch, None
+                self._commit(batch)
+            finally:
+                self._batch = None
+
+    def _commit(self, working: _WorkingSet):
+        """写入新的向量文件，再原子替换边车文件"""
+        vectors, norms = working.arrays()
+        self.path.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex[:12]
+        vectors_name, norms_name = f"vectors-{token}.npy", f"norms-{token}.npy"
+        np.save(self.path / vectors_name, vectors)
+        np.save(self.path / norms_name, norms)
+
+        tmp_path = self.meta_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({
+            'version': FLAT_INDEX_VERSION,
+            'dtype': str(vectors.dtype),
+            'dim': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            'vectors': vectors_name,
+            'norms': norms_name,
+            'ids': working.ids,
+            'documents': working.documents,
+            'metadatas': working.metadatas,
+        }, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self.meta_path)
+
+        # 旧版本的向量文件已不被边车引用（已映射的进程在Linux/macOS上仍可继续读取）
+        for path in self.path.glob("*.npy"):
+            if path.name not in (vectors_name, norms_name):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _working_set(self) -> _WorkingSet:
+        """当前版本的可修改副本，量化类型与配置不一致时按配置重新编码"""
+        snapshot = self._reload()
+        vectors = np.array(snapshot.vectors)
+        if len(snapshot.ids) and vectors.dtype != np.dtype(self.dtype):
+            vectors = self._encode(self._decode(vectors))
+        return _WorkingSet(snapshot, vectors)
+
+    @contextlib.contextmanager
+    def _writing(self) -> Iterator[_WorkingSet]:
+        """单次写入：批量写入期间修改暂存的副本，否则修改当前版本的副本并立即提交"""
+        with self._lock:
+            if self._batch is not None:
+                yield self._batch
+                return
+            working = self._working_set()
+            yield working
+            self._commit(working)
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               embeddings: Sequence[Any]):
+        """插入或覆盖文档"""
+        if not ids:
+            return
+        units, new_norms = self._normalize(embeddings)
+        encoded = self._encode(units)
+
+        with self._writing() as working:
+            if working.ids and working.dim != encoded.shape[1]:
+                raise ValueError(f"向量维度不一致: 索引为 {working.dim}，写入为 {encoded.shape[1]}")
+
+            appended = []
+            overwritten = []
+            # 同一批次内重复的ID以最后一次为准
+            for i in sorted({doc_id: i for i, doc_id in enumerate(ids)}.values()):
+                row = working.positions.get(ids[i])
+                if row is None:
+                    appended.append(i)
+                else:
+                    overwritten.append((row, i))
+
+            if overwritten:
+                vectors, norms = working.arrays()
+                for row, i in overwritten:
+                    working.documents[row] = documents[i]
+                    working.metadatas[row] = metadatas[i]
+                    vectors[row] = encoded[i]
+                    norms[row] = new_norms[i]
+                working.changed()
+            if appended:
+                working.append(
+                    [ids[i] for i in appended], [documents[i] for i in appended], [metadatas[i] for i in appended],
+                    encoded[appended], new_norms[appended]
+                )
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+            embeddings: Sequence[Any]):
+        """添加文档（与 upsert 相同）"""
+        self.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """只更新元数据，不存在的ID被忽略"""
+        with self._writing() as working:
+            for doc_id, metadata in zip(ids, metadatas):
+                row = working.positions.get(doc_id)
+                if row is not None:
+                    working.metadatas[row] = metadata
+            working.changed()
+
+    def delete(self, ids: List[str]):
+        """按ID删除文档"""
+        removed = set(ids)
+        with self._lock:
+            if not any(doc_id in self._reload().positions for doc_id in removed):
+                return
+            with self._writing() as working:
+                working.keep([row for row, doc_id in enumerate(working.ids) if doc_id not in removed])
+
+    def reset(self):
+        """清空索引"""
+        with self._writing() as working:
+            working.keep([])
+
+    # ---- 读取 ----
+
+    def count(self) -> int:
+        return len(self._reload().ids)
+
+    def get(self, ids: Optional[List[str]] = None, include: Iterable[str] = ('documents', 'metadatas'),
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        """
+        按ID或按插入顺序分页读取文档
+
+        Returns:
+            与 ChromaDB 相同结构的结果：ids、documents、metadatas、embeddings（未请求的字段为None）
+        """
+        snapshot = self._reload()
+        if ids is not None:
+            rows = [snapshot.positions[doc_id] for doc_id in ids if doc_id in snapshot.positions]
+        else:
+            end = len(snapshot.ids) if limit is None else offset + limit
+            rows = list(range(min(offset, len(snapshot.ids)), min(end, len(snapshot.ids))))
+        return self._rows(snapshot, rows, include)
+
+    def _rows(self, snapshot: _Snapshot, rows: List[int], include: Iterable[str]) -> Dict[str, Any]:
+        include = set(include)
+        embeddings = None
+        if 'embeddings' in include:
+            embeddings = self._decode(snapshot.vectors[rows]) * np.asarray(snapshot.norms[rows])[:, None] \
+                if rows else np.zeros((0, 0), dtype=np.float32)
+        return {
+            'ids': [snapshot.ids[row] for row in rows],
+            'documents': [snapshot.documents[row] for row in rows] if 'documents' in include else None,
+            'metadatas': [dict(snapshot.metadatas[row]) for row in rows] if 'metadatas' in include else None,
+            'embeddings': embeddings,
+        }
+
+    def _mask(self, snapshot: _Snapshot, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """满足过滤条件的行号，无过滤条件时返回None；同一版本内按条件缓存"""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        rows = snapshot.masks.get(key)
+        if rows is None:
+            rows = np.fromiter(
+                (row for row, metadata in enumerate(snapshot.metadatas) if matches_where(metadata, where)),
+                dtype=np.int64
+            )
+            if len(snapshot.masks) >= _MASK_CACHE_SIZE:
+                snapshot.masks.clear()
+            snapshot.masks[key] = rows
+        return rows
+
+    def query(self, query_embeddings: Sequence[Any], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Iterable[str] = ('documents', 'metadatas', 'distances')) -> Dict[str, Any]:
+        """
+        精确最近邻检索
+
+        Args:
+            query_embeddings: 查询向量列表
+            n_results: 每个查询返回的结果数
+            where: 元数据过滤条件（ChromaDB where语法）
+            include: 返回的字段
+
+        Returns:
+            与 ChromaDB 相同结构的结果，每个字段为“每个查询一个列表”
+        """
+        snapshot = self._reload()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        rows = self._mask(snapshot, where)
+        candidates = len(snapshot.ids) if rows is None else len(rows)
+        k = min(n_results, candidates)
+        outputs = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        if k <= 0:
+            for values in outputs.values():
+                values.extend([] for _ in range(len(queries)))
+            return outputs
+
+        distances = self._distances(snapshot, queries, rows)
+
+        if k < candidates:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(candidates), (len(queries), candidates))
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+
+        include = set(include)
+        for query_row, positions in enumerate(top):
+            result_rows = positions.tolist() if rows is None else rows[positions].tolist()
+            formatted = self._rows(snapshot, result_rows, include)
+            outputs['ids'].append(formatted['ids'])
+            outputs['documents'].append(formatted['documents'])
+            outputs['metadatas'].append(formatted['metadatas'])
+            outputs['distances'].append(
+                distances[query_row, positions].tolist() if 'distances' in include else None
+            )
+        return outputs
+
+    def _distances(self, snapshot: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """查询与候选行的距离矩阵（查询数 x 候选数），u 为存储的单位向量，|x| 为原始向量的范数"""
+        dots = self._dot(snapshot.vectors, queries, rows)
+        if self.space == 'cosine':
+            # 1 - (q·u)/|q|
+            query_norms = np.maximum(np.linalg.norm(queries, axis=1), 1e-12)
+            return 1.0 - dots / query_norms[:, None]
+
+        norms = np.asarray(snapshot.norms if rows is None else snapshot.norms[rows], dtype=np.float32)
+        if self.space == 'ip':
+            # 1 - |x|(q·u)
+            return 1.0 - norms[None, :] * dots
+        # |q|² + |x|² - 2|x|(q·u)
+        distances = (np.einsum('ij,ij->i', queries, queries)[:, None] + (norms * norms)[None, :]
+                     - 2.0 * norms[None, :] * dots)
+        return np.maximum(distances, 0.0, out=distances)
+
+    def _dot(self, vectors: np.ndarray, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """查询向量与存储的单位向量的内积，量化存储按块解码，峰值内存与块大小有关"""
+        if rows is not None:
+            return (self._decode(vectors[rows]) @ queries.T).T
+        if vectors.dtype == np.float32:
+            return (vectors @ queries.T).T
+        blocks = [
+            self._decode(vectors[start:start + FLAT_INDEX_BLOCK_ROWS]) @ queries.T
+            for start in range(0, len(vectors), FLAT_INDEX_BLOCK_ROWS)
+        ]
+        return np.concatenate(blocks).T
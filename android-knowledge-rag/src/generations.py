@@ -0,0 +1,299 @@
+"""
+索引代管理 - 在新目录中构建索引，校验通过后原子切换 CURRENT 指针
+
+目录结构:
+    data/CURRENT                        当前代的名称
+    data/generations/<名称>/chroma_db    向量数据库（chroma 后端）
+    data/generations/<名称>/flat_index   平面向量索引（flat 后端）
+    data/generations/<名称>/bm25_index.json
+    data/generations/<名称>/manifest.json
+    data/generations/<名称>/SCRATCH      临时代的标记（创建进程的PID），不参与垃圾回收
+
+没有 CURRENT 指针时使用旧布局（data/chroma_db 等），第一次构建会从旧布局复制出第一代。
+监听到的少量变化直接写入当前代，写完后重写指定同一代的 CURRENT 指针，通知检索进程重新打开该代。
+"""
+import contextlib
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+from config import (
+    DATA_DIR, CHROMA_PATH, VECTOR_BACKEND_FLAT, FLAT_INDEX_PATH, LEXICAL_INDEX_PATH, MANIFEST_PATH,
+    GENERATIONS_DIR, CURRENT_GENERATION_PATH, GENERATIONS_KEEP, GENERATIONS_LOCK_PATH, INDEX_VERSION_PATH
+)
+from file_lock import file_lock
+
+if TYPE_CHECKING:
+    from manifest import IndexManifest
+    from vector_store import VectorStore
+
+# 激活前自检：用已存储的向量检索的近邻数，以及视为同一向量的最大距离
+_SELF_CHECK_NEIGHBOURS = 10
+_SELF_CHECK_TOLERANCE = 1e-4
+
+# 本进程最近一次写入的 CURRENT 指针的签名
+_published_signature: Optional[tuple] = None
+
+# 临时代目录中的标记文件
+SCRATCH_MARKER = "SCRATCH"
+
+
+class IndexGeneration:
+    """一代索引的文件位置"""
+
+    def __init__(self, name: str, chroma_path: Path, flat_index_path: Path, lexical_index_path: Path,
+                 manifest_path: Path):
+        """
+        Args:
+            name: 代的名称，旧布局为空字符串
+            chroma_path: 向量数据库目录
+            flat_index_path: 平面向量索引目录
+            lexical_index_path: BM25词法索引文件
+            manifest_path: 索引清单文件
+        """
+        self.name = name
+        self.chroma_path = chroma_path
+        self.flat_index_path = flat_index_path
+        self.lexical_index_path = lexical_index_path
+        self.manifest_path = manifest_path
+
+    @classmethod
+    def named(cls, name: str) -> "IndexGeneration":
+        """generations 目录下指定名称的代"""
+        root = GENERATIONS_DIR / name
+        return cls(name, root / "chroma_db", root / "flat_index", root / "bm25_index.json", root / "manifest.json")
+
+    @classmethod
+    def legacy(cls) -> "IndexGeneration":
+        """引入索引代之前的旧布局"""
+        return cls("", CHROMA_PATH, FLAT_INDEX_PATH, LEXICAL_INDEX_PATH, MANIFEST_PATH)
+
+    def db_path(self, backend: str) -> Path:
+        """指定向量存储后端的数据目录"""
+        return self.flat_index_path if backend == VECTOR_BACKEND_FLAT else self.chroma_path
+
+    @property
+    def root(self) -> Path:
+        return GENERATIONS_DIR / self.name if self.name else DATA_DIR
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IndexGeneration) and self.chroma_path == other.chroma_path
+
+    def __repr__(self) -> str:
+        return f"IndexGeneration({self.name or 'legacy'!r})"
+
+
+def current_generation() -> IndexGeneration:
+    """CURRENT 指针指向的代，没有指针（或指向的代已不存在）时为旧布局"""
+    try:
+        name = CURRENT_GENERATION_PATH.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        name = ""
+    if name:
+        generation = IndexGeneration.named(name)
+        if generation.root.exists():
+            return generation
+    return IndexGeneration.legacy()
+
+
+@contextlib.contextmanager
+def generation_write_lock() -> Iterator[None]:
+    """
+    索引代写锁：从读取当前代、复制、写入到激活新的一代期间持有
+
+    build 和监听进程都只在新的一代中写入，持锁保证复制时当前代不会被其他写入者替换，
+    两个写入者也不会各自基于同一代构建而丢失对方的更新。
+    """
+    with file_lock(GENERATIONS_LOCK_PATH):
+        yield
+
+
+def create_generation(clone_from: Optional[IndexGeneration] = None) -> IndexGeneration:
+    """
+    创建新的一代
+
+    Args:
+        clone_from: 从该代复制向量数据库、词法索引和清单（增量构建），None 表示创建空的一代
+
+    Returns:
+        新的一代（尚未激活）
+    """
+    # 名称为UTC时间加纳秒，按名称排序即按创建时间排序（垃圾回收依赖这一点）；
+    # 写入者在写锁内依次创建，极少数同名时顺延一纳秒
+    timestamp = time.time_ns()
+    while True:
+        seconds, nanoseconds = divmod(timestamp, 1_000_000_000)
+        generation = IndexGeneration.named(f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(seconds))}-{nanoseconds:09d}")
+        try:
+            generation.root.mkdir(parents=True)
+            break
+        except FileExistsError:
+            timestamp += 1
+
+    if clone_from is not None:
+        for source, target in ((clone_from.chroma_path, generation.chroma_path),
+                               (clone_from.flat_index_path, generation.flat_index_path)):
+            if source.exists():
+                shutil.copytree(source, target)
+        for source, target in ((clone_from.lexical_index_path, generation.lexical_index_path),
+                               (clone_from.manifest_path, generation.manifest_path)):
+            if source.exists():
+                shutil.copy2(source, target)
+    return generation
+
+
+def validate_generation(vector_store: "VectorStore", manifest: "IndexManifest") -> List[str]:
+    """
+    激活前校验新的一代
+
+    检查集合分块数与清单一致、词法索引可加载，并用集合中的一个向量做一次HNSW查询。
+
+    Returns:
+        问题列表，为空表示校验通过
+    """
+    from lexical_index import BM25Index
+
+    problems = []
+    count = vector_store.collection.count()
+    expected = sum(len(manifest.get(path)['chunk_ids']) for path in manifest.paths())
+    if count != expected:
+        problems.append(f"集合有 {count} 个分块，清单记录了 {expected} 个")
+    if count == 0:
+        return problems
+
+    try:
+        lexical_index = BM25Index.load(vector_store.lexical_index_path)
+        if lexical_index is None:
+            problems.append("词法索引不存在或版本不匹配")
+        elif len(lexical_index) != count:
+            problems.append(f"词法索引有 {len(lexical_index)} 个分块，集合有 {count} 个")
+    except Exception as e:
+        problems.append(f"词法索引无法加载: {e}")
+
+    try:
+        sample = vector_store.collection.get(limit=1, include=['embeddings'])
+        results = vector_store.collection.query(
+            query_embeddings=[sample['embeddings'][0]], n_results=min(count, _SELF_CHECK_NEIGHBOURS),
+            include=['distances']
+        )
+        ids, distances = results['ids'][0], results['distances'][0]
+        # 同一段文本在多个粒度下的分块向量相同，距离并列时返回哪个分块不确定：
+        # 检索到该分块本身，或最近邻与它距离为0（向量完全相同）都算通过
+        if sample['ids'][0] not in ids and not (distances and distances[0] <= _SELF_CHECK_TOLERANCE):
+            problems.append("向量索引自检失败：用已存储的向量检索不到该分块")
+    except Exception as e:
+        problems.append(f"向量索引查询失败: {e}")
+    return problems
+
+
+def pointer_signature() -> Optional[tuple]:
+    """CURRENT 指针文件的签名（修改时间和inode），每次写入指针都会变化；没有指针时为None"""
+    try:
+        stat = CURRENT_GENERATION_PATH.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def published_here(signature: Optional[tuple]) -> bool:
+    """指针是否由本进程最近一次写入（本进程中的客户端与写入者共享数据库连接，已能看到写入）"""
+    return signature is not None and signature == _published_signature
+
+
+def activate_generation(generation: IndexGeneration):
+    """
+    原子更新 CURRENT 指针，检索进程在下一次查询时切换到该代
+
+    指针已指向该代时（原地更新了当前代）同样重写指针，其他进程据此重新打开该代。
+    检索可见的内容只在这里变化，索引版本标记也只在这里更新：先切换指针再更新版本，
+    检索进程不会把旧一代的结果缓存在新版本下。
+    """
+    global _published_signature
+
+    CURRENT_GENERATION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CURRENT_GENERATION_PATH.with_suffix('.tmp')
+    tmp_path.write_text(generation.name, encoding='utf-8')
+    os.replace(tmp_path, CURRENT_GENERATION_PATH)
+    _published_signature = pointer_signature()
+
+    version_tmp_path = INDEX_VERSION_PATH.with_suffix('.tmp')
+    version_tmp_path.write_text(uuid.uuid4().hex, encoding='utf-8')
+    os.replace(version_tmp_path, INDEX_VERSION_PATH)
+
+
+@contextlib.contextmanager
+def scratch_generation() -> Iterator[IndexGeneration]:
+    """
+    当前代的临时副本（如调优时在副本上修改集合配置），退出时删除
+
+    副本在写锁内复制并写入标记文件，之后不再持锁；垃圾回收跳过创建进程仍在运行的临时代，
+    也不把它计入保留的代数。
+    """
+    with generation_write_lock():
+        generation = create_generation(current_generation())
+        (generation.root / SCRATCH_MARKER).write_text(str(os.getpid()), encoding='utf-8')
+    try:
+        yield generation
+    finally:
+        discard_generation(generation)
+
+
+def _scratch_in_use(root: Path) -> Optional[bool]:
+    """临时代的创建进程是否仍在运行，不是临时代时返回None"""
+    try:
+        pid = int((root / SCRATCH_MARKER).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def discard_generation(generation: IndexGeneration):
+    """删除未激活的一代（如校验失败或构建中断）"""
+    if generation.name and generation != current_generation():
+        shutil.rmtree(generation.root, ignore_errors=True)
+
+
+def collect_garbage(keep: int = GENERATIONS_KEEP) -> List[str]:
+    """
+    清理旧的代，保留最新的 keep 代（始终保留当前代），旧布局不受影响
+
+    正在使用的临时代不删除也不计入 keep，创建进程已退出的临时代直接删除。
+
+    Returns:
+        被删除的代的名称
+    """
+    if not GENERATIONS_DIR.exists():
+        return []
+
+    current = current_generation().name
+    names = []
+    removed = []
+    for path in GENERATIONS_DIR.iterdir():
+        if not path.is_dir():
+            continue
+        in_use = _scratch_in_use(path)
+        if in_use is None:
+            names.append(path.name)
+        elif not in_use:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+
+    # 名称以创建时间开头，按名称排序即按创建时间排序
+    names.sort(reverse=True)
+    kept = {current} | set(names[:max(keep, 1)])
+    for name in names:
+        if name not in kept:
+            shutil.rmtree(GENERATIONS_DIR / name, ignore_errors=True)
+            removed.append(name)
+    return removed
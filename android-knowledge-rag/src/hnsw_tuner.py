@@ -0,0 +1,138 @@
+"""
+HNSW调优 - 扫描 search_ef，与暴力检索的精确结果对比召回率和延迟
+"""
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from config import TUNE_TARGET_RECALL, TUNE_SEARCH_EF_CANDIDATES, TUNE_SAMPLE_QUERIES, WRITE_BATCH_SIZE
+from vector_store import VectorStore
+
+
+def _load_embeddings(vector_store: VectorStore, page_size: int = WRITE_BATCH_SIZE) -> tuple:
+    """分页读取集合中的全部ID和向量"""
+    ids: List[str] = []
+    blocks = []
+    offset = 0
+    while True:
+        page = vector_store.collection.get(include=['embeddings'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        ids.extend(page['ids'])
+        blocks.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+    return ids, (np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32))
+
+
+def exact_distances(matrix: np.ndarray, queries: np.ndarray, space: str) -> np.ndarray:
+    """
+    暴力计算每个查询到全部向量的距离
+
+    Args:
+        matrix: 全部向量
+        queries: 查询向量
+        space: 距离空间，cosine、l2 或 ip
+
+    Returns:
+        距离矩阵（查询数 x 向量数）
+    """
+    dots = queries @ matrix.T
+    if space == 'cosine':
+        norms = np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+        query_norms = np.maximum(np.linalg.norm(queries, axis=1), 1e-12)
+        distances = 1.0 - dots / query_norms[:, None] / norms[None, :]
+    elif space == 'ip':
+        distances = 1.0 - dots
+    else:
+        distances = (queries * queries).sum(axis=1)[:, None] + (matrix * matrix).sum(axis=1)[None, :] - 2.0 * dots
+    return distances
+
+
+def tune_search_ef(vector_store: VectorStore, target_recall: float = TUNE_TARGET_RECALL,
+                   candidates: Sequence[int] = TUNE_SEARCH_EF_CANDIDATES, top_k: int = 10,
+                   sample_size: int = TUNE_SAMPLE_QUERIES, repeats: int = 3, seed: int = 0) -> Dict[str, Any]:
+    """
+    扫描 search_ef，选出满足目标召回率的最快设置
+
+    查询为集合中随机抽样的已存储向量，精确结果由暴力检索得到：距离不超过第 top_k 近的精确距离的结果
+    都算命中（距离相同的向量互相等价）。每个 search_ef 写入集合配置并重新打开集合
+    （HNSW段按新的配置加载）后逐条查询，延迟取 repeats 轮中每条查询的中位数。
+    扫描会改写集合配置，应传入当前代的临时副本（generations.scratch_generation）。
+
+    Args:
+        vector_store: chroma 后端的向量存储（临时副本）
+        target_recall: 目标 recall@top_k
+        candidates: 待比较的 search_ef
+        top_k: 每个查询的结果数
+        sample_size: 抽样查询数
+        repeats: 每个查询的重复次数
+        seed: 抽样随机种子
+
+    Returns:
+        documents、queries、top_k、target_recall、results（每个 search_ef 的 recall 和延迟）、
+        best（满足目标的最快设置，都不满足时为召回率最高的设置）
+
+    Raises:
+        ValueError: 集合为空
+    """
+    ids, matrix = _load_embeddings(vector_store)
+    if not ids:
+        raise ValueError("集合为空，请先执行 build")
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(ids), size=min(sample_size, len(ids)), replace=False)
+    queries = matrix[rows]
+    top_k = min(top_k, len(ids))
+    distances = exact_distances(matrix, queries, vector_store.space)
+    # 每个查询第 top_k 近的精确距离，留出浮点误差
+    bounds = np.partition(distances, top_k - 1, axis=1)[:, top_k - 1] + 1e-5
+    positions = {doc_id: row for row, doc_id in enumerate(ids)}
+
+    original = vector_store.search_ef
+    results = []
+    for search_ef in sorted(set(candidates)):
+        if not vector_store.set_search_ef(search_ef):
+            raise RuntimeError("当前 ChromaDB 版本不支持修改 search_ef")
+        collection = vector_store.collection
+        # 预热：加载HNSW段
+        collection.query(query_embeddings=queries[:1].tolist(), n_results=top_k, include=[])
+
+        hits = 0
+        latencies = []
+        for query_row, query in enumerate(queries.tolist()):
+            durations = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                found = collection.query(query_embeddings=[query], n_results=top_k, include=[])['ids'][0]
+                durations.append(time.perf_counter() - start)
+            latencies.append(float(np.median(durations)) * 1000)
+            hits += sum(distances[query_row, positions[doc_id]] <= bounds[query_row] for doc_id in found)
+
+        results.append({
+            'search_ef': search_ef,
+            'recall': round(hits / (len(queries) * top_k), 4),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        })
+
+    qualified = [result for result in results if result['recall'] >= target_recall]
+    if qualified:
+        # 延迟相差不到5%视为测量噪声，取其中最小的 search_ef
+        fastest = min(result['p50_ms'] for result in qualified)
+        best = min(
+            (result for result in qualified if result['p50_ms'] <= fastest * 1.05),
+            key=lambda result: result['search_ef']
+        )
+    else:
+        best = max(results, key=lambda result: (result['recall'], -result['p50_ms']))
+
+    return {
+        'documents': len(ids),
+        'queries': len(queries),
+        'top_k': top_k,
+        'target_recall': target_recall,
+        'current_search_ef': original,
+        'results': results,
+        'best': {**best, 'meets_target': bool(qualified)},
+    }
@@ -0,0 +1,426 @@
+"""
+增量索引器 - 基于索引清单只处理变化的文件
+"""
+import os
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, TextIO, Tuple, Union
+
+from config import VECTOR_BACKEND_FLAT
+from document_processor import DocumentProcessor
+from generations import (
+    current_generation, create_generation, validate_generation, activate_generation, discard_generation,
+    collect_garbage, generation_write_lock
+)
+from manifest import IndexManifest
+from metrics import metrics
+from vector_store import VectorStore
+
+
+def describe_sync(summary: Dict[str, Any]) -> str:
+    """一行描述同步结果，用于监听模式的日志"""
+    if not (summary['added'] or summary['updated'] or summary['removed'] or summary['failed']):
+        return "索引已是最新"
+    return (
+        f"新增 {summary['added']} 个文件，更新 {summary['updated']} 个，移除 {summary['removed']} 个，"
+        f"失败 {summary['failed']} 个；写入 {summary['chunks_upserted']} 个分块，"
+        f"删除 {summary['chunks_deleted']} 个"
+    )
+
+
+def _empty_summary() -> Dict[str, Any]:
+    return {
+        'added': 0,
+        'updated': 0,
+        'removed': 0,
+        'unchanged': 0,
+        'failed': 0,
+        'errors': [],
+        'chunks_upserted': 0,
+        'chunks_deleted': 0,
+        'chunks_kept': 0,
+    }
+
+
+def _index_changed(summary: Dict[str, Any]) -> bool:
+    """同步是否改变了集合或词法索引（文件只是被touch时不变）"""
+    return bool(summary['added'] or summary['updated'] or summary['removed'] or summary['chunks_deleted']
+                or 'lexical_documents' in summary)
+
+
+def _search_ef_changed(vector_store: VectorStore, search_ef: Optional[int]) -> bool:
+    return search_ef is not None and vector_store.backend != VECTOR_BACKEND_FLAT and vector_store.search_ef != search_ef
+
+
+def sync_generation(processor: DocumentProcessor, knowledge_dirs: Union[Path, Iterable[Path]],
+                    paths: Optional[Iterable[Path]] = None, reset: bool = False, search_ef: Optional[int] = None,
+                    progress_callback: Optional[Callable[[int], None]] = None,
+                    output: Optional[TextIO] = None, in_place: bool = False) -> Dict[str, Any]:
+    """
+    在新的一代中同步知识库，校验通过后激活（build 和监听共用的写入路径）
+
+    检索进程只读取已激活的代，不会读到写了一半的索引。全程持有索引代写锁，复制当前代时
+    没有其他进程在写入。先按修改时间和大小对比当前代的清单，没有变化时不复制当前代。
+
+    in_place 时只同步 paths 中的文件，直接写入当前代并增量更新词法索引，写完后重写 CURRENT 指针
+    通知检索进程：复制整个当前代和重建词法索引的开销与语料规模成正比，不适合监听到的单个文件变化。
+    当前代为旧布局、与清单不一致或需要修改 search_ef 时仍在新的一代中同步。
+
+    Args:
+        processor: 文档处理器
+        knowledge_dirs: 知识库目录
+        paths: 只同步这些文件（如监听到的变化文件），None 表示扫描整个目录
+        reset: 是否在空的一代中全量重建
+        search_ef: 写入新一代集合配置的 search_ef，None 表示沿用当前代的配置
+        progress_callback: 写入进度回调，参数为已写入的分块数
+        output: 同步过程的日志输出流，None 表示标准输出（后台同步时显式传入，不重定向全局的标准输出）
+        in_place: 是否把 paths 的变化直接写入当前代
+
+    Returns:
+        同步结果：summary 同步统计，generation 同步后的当前代，activated 是否激活了新的一代（或原地更新了当前代），
+        problems 校验问题（非空时新的一代已丢弃），stats 数据库统计，removed_generations 被清理的旧代
+    """
+    with generation_write_lock():
+        current = current_generation()
+        result = {
+            'summary': _empty_summary(),
+            'generation': current,
+            'activated': False,
+            'problems': [],
+            'stats': {},
+            'removed_generations': [],
+        }
+
+        # 旧布局总是复制出第一代
+        if not reset and current.name:
+            current_store = VectorStore(generation=current, output=output)
+            try:
+                indexer = KnowledgeIndexer(
+                    processor, current_store, IndexManifest(current.manifest_path, output=output), output=output
+                )
+                changes = indexer.scan_changes(knowledge_dirs, paths)
+                search_ef_changed = _search_ef_changed(current_store, search_ef)
+                if changes['consistent'] and not (changes['changed'] or changes['removed'] or search_ef_changed):
+                    result['summary']['unchanged'] = changes['unchanged']
+                    result['stats'] = current_store.get_stats()
+                    return result
+
+                if in_place and paths is not None and changes['consistent'] and not search_ef_changed:
+                    result['summary'] = indexer.sync(knowledge_dirs, progress_callback, paths)
+                    result['stats'] = current_store.get_stats()
+                    if _index_changed(result['summary']):
+                        activate_generation(current)
+                        result['activated'] = True
+                    return result
+            finally:
+                current_store.close()
+            if not changes['consistent']:
+                # 集合与清单不一致（如残留孤立分块）时全量扫描，同步时一并清理
+                paths = None
+
+        target = create_generation(None if reset else current)
+        vector_store = None
+        try:
+            vector_store = VectorStore(generation=target, output=output)
+            # 从当前代复制的集合保留着旧的 search_ef
+            search_ef_changed = _search_ef_changed(vector_store, search_ef)
+            if search_ef is not None:
+                vector_store.set_search_ef(search_ef, reopen=False)
+            manifest = IndexManifest(target.manifest_path, output=output)
+            summary = KnowledgeIndexer(processor, vector_store, manifest, output=output).sync(
+                knowledge_dirs, progress_callback, paths
+            )
+            problems = validate_generation(vector_store, manifest)
+            result['stats'] = vector_store.get_stats()
+        except BaseException:
+            discard_generation(target)
+            raise
+        finally:
+            # 检索进程自行打开激活的代，写入用的客户端在切换、丢弃或清理之前释放
+            if vector_store is not None:
+                vector_store.close()
+
+        result['summary'] = summary
+        if problems:
+            discard_generation(target)
+            result['problems'] = problems
+            result['stats'] = {}
+            return result
+
+        # 没有变化（如文件只是被touch）时保留当前代，不做切换
+        if reset or current.name == "" or search_ef_changed or _index_changed(summary):
+            activate_generation(target)
+            result.update(generation=target, activated=True, removed_generations=collect_garbage())
+        else:
+            discard_generation(target)
+        return result
+
+
+class KnowledgeIndexer:
+    """增量索引器，对比索引清单，只重新分块和嵌入变化的文件"""
+
+    def __init__(self, processor: DocumentProcessor, vector_store: VectorStore, manifest: IndexManifest,
+                 output: Optional[TextIO] = None):
+        self.processor = processor
+        self.vector_store = vector_store
+        self.manifest = manifest
+        self.output = output
+        self._lexical_delta: Optional[Dict[str, Any]] = None
+
+    def sync(self, knowledge_dirs: Union[Path, Iterable[Path]],
+             progress_callback: Optional[Callable[[int], None]] = None,
+             paths: Optional[Iterable[Path]] = None) -> Dict[str, Any]:
+        """
+        将知识库目录同步到向量数据库
+
+        变化文件的分块以流的形式分批嵌入和写入，不会一次性加载全部分块。
+        每个文件的范围标签和清单键由 DocumentProcessor.locate 确定。
+
+        Args:
+            knowledge_dirs: 知识库目录路径，可以是多个根目录（如 core 和 components）
+            progress_callback: 写入进度回调，参数为已写入的分块数
+            paths: 只同步这些文件（如监听到的变化文件），已不存在的文件从索引中移除；
+                None 表示扫描整个目录
+
+        Returns:
+            同步统计信息
+        """
+        summary = _empty_summary()
+        # 只同步指定文件时记录写入的分块，增量更新词法索引；扫描整个目录时重建
+        self._lexical_delta = {'documents': [], 'removed_ids': [], 'metadatas': {}} if paths is not None else None
+
+        # 其他进程激活了新的索引代时（如监听进程运行期间执行了 build），切换到新一代及其清单
+        self.vector_store.refresh()
+        if self.manifest.manifest_path != self.vector_store.manifest_path:
+            self.manifest = IndexManifest(self.vector_store.manifest_path, output=self.output)
+
+        # 清单记录了文件但集合为空（例如数据库被外部清除），清单已失效
+        if self.manifest.paths() and self.vector_store.collection.count() == 0:
+            print("⚠️  向量数据库为空，索引清单已失效，执行全量构建", file=self.output)
+            self.manifest.clear()
+
+        file_paths, scope = self._resolve_files(knowledge_dirs, paths)
+
+        seen = set()
+        # 本次同步的全部写入合并提交（flat 后端只重写一次索引文件）
+        with self.vector_store.write_batch():
+            with metrics.timer('index.sync'):
+                self.vector_store.upsert_documents(
+                    self._record_upserts(self._iter_changed_chunks(file_paths, seen, summary)),
+                    progress_callback
+                )
+
+            # 删除已不存在的文件的分块
+            for rel_path in self.manifest.paths():
+                if rel_path in scope and rel_path not in seen:
+                    stale_ids = self.manifest.remove(rel_path)
+                    self._delete(stale_ids)
+                    summary['removed'] += 1
+                    summary['chunks_deleted'] += len(stale_ids)
+                    print(f"🗑️  已移除文件: {rel_path} ({len(stale_ids)} 个分块)", file=self.output)
+
+            # 扫描整个目录时清理不属于清单中任何文件的分块（旧版本的ID格式、中断的写入等残留）
+            if paths is None:
+                orphan_ids = self._find_orphan_ids()
+                if orphan_ids:
+                    self._delete(orphan_ids)
+                    summary['chunks_deleted'] += len(orphan_ids)
+                    print(f"🗑️  已清理 {len(orphan_ids)} 个孤立分块", file=self.output)
+
+        self.manifest.save()
+        metrics.incr('index.syncs')
+        metrics.incr('index.files_changed', summary['added'] + summary['updated'] + summary['removed'])
+        metrics.gauge('index.documents', self.vector_store.collection.count())
+
+        # 集合有变化（或词法索引尚未构建）时更新BM25词法索引
+        if not self.vector_store.lexical_index_path.exists():
+            summary['lexical_documents'] = self.vector_store.rebuild_lexical_index()
+        elif summary['chunks_upserted'] or summary['chunks_deleted'] or summary['chunks_kept']:
+            if self._lexical_delta is not None:
+                summary['lexical_documents'] = self.vector_store.update_lexical_index(**self._lexical_delta)
+            else:
+                summary['lexical_documents'] = self.vector_store.rebuild_lexical_index()
+        self._lexical_delta = None
+        if 'lexical_documents' in summary:
+            print(f"✅ 词法索引已更新 ({summary['lexical_documents']} 个分块)", file=self.output)
+
+        return summary
+
+    def _record_upserts(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """透传写入的分块，增量更新词法索引时记录下来"""
+        for chunk in chunks:
+            if self._lexical_delta is not None:
+                self._lexical_delta['documents'].append({
+                    'id': chunk['metadata']['chunk_id'], 'content': chunk['content'], 'metadata': chunk['metadata']
+                })
+            yield chunk
+
+    def _delete(self, ids: List[str]):
+        """删除分块，增量更新词法索引时记录下来"""
+        self.vector_store.delete_documents(ids)
+        if self._lexical_delta is not None:
+            self._lexical_delta['removed_ids'].extend(ids)
+
+    def scan_changes(self, knowledge_dirs: Union[Path, Iterable[Path]],
+                     paths: Optional[Iterable[Path]] = None) -> Dict[str, Any]:
+        """
+        只按修改时间和大小对比清单，不读取文件内容也不写入，判断同步是否会改变索引
+
+        Args:
+            knowledge_dirs: 知识库目录路径
+            paths: 只检查这些文件，None 表示扫描整个目录
+
+        Returns:
+            changed 修改时间或大小变化的文件，removed 已删除的文件，unchanged 未变化的文件数，
+            consistent 集合分块数与清单是否一致（且词法索引存在）
+        """
+        granularity = self.processor.granularity
+        chunker_version = self.processor.CHUNKER_VERSION
+        file_paths, scope = self._resolve_files(knowledge_dirs, paths)
+
+        changed = []
+        seen = set()
+        for file_path in file_paths:
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            _, rel_path = self.processor.locate(file_path)
+            seen.add(rel_path)
+            if not self.manifest.is_unchanged(rel_path, stat, granularity, chunker_version):
+                changed.append(rel_path)
+
+        count = self.vector_store.collection.count()
+        expected = sum(len(self.manifest.get(rel_path)['chunk_ids']) for rel_path in self.manifest.paths())
+        return {
+            'changed': changed,
+            'removed': [rel_path for rel_path in self.manifest.paths() if rel_path in scope and rel_path not in seen],
+            'unchanged': len(seen) - len(changed),
+            'consistent': count == expected and (count == 0 or self.vector_store.lexical_index_path.exists()),
+        }
+
+    def _resolve_files(self, knowledge_dirs: Union[Path, Iterable[Path]],
+                       paths: Optional[Iterable[Path]]) -> Tuple[List[Path], Set[str]]:
+        """
+        需要对比的文件，以及可能被判定为已删除的清单键范围
+
+        Returns:
+            (文件路径列表, 清单键集合)
+        """
+        if isinstance(knowledge_dirs, (str, Path)):
+            knowledge_dirs = [knowledge_dirs]
+        knowledge_dirs = [Path(directory).resolve() for directory in knowledge_dirs]
+
+        if paths is None:
+            file_paths = [
+                file_path for directory in knowledge_dirs for file_path in self.processor.iter_source_files(directory)
+            ]
+            # 只有本次扫描的根目录下的文件才可能被判定为已删除
+            prefixes = tuple(f"{directory.name}/" for directory in knowledge_dirs)
+            scope = {rel_path for rel_path in self.manifest.paths() if rel_path.startswith(prefixes)}
+        else:
+            paths = [Path(path).resolve() for path in paths]
+            paths = [path for path in paths if any(path.is_relative_to(directory) for directory in knowledge_dirs)]
+            file_paths = sorted(
+                path for path in paths if path.is_file() and self.processor.is_source_file(path)
+            )
+            scope = {self.processor.locate(path)[1] for path in paths}
+        return file_paths, scope
+
+    def _iter_changed_chunks(self, file_paths: List[Path], seen: set,
+                             summary: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        按文件顺序产出需要写入的分块，同时记录遍历到的文件
+
+        先在当前进程中用修改时间和大小筛掉未变化的文件，其余文件交给进程池并行读取和分块。
+        """
+        granularity = self.processor.granularity
+        chunker_version = self.processor.CHUNKER_VERSION
+        candidates = {}
+
+        for file_path in file_paths:
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            _, rel_path = self.processor.locate(file_path)
+            seen.add(rel_path)
+
+            # 快速路径：修改时间和大小均未变化
+            if self.manifest.is_unchanged(rel_path, stat, granularity, chunker_version):
+                summary['unchanged'] += 1
+            else:
+                candidates[file_path] = (rel_path, stat)
+
+        for file_path, result in self.processor.process_files(candidates):
+            rel_path, stat = candidates[file_path]
+            if 'error' in result:
+                summary['failed'] += 1
+                summary['errors'].append({'file': rel_path, 'error': result['error']})
+                continue
+
+            yield from self._sync_file(rel_path, stat, result, summary)
+
+    def _sync_file(self, rel_path: str, stat: os.stat_result, result: Dict[str, Any],
+                   summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        对比单个文件的处理结果与清单，删除旧版本的过期分块
+
+        Args:
+            rel_path: 文件相对路径
+            stat: 文件的 stat 结果
+            result: DocumentProcessor.load_file 的处理结果
+            summary: 同步统计信息
+
+        Returns:
+            需要写入的分块，文件内容未变化时为空列表
+        """
+        granularity = self.processor.granularity
+        chunker_version = self.processor.CHUNKER_VERSION
+        content_hash = result['content_hash']
+        entry = self.manifest.get(rel_path)
+
+        # 内容未变化（例如只是touch了文件），只刷新清单中的stat信息
+        if entry and entry['content_hash'] == content_hash and self.manifest.is_current(
+                rel_path, granularity, chunker_version):
+            self.manifest.update(rel_path, stat, content_hash, entry['chunk_ids'], granularity, chunker_version)
+            summary['unchanged'] += 1
+            return []
+
+        chunks = result['chunks']
+        chunk_ids = [chunk['metadata']['chunk_id'] for chunk in chunks]
+
+        # 分块ID由内容哈希生成：只写入新内容的分块，删除已不存在的分块，
+        # 内容未变的分块只更新元数据（位置、章节路径等可能变化），不重新嵌入
+        new_chunks = chunks
+        if entry:
+            old_ids = set(entry['chunk_ids'])
+            new_ids = set(chunk_ids)
+            stale_ids = [chunk_id for chunk_id in entry['chunk_ids'] if chunk_id not in new_ids]
+            self._delete(stale_ids)
+            summary['chunks_deleted'] += len(stale_ids)
+
+            kept = [chunk for chunk in chunks if chunk['metadata']['chunk_id'] in old_ids]
+            self.vector_store.update_metadatas(
+                [chunk['metadata']['chunk_id'] for chunk in kept],
+                [chunk['metadata'] for chunk in kept]
+            )
+            if self._lexical_delta is not None:
+                self._lexical_delta['metadatas'].update(
+                    (chunk['metadata']['chunk_id'], chunk['metadata']) for chunk in kept
+                )
+            summary['chunks_kept'] += len(kept)
+            new_chunks = [chunk for chunk in chunks if chunk['metadata']['chunk_id'] not in old_ids]
+
+        self.manifest.update(rel_path, stat, content_hash, chunk_ids, granularity, chunker_version)
+
+        summary['updated' if entry else 'added'] += 1
+        summary['chunks_upserted'] += len(new_chunks)
+        return new_chunks
+
+    def _find_orphan_ids(self) -> List[str]:
+        """找出集合中不属于清单中任何文件的分块ID"""
+        known_ids = {
+            chunk_id for rel_path in self.manifest.paths() for chunk_id in self.manifest.get(rel_path)['chunk_ids']
+        }
+        return [doc_id for doc_id in self.vector_store.iter_ids() if doc_id not in known_ids]
+
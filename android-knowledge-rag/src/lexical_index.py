@@ -0,0 +1,250 @@
+"""
+词法索引 - 基于BM25的倒排索引，支持中文和Kotlin API名称的精确匹配
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+LEXICAL_INDEX_VERSION = 1
+
+# ASCII标识符/数字、连续的中日韩字符
+_TOKEN_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词
+
+    - ASCII标识符保留完整的小写形式（精确匹配 StateFlow、repeatOnLifecycle），
+      驼峰和下划线命名再拆出子词（state、flow、repeat、lifecycle）
+    - 中文按单字和相邻双字切分，无需词典即可匹配任意中文词语
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        word = match.group(0)
+        if _IDENTIFIER_PATTERN.fullmatch(word):
+            tokens.append(word.lower())
+            parts = [part.lower() for piece in word.split('_') for part in _CAMEL_PATTERN.findall(piece)]
+            if len(parts) > 1:
+                tokens.extend(parts)
+        elif word.isdigit():
+            tokens.append(word)
+        else:
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    按ChromaDB的where语法匹配元数据（支持 $and/$or/$eq/$ne/$in/$nin）
+
+    Args:
+        metadata: 文档元数据
+        where: 过滤条件
+
+    Returns:
+        匹配时返回True
+    """
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == '$eq' and value != operand:
+                    return False
+                if operator == '$ne' and value == operand:
+                    return False
+                if operator == '$in' and value not in operand:
+                    return False
+                if operator == '$nin' and value in operand:
+                    return False
+                if operator not in ('$eq', '$ne', '$in', '$nin'):
+                    raise ValueError(f"词法索引不支持的过滤操作: {operator}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class BM25Index:
+    """BM25倒排索引，随向量集合一起构建并持久化到磁盘"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.contents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avg_doc_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def build(self, documents: Iterable[Dict[str, Any]]):
+        """
+        从文档构建索引
+
+        Args:
+            documents: 文档可迭代对象，每个文档包含id、content和metadata
+        """
+        self.doc_ids, self.contents, self.metadatas, self.doc_lengths = [], [], [], []
+        self.postings = {}
+        for doc in documents:
+            self._append(doc)
+        self._update_avg_doc_length()
+
+    def update(self, documents: Iterable[Dict[str, Any]], removed_ids: Iterable[str] = (),
+               metadatas: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        增量更新索引，只对新写入的文档分词（如监听到的少量文件变化）
+
+        Args:
+            documents: 新写入的文档，包含id、content和metadata，已存在的同ID文档被替换
+            removed_ids: 删除的文档ID
+            metadatas: 只更新元数据的文档（ID -> 新元数据）
+        """
+        documents = list(documents)
+        removed = set(removed_ids) | {doc['id'] for doc in documents}
+        if removed & set(self.doc_ids):
+            # 删除文档后重新编号，倒排表按新编号重写，不需要重新分词
+            kept = [doc_index for doc_index, doc_id in enumerate(self.doc_ids) if doc_id not in removed]
+            renumber = {old: new for new, old in enumerate(kept)}
+            postings = {}
+            for term, entries in self.postings.items():
+                entries = [(renumber[doc_index], frequency) for doc_index, frequency in entries if doc_index in renumber]
+                if entries:
+                    postings[term] = entries
+            self.postings = postings
+            self.doc_ids = [self.doc_ids[doc_index] for doc_index in kept]
+            self.contents = [self.contents[doc_index] for doc_index in kept]
+            self.metadatas = [self.metadatas[doc_index] for doc_index in kept]
+            self.doc_lengths = [self.doc_lengths[doc_index] for doc_index in kept]
+
+        if metadatas:
+            for doc_index, doc_id in enumerate(self.doc_ids):
+                if doc_id in metadatas:
+                    self.metadatas[doc_index] = metadatas[doc_id]
+
+        for doc in documents:
+            self._append(doc)
+        self._update_avg_doc_length()
+
+    def _append(self, doc: Dict[str, Any]):
+        tokens = tokenize(doc['content'])
+        doc_index = len(self.doc_ids)
+        self.doc_ids.append(doc['id'])
+        self.contents.append(doc['content'])
+        self.metadatas.append(doc['metadata'])
+        self.doc_lengths.append(len(tokens))
+        for term, frequency in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((doc_index, frequency))
+
+    def _update_avg_doc_length(self):
+        self.avg_doc_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def contains_term(self, term: str) -> bool:
+        """索引中是否包含某个词"""
+        return term in self.postings
+
+    def search(self, query: str, top_k: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询字符串
+            top_k: 返回结果数量
+            where: 元数据过滤条件（ChromaDB where语法）
+
+        Returns:
+            搜索结果列表，score 为BM25得分
+        """
+        if not self.doc_ids:
+            return []
+
+        total = len(self.doc_ids)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, frequency in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm
+                )
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_index, score in ranked:
+            if not matches_where(self.metadatas[doc_index], where):
+                continue
+            results.append({
+                'id': self.doc_ids[doc_index],
+                'content': self.contents[doc_index],
+                'metadata': self.metadatas[doc_index],
+                'distance': None,
+                'score': score
+            })
+            if len(results) >= top_k:
+                break
+        return results
+
+    def save(self, path: Path):
+        """原子写入索引文件"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({
+            'version': LEXICAL_INDEX_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'doc_ids': self.doc_ids,
+            'contents': self.contents,
+            'metadatas': self.metadatas,
+            'doc_lengths': self.doc_lengths,
+            'postings': self.postings,
+        }, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """
+        从磁盘加载索引
+
+        Returns:
+            索引对象，文件不存在或版本不匹配时返回None
+        """
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        data = json.loads(path.read_text(encoding='utf-8'))
+        if data.get('version') != LEXICAL_INDEX_VERSION:
+            return None
+
+        index = cls(k1=data['k1'], b=data['b'])
+        index.doc_ids = data['doc_ids']
+        index.contents = data['contents']
+        index.metadatas = data['metadatas']
+        index.doc_lengths = data['doc_lengths']
+        index.postings = {term: [tuple(posting) for posting in postings] for term, postings in data['postings'].items()}
+        index._update_avg_doc_length()
+        return index
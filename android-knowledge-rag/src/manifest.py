@@ -0,0 +1,132 @@
+"""
+索引清单 - 记录已索引文件的指纹，支持增量构建
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List, Dict, Any, Optional, TextIO
+
+from config import MANIFEST_PATH
+
+MANIFEST_VERSION = 1
+
+
+def compute_content_hash(data: bytes) -> str:
+    """计算文件内容哈希"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class IndexManifest:
+    """索引清单，按文件记录路径、修改时间、大小、内容哈希、分块ID和粒度"""
+
+    def __init__(self, manifest_path: Path = MANIFEST_PATH, output: Optional[TextIO] = None):
+        """
+        初始化索引清单
+
+        Args:
+            manifest_path: 清单文件路径
+            output: 日志输出流，None 表示标准输出
+        """
+        self.manifest_path = Path(manifest_path)
+        self.output = output
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        """从磁盘加载清单，文件不存在或版本不匹配时视为空清单"""
+        self.files = {}
+        if not self.manifest_path.exists():
+            return
+
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+        except Exception as e:
+            print(f"⚠️  索引清单损坏，将执行全量构建: {e}", file=self.output)
+
+    def save(self):
+        """原子写入清单文件"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        tmp_path.write_text(
+            json.dumps({'version': MANIFEST_VERSION, 'files': self.files}, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+        os.replace(tmp_path, self.manifest_path)
+
+    def clear(self):
+        """清空清单（重置数据库时调用）"""
+        self.files = {}
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+
+    def get(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """获取文件的清单记录"""
+        return self.files.get(rel_path)
+
+    def paths(self) -> List[str]:
+        """获取清单中所有文件路径"""
+        return list(self.files.keys())
+
+    def is_unchanged(self, rel_path: str, stat: os.stat_result, granularity: str, chunker_version: int) -> bool:
+        """
+        通过修改时间和大小快速判断文件是否未变化
+
+        Args:
+            rel_path: 文件相对路径
+            stat: 文件的 stat 结果
+            granularity: 当前分块粒度
+            chunker_version: 当前分块器版本
+
+        Returns:
+            文件未变化时返回True
+        """
+        entry = self.files.get(rel_path)
+        return (
+            self.is_current(rel_path, granularity, chunker_version)
+            and entry['mtime_ns'] == stat.st_mtime_ns
+            and entry['size'] == stat.st_size
+        )
+
+    def is_current(self, rel_path: str, granularity: str, chunker_version: int) -> bool:
+        """文件的分块是否由当前粒度和分块器版本生成"""
+        entry = self.files.get(rel_path)
+        return (
+            entry is not None
+            and entry['granularity'] == granularity
+            and entry.get('chunker_version') == chunker_version
+        )
+
+    def update(self, rel_path: str, stat: os.stat_result, content_hash: str,
+               chunk_ids: List[str], granularity: str, chunker_version: int):
+        """
+        更新文件的清单记录
+
+        Args:
+            rel_path: 文件相对路径
+            stat: 文件的 stat 结果
+            content_hash: 文件内容哈希
+            chunk_ids: 该文件产生的分块ID
+            granularity: 分块粒度
+            chunker_version: 分块器版本
+        """
+        self.files[rel_path] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'content_hash': content_hash,
+            'chunk_ids': chunk_ids,
+            'granularity': granularity,
+            'chunker_version': chunker_version,
+        }
+
+    def remove(self, rel_path: str) -> List[str]:
+        """
+        移除文件的清单记录
+
+        Returns:
+            该文件原有的分块ID
+        """
+        entry = self.files.pop(rel_path, None)
+        return entry['chunk_ids'] if entry else []
@@ -0,0 +1,270 @@
+"""
+运行指标 - 分阶段耗时和计数器，支持请求级JSON日志和Prometheus文本导出
+
+埋点方式:
+    from metrics import metrics
+
+    with metrics.timer('search.hnsw'):      # 分阶段耗时
+        ...
+    metrics.incr('search.queries', len(queries))
+
+    with metrics.request('search_knowledge'):  # 一次请求，结束时输出JSON日志
+        ...
+
+阶段可以嵌套（如 search.coarse 包含其中的 search.hnsw），请求日志中的阶段耗时按名称累加。
+关闭时（默认），timer 和 request 返回同一个空上下文管理器，incr 只做一次布尔判断。
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import METRICS_ENABLED, METRICS_REQUEST_LOG, METRICS_PROMETHEUS_PATH, METRICS_EXPORT_INTERVAL
+
+# 耗时直方图的桶上界（秒）
+_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# 当前请求的阶段耗时，检索在线程池中执行时需通过 contextvars.copy_context() 传递
+_current_request: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar(
+    'metrics_request', default=None
+)
+
+
+class RequestTrace:
+    """单次请求的各阶段耗时和计数"""
+
+    def __init__(self, name: str, fields: Dict[str, Any]):
+        self.name = name
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def set(self, **fields: Any):
+        """补充请求日志中的字段"""
+        self.fields.update(fields)
+
+
+class _Timer:
+    """记录一个阶段的耗时到全局直方图和当前请求"""
+
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry: "Metrics", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    进程内指标注册表（线程安全）
+
+    - 计数器: incr，单调递增
+    - 仪表: gauge，记录最新值（如索引分块数）
+    - 耗时: observe/timer，按桶统计次数、总和和最大值
+    """
+
+    def __init__(self, enabled: bool = False, request_log: bool = False,
+                 prometheus_path: Optional[Path] = None, export_interval: float = METRICS_EXPORT_INTERVAL):
+        """
+        初始化指标注册表
+
+        Args:
+            enabled: 是否采集指标
+            request_log: 是否在每个请求结束时向标准错误输出一行JSON
+            prometheus_path: Prometheus文本格式指标文件路径，None表示不导出
+            export_interval: 指标文件的最短重写间隔（秒）
+        """
+        self.request_log = request_log
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.export_interval = export_interval
+        self.enabled = enabled or request_log or self.prometheus_path is not None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        # 名称 -> [次数, 总和, 最大值, 各桶计数]
+        self._timings: Dict[str, List[Any]] = {}
+        self._started_at = time.time()
+        self._last_export = 0.0
+
+    def incr(self, name: str, value: float = 1):
+        """计数器加 value，同时计入当前请求"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        trace = _current_request.get()
+        if trace is not None:
+            trace.counters[name] = trace.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        """设置仪表的当前值"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        """记录一次耗时，同时累加到当前请求的同名阶段"""
+        if not self.enabled:
+            return
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = [0, 0.0, 0.0, [0] * (len(_TIME_BUCKETS) + 1)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            timing[3][bisect.bisect_left(_TIME_BUCKETS, seconds)] += 1
+        trace = _current_request.get()
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+
+    def timer(self, name: str):
+        """记录代码块耗时的上下文管理器"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, name)
+
+    def request(self, name: str, **fields: Any):
+        """
+        跟踪一次请求：总耗时记为 request.<name>，期间的阶段耗时和计数汇总到请求日志
+
+        Args:
+            name: 请求名（如工具名或守护进程操作名）
+            fields: 写入请求日志的附加字段
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._request(name, fields)
+
+    @contextlib.contextmanager
+    def _request(self, name: str, fields: Dict[str, Any]):
+        trace = RequestTrace(name, fields)
+        token = _current_request.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _current_request.reset(token)
+            self.observe(f"request.{name}", duration)
+            self.incr(f"request.{name}.count")
+            if trace.error:
+                self.incr(f"request.{name}.errors")
+            if self.request_log:
+                self._log_request(trace, duration)
+            self.maybe_export()
+
+    def _log_request(self, trace: RequestTrace, duration: float):
+        """向标准错误输出一行请求日志（标准输出可能被MCP协议占用）"""
+        record = {
+            'ts': round(time.time(), 3),
+            'request': trace.name,
+            'duration_ms': round(duration * 1000, 2),
+            **trace.fields,
+            'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in trace.stages.items()},
+            'counters': trace.counters,
+        }
+        if trace.error:
+            record['error'] = trace.error
+        print(json.dumps(record, ensure_ascii=False, default=str), file=sys.stderr, flush=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前指标的快照，耗时单位为毫秒"""
+        with self._lock:
+            timings = {}
+            for name, (count, total, maximum, buckets) in sorted(self._timings.items()):
+                timings[name] = {
+                    'count': count,
+                    'total_ms': round(total * 1000, 2),
+                    'mean_ms': round(total * 1000 / count, 3) if count else 0.0,
+                    'max_ms': round(maximum * 1000, 2),
+                    'p95_ms': self._bucket_quantile(buckets, count, 0.95),
+                }
+            return {
+                'enabled': self.enabled,
+                'uptime_seconds': round(time.time() - self._started_at, 1),
+                'counters': dict(sorted(self._counters.items())),
+                'gauges': dict(sorted(self._gauges.items())),
+                'timings': timings,
+            }
+
+    @staticmethod
+    def _bucket_quantile(buckets: List[int], count: int, q: float) -> Optional[float]:
+        """由直方图估算分位数（取所在桶的上界，单位毫秒），落在最后一个桶时返回None"""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, bucket in zip(_TIME_BUCKETS, buckets):
+            seen += bucket
+            if seen >= rank:
+                return bound * 1000
+        return None
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        def metric_name(name: str) -> str:
+            return "android_knowledge_" + "".join(c if c.isalnum() else "_" for c in name)
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = metric_name(name) + "_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+            for name, value in sorted(self._gauges.items()):
+                metric = metric_name(name)
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+            for name, (count, total, _, buckets) in sorted(self._timings.items()):
+                metric = metric_name(name) + "_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket in zip(_TIME_BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines += [
+                    f'{metric}_bucket{{le="+Inf"}} {count}',
+                    f"{metric}_sum {total:.6f}",
+                    f"{metric}_count {count}",
+                ]
+        return "\n".join(lines) + "\n"
+
+    def maybe_export(self, force: bool = False):
+        """距上次导出超过 export_interval 时原子重写Prometheus指标文件"""
+        if self.prometheus_path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_export < self.export_interval:
+            return
+        self._last_export = now
+        try:
+            self.prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.prometheus_path.with_name(self.prometheus_path.name + '.tmp')
+            tmp_path.write_text(self.to_prometheus(), encoding='utf-8')
+            os.replace(tmp_path, self.prometheus_path)
+        except OSError as e:
+            print(f"⚠️  写入指标文件失败: {e}", file=sys.stderr)
+
+
+# 进程级指标注册表
+metrics = Metrics(METRICS_ENABLED, METRICS_REQUEST_LOG, METRICS_PROMETHEUS_PATH)
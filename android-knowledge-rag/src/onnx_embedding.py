@@ -0,0 +1,340 @@
+"""
+ONNX嵌入后端 - 用 onnxruntime 运行导出的 sentence-transformers 模型，检索和构建时不需要导入torch
+
+目录结构:
+    data/onnx/<模型名>/model.onnx        float32 模型（Transformer + Pooling + Normalize 整体导出）
+    data/onnx/<模型名>/model_int8.onnx   int8 动态量化模型（可选）
+    data/onnx/<模型名>/tokenizer.json    分词器（tokenizers 格式）
+    data/onnx/<模型名>/export.json       导出信息，最后写入，存在即表示导出完整
+
+导出（export_onnx_model）需要 torch、sentence-transformers 和 onnx，只在导出时使用。
+"""
+import inspect
+import json
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_NUM_THREADS, EMBEDDING_NORMALIZE,
+    EMBEDDING_BACKEND_ONNX, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZED, EMBEDDING_ONNX_MIN_COSINE
+)
+from embedding_engine import EmbeddingEngine, get_embedding_engine
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 写入ChromaDB集合配置的嵌入函数名称，与torch后端区分
+ONNX_EMBEDDING_FUNCTION_NAME = "android_knowledge_onnx_embedding"
+
+ONNX_EXPORT_VERSION = 1
+ONNX_OPSET = 17
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+EXPORT_INFO_FILE = "export.json"
+
+# 模型输入名 -> tokenizers.Encoding 的属性
+_ENCODING_FIELDS = {
+    'input_ids': 'ids',
+    'attention_mask': 'attention_mask',
+    'token_type_ids': 'type_ids',
+}
+
+# 导出校验使用的文本，覆盖中英文、代码和超长输入（触发截断）
+PARITY_TEXTS = [
+    "ViewModel 负责管理界面相关的数据，在配置变更时保留状态",
+    "使用 Kotlin 协程和 Flow 处理异步数据流",
+    "Room 数据库的 DAO 接口定义",
+    "Jetpack Compose state hoisting and recomposition",
+    "class MainViewModel : ViewModel() { val uiState = MutableStateFlow(UiState()) }",
+    "MVI",
+    "依赖注入 " * 200,
+]
+
+
+def onnx_model_dir(model_name: str = EMBEDDING_MODEL) -> Path:
+    """模型导出目录，模型名中的 / 替换为 __"""
+    return EMBEDDING_ONNX_DIR / model_name.replace('/', '__')
+
+
+def cosine_agreement(expected: "np.ndarray", actual: "np.ndarray") -> "np.ndarray":
+    """
+    逐行计算两组向量的余弦相似度
+
+    Args:
+        expected: 参照向量（torch）
+        actual: 待比较向量（onnx）
+
+    Returns:
+        每行的余弦相似度
+    """
+    import numpy as np
+
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    return (expected * actual).sum(axis=1) / np.maximum(norms, 1e-12)
+
+
+class OnnxEmbeddingEngine(EmbeddingEngine):
+    """
+    ONNX嵌入引擎
+
+    分词、截断和批量编码与 sentence-transformers 一致（去除首尾空白、按最大序列长度截断、
+    按长度排序后分批以减少填充），向量与torch后端的余弦相似度由导出校验和一致性测试保证。
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model_dir: Optional[Path] = None,
+                 quantized: bool = EMBEDDING_ONNX_QUANTIZED, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 num_threads: Optional[int] = EMBEDDING_NUM_THREADS, normalize: bool = EMBEDDING_NORMALIZE):
+        """
+        初始化ONNX嵌入引擎
+
+        Args:
+            model_name: 嵌入模型名称
+            model_dir: 导出目录，None 表示 data/onnx/<模型名>
+            quantized: 是否使用int8量化模型
+            batch_size: 模型单次编码的文本数
+            num_threads: CPU推理线程数，None 表示使用onnxruntime默认值
+            normalize: 是否对向量做L2归一化
+        """
+        super().__init__(model_name=model_name, device="cpu", batch_size=batch_size,
+                         num_threads=num_threads, normalize=normalize)
+        self.model_dir = Path(model_dir) if model_dir else onnx_model_dir(model_name)
+        self.quantized = quantized
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._export_info: Dict[str, Any] = {}
+
+    @property
+    def backend(self) -> str:
+        return EMBEDDING_BACKEND_ONNX
+
+    @property
+    def cache_key(self) -> str:
+        variant = "onnx-int8" if self.quantized else "onnx"
+        return f"{self.model_name}|{variant}|normalize={self.normalize}"
+
+    @property
+    def model_path(self) -> Path:
+        return self.model_dir / (QUANTIZED_MODEL_FILE if self.quantized else MODEL_FILE)
+
+    # ChromaDB embedding_function 协议
+
+    @staticmethod
+    def name() -> str:
+        return ONNX_EMBEDDING_FUNCTION_NAME
+
+    def get_config(self) -> Dict[str, Any]:
+        return {
+            'model_name': self.model_name,
+            'backend': self.backend,
+            'quantized': self.quantized,
+            'normalize_embeddings': self.normalize,
+        }
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "EmbeddingEngine":
+        # 量化设置与配置一致时返回进程内共享的引擎，否则按集合记录的设置另建（模型在第一次编码时才加载）
+        quantized = config.get('quantized', EMBEDDING_ONNX_QUANTIZED)
+        if quantized == EMBEDDING_ONNX_QUANTIZED:
+            return get_embedding_engine(config['model_name'], EMBEDDING_BACKEND_ONNX)
+        return OnnxEmbeddingEngine(
+            model_name=config['model_name'],
+            quantized=quantized,
+            normalize=config.get('normalize_embeddings', EMBEDDING_NORMALIZE)
+        )
+
+    def load(self):
+        """加载分词器和ONNX模型（重复调用不会重复加载）"""
+        if self._model is not None:
+            return
+
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            info_path = self.model_dir / EXPORT_INFO_FILE
+            if not info_path.exists() or not self.model_path.exists():
+                raise FileNotFoundError(
+                    f"未找到 {self.model_name} 的ONNX模型（{self.model_path}），"
+                    f"请先执行 'python src/cli.py export-onnx'"
+                )
+            info = json.loads(info_path.read_text(encoding='utf-8'))
+            if info.get('version') != ONNX_EXPORT_VERSION:
+                raise ValueError("ONNX模型的导出版本不匹配，请重新执行 export-onnx")
+
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            # 与 EmbeddingEngine.load 相同，日志写入标准错误，不干扰MCP协议使用的标准输出
+            print(f"🔄 加载ONNX嵌入模型: {self.model_path}", file=sys.stderr)
+            tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+            tokenizer.enable_truncation(max_length=info['max_seq_length'])
+            tokenizer.enable_padding(pad_id=info['pad_token_id'], pad_token=info['pad_token'])
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads:
+                options.intra_op_num_threads = self.num_threads
+            session = onnxruntime.InferenceSession(
+                str(self.model_path), sess_options=options, providers=['CPUExecutionProvider']
+            )
+
+            self._tokenizer = tokenizer
+            self._input_names = [model_input.name for model_input in session.get_inputs()]
+            self._export_info = info
+            self._model = session
+            print(f"✅ ONNX嵌入模型加载完成", file=sys.stderr)
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        """
+        将文本编码为向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            float32 向量矩阵，形状为 (len(texts), dim)
+        """
+        import numpy as np
+
+        self.load()
+        texts = [str(text).strip() for text in texts]
+        if self._export_info.get('do_lower_case'):
+            texts = [text.lower() for text in texts]
+        embeddings = np.empty((len(texts), self._export_info['dimension']), dtype=np.float32)
+
+        # 按长度从长到短分批，同一批次的文本长度相近，填充更少
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            encodings = self._tokenizer.encode_batch([texts[i] for i in rows])
+            feeds = {
+                name: np.asarray([getattr(encoding, _ENCODING_FIELDS[name]) for encoding in encodings],
+                                 dtype=np.int64)
+                for name in self._input_names
+            }
+            embeddings[rows] = self._model.run(None, feeds)[0]
+
+        if self.normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL, output_dir: Optional[Path] = None,
+                      quantize: bool = True, min_cosine: float = EMBEDDING_ONNX_MIN_COSINE) -> Dict[str, Any]:
+    """
+    将 sentence-transformers 模型导出为ONNX，可选生成int8动态量化模型
+
+    整个模型（Transformer、池化和归一化）导出为一个计算图，输出即句向量。
+    导出后用 PARITY_TEXTS 对比torch和ONNX的向量，最低余弦相似度低于 min_cosine 时不写入 export.json。
+
+    Args:
+        model_name: 嵌入模型名称
+        output_dir: 导出目录，None 表示 data/onnx/<模型名>
+        quantize: 是否同时生成int8量化模型
+        min_cosine: 要求的最低余弦相似度
+
+    Returns:
+        导出信息（含各模型文件的最低余弦相似度）
+
+    Raises:
+        ValueError: 分词器不是 fast 分词器，或导出的模型与torch向量不一致
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir) if output_dir else onnx_model_dir(model_name)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    info_path = output_dir / EXPORT_INFO_FILE
+    if info_path.exists():
+        info_path.unlink()
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    tokenizer = model.tokenizer
+    if not getattr(tokenizer, 'is_fast', False):
+        raise ValueError(f"{model_name} 的分词器不是 fast 分词器，无法导出为 tokenizers 格式")
+
+    features = model.tokenize(PARITY_TEXTS[:2])
+    input_names = [name for name in _ENCODING_FIELDS if name in features]
+
+    class SentenceEmbedding(torch.nn.Module):
+        """以位置参数接收模型输入，输出句向量"""
+
+        def __init__(self, sentence_model):
+            super().__init__()
+            self.sentence_model = sentence_model
+
+        def forward(self, *inputs):
+            return self.sentence_model(dict(zip(input_names, inputs)))['sentence_embedding']
+
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['sentence_embedding'] = {0: 'batch'}
+    # torch 2.5 起默认使用 dynamo 导出，这里使用支持 dynamic_axes 的 TorchScript 导出
+    export_options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    print(f"🔄 导出ONNX模型: {model_name}")
+    with torch.no_grad():
+        torch.onnx.export(
+            SentenceEmbedding(model),
+            tuple(features[name] for name in input_names),
+            str(output_dir / MODEL_FILE),
+            input_names=input_names,
+            output_names=['sentence_embedding'],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True,
+            **export_options
+        )
+    tokenizer.backend_tokenizer.save(str(output_dir / TOKENIZER_FILE))
+
+    files = {'float32': MODEL_FILE}
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"🔄 生成int8量化模型")
+        quantize_dynamic(str(output_dir / MODEL_FILE), str(output_dir / QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+        files['int8'] = QUANTIZED_MODEL_FILE
+
+    transformer = model[0]
+    # sentence-transformers 5 起该方法更名为 get_embedding_dimension
+    dimension = getattr(model, 'get_embedding_dimension', None) or model.get_sentence_embedding_dimension
+    info = {
+        'version': ONNX_EXPORT_VERSION,
+        'model_name': model_name,
+        'max_seq_length': model.max_seq_length,
+        'dimension': dimension(),
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+        'do_lower_case': bool(getattr(transformer, 'do_lower_case', False)),
+        'inputs': input_names,
+        'files': files,
+        'exported_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    # 引擎加载需要 export.json：先写入再校验，校验失败时删除，不留下不完整的导出
+    info_path.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding='utf-8')
+    try:
+        expected = model.encode(PARITY_TEXTS, normalize_embeddings=True, convert_to_numpy=True)
+        agreement = {}
+        for variant in files:
+            engine = OnnxEmbeddingEngine(model_name, model_dir=output_dir, quantized=variant == 'int8')
+            agreement[variant] = round(float(cosine_agreement(expected, engine.encode(PARITY_TEXTS)).min()), 6)
+    except Exception:
+        info_path.unlink()
+        raise
+
+    failed = {variant: value for variant, value in agreement.items() if value < min_cosine}
+    if failed:
+        info_path.unlink()
+        raise ValueError(f"ONNX模型与torch向量不一致（最低余弦相似度 {failed}，要求 ≥ {min_cosine}）")
+
+    info['min_cosine'] = agreement
+    info_path.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"✅ ONNX模型已导出到 {output_dir}")
+    return {**info, 'output_dir': str(output_dir)}
@@ -0,0 +1,77 @@
+"""
+查询缓存 - 线程安全的LRU缓存，支持TTL过期和命中统计
+"""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化查询文本，使大小写、全半角和空白不同的近似查询共享缓存
+
+    嵌入模型本身不区分大小写，因此规范化不会改变检索结果。
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class LRUCache:
+    """线程安全的LRU缓存，超过容量时淘汰最久未使用的条目，超过TTL的条目视为未命中"""
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最大条目数
+            ttl_seconds: 条目存活时间，None表示永不过期
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存值，必要时淘汰最久未使用的条目"""
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存（命中统计保留）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,218 @@
+"""
+常驻检索守护进程 - 通过Unix socket提供检索服务，保持向量数据库和嵌入模型常驻内存
+
+协议：每个连接发送一行JSON请求，返回一行JSON响应。
+    请求: {"op": "search", "query": "...", "top_k": 5, "where": {...}, "mode": "hybrid", "granularity": "section"}
+          {"op": "search_batch", "queries": [{"query": "...", "top_k": 5}, ...]}
+    响应: {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from metrics import metrics
+from config import (
+    DAEMON_SOCKET_PATH, DAEMON_CONNECT_TIMEOUT, DAEMON_REQUEST_TIMEOUT, DEFAULT_TOP_K, DEFAULT_SEARCH_MODE,
+    DEFAULT_GRANULARITY, COARSE_TO_FINE_TOP_FILES
+)
+
+
+class DaemonUnavailable(Exception):
+    """守护进程未运行或无法连接"""
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """处理单个连接上的一行请求"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            request = json.loads(line)
+            with metrics.request(f"daemon.{request.get('op')}"):
+                response = {'ok': True, 'result': self.server.search_daemon.dispatch(request)}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class SearchDaemon:
+    """常驻检索守护进程"""
+
+    def __init__(self, socket_path: Path = DAEMON_SOCKET_PATH, watch: bool = False):
+        """
+        初始化守护进程
+
+        Args:
+            socket_path: Unix socket 路径
+            watch: 是否监听知识库目录并自动增量更新索引
+        """
+        self.socket_path = Path(socket_path)
+        self.watch = watch
+        self.vector_store = None
+        self._server = None
+        self._watcher = None
+
+    def serve_forever(self):
+        """启动守护进程并阻塞，直到收到 shutdown 请求或终止信号"""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("当前平台不支持Unix socket，无法启动守护进程")
+
+        if DaemonClient(self.socket_path).is_running():
+            raise RuntimeError(f"守护进程已在运行: {self.socket_path}")
+
+        # 清理上次异常退出遗留的socket文件
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        from vector_store import VectorStore
+
+        self.vector_store = VectorStore()
+        self.vector_store.embedding_function.load()
+
+        if self.watch:
+            from indexer import describe_sync
+            from watcher import create_index_watcher
+
+            self._watcher = create_index_watcher(
+                self.vector_store,
+                on_synced=lambda summary: print(f"🔄 {describe_sync(summary)}", flush=True)
+            )
+            self._watcher.start()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._server = _DaemonServer(str(self.socket_path), _RequestHandler)
+        self._server.search_daemon = self
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.shutdown())
+
+        print(f"✅ 检索守护进程已启动: {self.socket_path} (pid {os.getpid()})", flush=True)
+        try:
+            self._server.serve_forever()
+        finally:
+            if self._watcher:
+                self._watcher.stop(timeout=5)
+            metrics.maybe_export(force=True)
+            self._server.server_close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            print("🛑 检索守护进程已停止", flush=True)
+
+    def shutdown(self):
+        """停止守护进程（serve_forever 所在线程之外调用）"""
+        if self._server:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def dispatch(self, request: Dict[str, Any]) -> Any:
+        """
+        执行一条请求
+
+        Args:
+            request: 请求内容，op 字段指定操作
+
+        Returns:
+            操作结果
+        """
+        op = request.get('op')
+        if op == 'ping':
+            return {'pid': os.getpid()}
+        if op == 'search':
+            return self.vector_store.search(
+                request['query'],
+                top_k=request.get('top_k', DEFAULT_TOP_K),
+                where=request.get('where'),
+                mode=request.get('mode', DEFAULT_SEARCH_MODE),
+                granularity=request.get('granularity', DEFAULT_GRANULARITY),
+                coarse_top_files=request.get('coarse_top_files', COARSE_TO_FINE_TOP_FILES),
+                min_similarity=request.get('min_similarity')
+            )
+        if op == 'search_batch':
+            return self.vector_store.search_batch(request['queries'])
+        if op == 'stats':
+            return self.vector_store.get_stats()
+        if op == 'shutdown':
+            self.shutdown()
+            return {'pid': os.getpid()}
+        raise ValueError(f"未知操作: {op}")
+
+
+class DaemonClient:
+    """守护进程客户端，守护进程未运行时抛出 DaemonUnavailable，由调用方回退到进程内检索"""
+
+    def __init__(self, socket_path: Path = DAEMON_SOCKET_PATH,
+                 connect_timeout: float = DAEMON_CONNECT_TIMEOUT,
+                 request_timeout: float = DAEMON_REQUEST_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+
+    def request(self, op: str, **params) -> Any:
+        """
+        发送一条请求
+
+        Raises:
+            DaemonUnavailable: 守护进程未运行或连接失败
+            RuntimeError: 守护进程执行请求失败
+        """
+        if not hasattr(socket, 'AF_UNIX') or not self.socket_path.exists():
+            raise DaemonUnavailable(f"守护进程未运行: {self.socket_path}")
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.connect_timeout)
+                sock.connect(str(self.socket_path))
+                sock.settimeout(self.request_timeout)
+                sock.sendall(json.dumps({'op': op, **params}, ensure_ascii=False).encode('utf-8') + b'\n')
+                with sock.makefile('rb') as reader:
+                    line = reader.readline()
+        except OSError as e:
+            raise DaemonUnavailable(f"无法连接守护进程: {e}") from e
+
+        if not line:
+            raise DaemonUnavailable("守护进程未返回响应")
+
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', '未知错误'))
+        return response['result']
+
+    def is_running(self) -> bool:
+        """守护进程是否在运行"""
+        try:
+            self.request('ping')
+            return True
+        except (DaemonUnavailable, RuntimeError):
+            return False
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K, where: Optional[Dict] = None,
+               mode: str = DEFAULT_SEARCH_MODE, granularity: str = DEFAULT_GRANULARITY,
+               coarse_top_files: int = COARSE_TO_FINE_TOP_FILES,
+               min_similarity: Optional[float] = None) -> List[Dict[str, Any]]:
+        """通过守护进程检索"""
+        return self.request('search', query=query, top_k=top_k, where=where, mode=mode,
+                            granularity=granularity, coarse_top_files=coarse_top_files,
+                            min_similarity=min_similarity)
+
+    def search_batch(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """通过守护进程批量检索"""
+        return self.request('search_batch', queries=queries)
+
+    def stats(self) -> Dict[str, Any]:
+        """通过守护进程获取统计信息"""
+        return self.request('stats')
+
+    def shutdown(self) -> Dict[str, Any]:
+        """请求守护进程退出"""
+        return self.request('shutdown')
@@ -0,0 +1,115 @@
+"""
+检索过滤条件 - 类型化的元数据过滤，编译为ChromaDB原生where谓词
+"""
+from typing import List, Dict, Any, Optional, Union
+
+from lexical_index import matches_where
+
+FilterValue = Union[str, List[str]]
+
+SCOPE_CORE = "core"
+SCOPE_COMPONENTS = "components"
+
+
+class SearchFilter:
+    """
+    类型化检索过滤条件
+
+    每个字段可以是单个值（编译为等值比较）或值列表（编译为 $in），
+    多个字段之间为“与”关系。只使用ChromaDB元数据索引原生支持的谓词，
+    不依赖ChromaDB不支持的 $regex 或检索后再过滤。
+    """
+
+    FIELDS = ('scope', 'component', 'file_type', 'chunk_type', 'filename', 'file_path', 'section_path',
+              'granularity', 'parent_id')
+
+    def __init__(self, scope: Optional[FilterValue] = None, component: Optional[FilterValue] = None,
+                 file_type: Optional[FilterValue] = None, chunk_type: Optional[FilterValue] = None,
+                 filename: Optional[FilterValue] = None, file_path: Optional[FilterValue] = None,
+                 section_path: Optional[FilterValue] = None, granularity: Optional[FilterValue] = None,
+                 parent_id: Optional[FilterValue] = None):
+        """
+        初始化过滤条件
+
+        Args:
+            scope: 知识库范围（core/components）
+            component: 组件名（如 ViewModel）
+            file_type: 文件扩展名（如 .md）
+            chunk_type: 分块类型（file/paragraph/sentence/section）
+            filename: 文件名
+            file_path: 文件相对路径
+            section_path: 章节路径
+            granularity: 分块粒度
+            parent_id: 所在文件的文件级别分块ID
+        """
+        self.conditions: Dict[str, FilterValue] = {
+            field: value for field, value in (
+                ('scope', scope), ('component', component), ('file_type', file_type),
+                ('chunk_type', chunk_type), ('filename', filename), ('file_path', file_path),
+                ('section_path', section_path), ('granularity', granularity), ('parent_id', parent_id),
+            ) if value is not None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchFilter":
+        """从字典构建（用于JSON输入），未知字段报错"""
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的过滤字段: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    @classmethod
+    def for_scope(cls, filter_type: str) -> Optional["SearchFilter"]:
+        """按MCP工具的 filter_type 参数构建过滤条件，all 表示不过滤"""
+        if filter_type in (SCOPE_CORE, SCOPE_COMPONENTS):
+            return cls(scope=filter_type)
+        if filter_type == "all":
+            return None
+        raise ValueError(f"不支持的过滤类型: {filter_type}")
+
+    def to_where(self) -> Optional[Dict[str, Any]]:
+        """
+        编译为ChromaDB where条件
+
+        Returns:
+            where字典，没有任何条件时返回None
+        """
+        clauses = []
+        for field, value in self.conditions.items():
+            if isinstance(value, (list, tuple)):
+                clauses.append({field: {'$in': list(value)}})
+            else:
+                clauses.append({field: {'$eq': value}})
+
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {'$and': clauses}
+
+    @staticmethod
+    def combine(where: Optional[Dict[str, Any]], extra: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将附加条件与已有where条件组合为“与”关系
+
+        Args:
+            where: 已编译的where条件（可为None）
+            extra: 附加的where条件
+
+        Returns:
+            组合后的where条件
+        """
+        if not where:
+            return extra
+        return {'$and': [where, extra]}
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """判断元数据是否满足过滤条件"""
+        return matches_where(metadata, self.to_where())
+
+    def __bool__(self) -> bool:
+        return bool(self.conditions)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={value!r}" for field, value in self.conditions.items())
+        return f"SearchFilter({fields})"
@@ -1,150 +1,900 @@
 """
-向量数据库管理器 - 基于ChromaDB实现
+向量数据库管理器 - 基于ChromaDB或NumPy平面索引实现
 """
+import contextlib
+import json
 import os
-import shutil
+import re
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, TextIO, Union
+
+from config import (
+    COLLECTION_NAME, VECTOR_BACKEND, VECTOR_BACKEND_FLAT, VECTOR_BACKENDS, EMBEDDING_MODEL, DEFAULT_TOP_K,
+    VECTOR_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF, SIMILARITY_THRESHOLD,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, EMBEDDING_CACHE_SIZE, INDEX_VERSION_PATH,
+    EMBED_BATCH_SIZE, WRITE_BATCH_SIZE,
+    SEARCH_MODE_VECTOR, SEARCH_MODE_HYBRID, SEARCH_MODES, DEFAULT_SEARCH_MODE,
+    HYBRID_CANDIDATE_MULTIPLIER, RRF_K,
+    GRANULARITY_FILE, DEFAULT_GRANULARITY, INDEX_GRANULARITIES, COARSE_TO_FINE_TOP_FILES
+)
+from embedding_cache import EmbeddingCache, embedding_cache_key
+from embedding_engine import get_embedding_engine, register_embedding_functions
+from generations import IndexGeneration, activate_generation, current_generation, pointer_signature, published_here
+from lexical_index import BM25Index
+from metrics import metrics
+from query_cache import LRUCache, normalize_query
+from search_filters import SearchFilter
+
+# 驼峰或下划线命名的标识符，视为API名称
+_API_NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9]*[A-Z_][A-Za-z0-9_]*')
+
+# 本进程通过 VectorStore 打开的ChromaDB客户端数（按数据目录），供不支持 close 的旧版本ChromaDB判断何时停止System
+_chroma_client_refs: Dict[str, int] = {}
+_chroma_client_lock = threading.Lock()
+
+
+def _open_chroma_client(path: Path):
+    """
+    打开数据目录的ChromaDB客户端
+
+    同一进程内同一目录的客户端共享一个System（SQLite连接、HNSW段），用完需调用 _close_chroma_client 释放。
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    with _chroma_client_lock:
+        client = chromadb.PersistentClient(path=str(path), settings=Settings(allow_reset=True))
+        _chroma_client_refs[str(path)] = _chroma_client_refs.get(str(path), 0) + 1
+    return client
+
+
+def _close_chroma_client(client, path: Path):
+    """
+    释放 _open_chroma_client 打开的客户端，目录的最后一个客户端释放时停止其System
+
+    不释放时ChromaDB在进程内缓存每个打开过的目录的System，切换或清理索引代后仍占用已删除目录的文件句柄。
+    """
+    with _chroma_client_lock:
+        refs = _chroma_client_refs.get(str(path), 0) - 1
+        if refs > 0:
+            _chroma_client_refs[str(path)] = refs
+        else:
+            _chroma_client_refs.pop(str(path), None)
+
+        close = getattr(client, 'close', None)
+        if close is not None:
+            # ChromaDB 1.x 按引用计数停止共享的System
+            close()
+        elif refs <= 0:
+            from chromadb.api.client import SharedSystemClient
+
+            identifier = getattr(client, '_identifier', str(path))
+            system = SharedSystemClient._identifier_to_system.pop(identifier, None)
+            if system is not None:
+                system.stop()
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    将距离换算为余弦相似度（向量已归一化）
+
+    cosine 和 ip 空间的距离为 1 - 相似度，l2 空间的平方欧氏距离为 2 - 2 × 相似度。
+    """
+    return 1.0 - distance / 2.0 if space == 'l2' else 1.0 - distance
 
-from config import CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL, DEFAULT_TOP_K
 
 class VectorStore:
     """向量数据库管理器"""
 
-    def __init__(self, reset_db: bool = False):
+    def __init__(self, generation: Optional[IndexGeneration] = None, backend: Optional[str] = None,
+                 output: Optional[TextIO] = None):
         """
         初始化向量数据库
 
         Args:
-            reset_db: 是否重置数据库
+            generation: 使用指定的索引代（如 build 正在构建的新一代）；None 表示跟随 CURRENT 指针，
+                其他进程激活新的一代后，下一次检索时自动切换
+            backend: 向量存储后端，chroma 或 flat，None 使用配置的 VECTOR_BACKEND
+            output: 日志输出流，None 表示标准输出（如后台同步时标准输出被MCP协议占用，使用 sys.stderr）
         """
-        self.chroma_path = CHROMA_PATH
+        self.output = output
+        self.backend = backend or VECTOR_BACKEND
+        if self.backend not in VECTOR_BACKENDS:
+            raise ValueError(f"不支持的向量存储后端: {self.backend}")
+        self.follow_current = generation is None
+        self._current_pointer = pointer_signature()
+        self._switch_lock = threading.Lock()
+        # 切换索引代后保留的上一代客户端（切换前开始的检索可能仍在使用），下一次切换或 close 时释放
+        self._retired_client = None
+        self.client = None
+        self._client_path: Optional[Path] = None
+        self.generation = generation or current_generation()
+        self.chroma_path = self.generation.chroma_path
+        self.flat_index_path = self.generation.flat_index_path
         self.collection_name = COLLECTION_NAME
+        self.space = VECTOR_SPACE
+        self.search_ef = HNSW_SEARCH_EF
         self.embedding_model = EMBEDDING_MODEL
+        self.index_version_path = INDEX_VERSION_PATH
+        self.lexical_index_path = self.generation.lexical_index_path
+        self._lexical_index: Optional[BM25Index] = None
+        self._lexical_index_version = None
 
-        # 如果需要重置数据库
-        if reset_db and self.chroma_path.exists():
-            shutil.rmtree(self.chroma_path)
-            print(f"🗑️  已清除旧的向量数据库")
-
-        # 初始化ChromaDB
-        self._init_chromadb()
+        # 查询缓存：查询向量与索引无关，结果缓存按索引版本失效
+        self.embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+        self.result_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+        self._index_version_mtime = None
+        self._index_version = None
+        # 文档向量磁盘缓存，第一次写入时才打开
+        self._document_embedding_cache: Optional[EmbeddingCache] = None
 
-        # 初始化嵌入模型
+        # 初始化嵌入模型（需先于集合创建，集合直接使用该嵌入函数）
         self._init_embedding_model()
 
+        # 打开向量存储
+        self._init_backend()
+
+    @property
+    def db_path(self) -> Path:
+        """当前后端的数据目录"""
+        return self.generation.db_path(self.backend)
+
+    def _init_backend(self):
+        """打开配置的向量存储后端，两种后端都以 self.collection 提供相同的集合接口"""
+        if self.backend != VECTOR_BACKEND_FLAT:
+            self._init_chromadb()
+            return
+
+        from flat_index import FlatIndex
+
+        self.client = None
+        self.collection = FlatIndex(self.flat_index_path, space=VECTOR_SPACE)
+        self.space = VECTOR_SPACE
+        print(f"✅ 已打开平面向量索引: {self.flat_index_path}", file=self.output)
+        print(f"📊 索引中有 {self.collection.count()} 个文档", file=self.output)
+
     def _init_chromadb(self):
         """初始化ChromaDB"""
+        # 集合配置中记录的嵌入函数按名称解析为本进程共享的嵌入引擎
+        # （chromadb 导入耗时较长，在 _open_chroma_client 中延迟导入，只在真正打开数据库时才加载）
+        register_embedding_functions()
+
         # 确保数据目录存在
         self.chroma_path.mkdir(parents=True, exist_ok=True)
 
         # 创建ChromaDB客户端
-        self.client = chromadb.PersistentClient(
-            path=str(self.chroma_path),
-            settings=Settings(allow_reset=True)
-        )
+        self.client = _open_chroma_client(self.chroma_path)
+        self._client_path = self.chroma_path
 
         # 获取或创建集合
         try:
-            self.collection = self.client.get_collection(name=self.collection_name)
-            print(f"✅ 已连接到现有集合: {self.collection_name}")
-            print(f"📊 集合中有 {self.collection.count()} 个文档")
+            self.collection = self.client.get_collection(
+                name=self.collection_name,
+                embedding_function=self.embedding_function
+            )
+            print(f"✅ 已连接到现有集合: {self.collection_name}", file=self.output)
+            print(f"📊 集合中有 {self.collection.count()} 个文档", file=self.output)
         except Exception:
-            self.collection = self.client.create_collection(name=self.collection_name)
-            print(f"🆕 创建新集合: {self.collection_name}")
+            try:
+                # 集合由其他嵌入函数构建（如ChromaDB默认嵌入函数），写入和查询都显式传入向量，仍可继续使用
+                self.collection = self.client.get_collection(name=self.collection_name)
+                print(f"⚠️  集合 {self.collection_name} 的嵌入函数配置与 {self.embedding_model} 不一致，建议执行 build --reset 重建", file=self.output)
+            except Exception:
+                # HNSW参数以元数据形式传入，ChromaDB 0.4 及以上版本都支持
+                self.collection = self.client.create_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function,
+                    metadata={
+                        'hnsw:space': VECTOR_SPACE,
+                        'hnsw:M': HNSW_M,
+                        'hnsw:construction_ef': HNSW_CONSTRUCTION_EF,
+                        'hnsw:search_ef': self.search_ef,
+                    }
+                )
+                print(f"🆕 创建新集合: {self.collection_name}", file=self.output)
+
+        # 距离按集合实际的距离空间换算为相似度（旧集合可能由其他配置创建）
+        hnsw = self._hnsw_config()
+        self.space = hnsw['space']
+        self.search_ef = hnsw['ef_search'] or HNSW_SEARCH_EF
+        if self.space != VECTOR_SPACE:
+            print(f"⚠️  集合的距离空间为 {self.space}，与配置的 {VECTOR_SPACE} 不一致，建议执行 build --reset 重建", file=self.output)
+
+    def _hnsw_config(self) -> Dict[str, Any]:
+        """集合当前的HNSW距离空间和 search_ef"""
+        configuration = getattr(self.collection, 'configuration_json', None) or {}
+        hnsw = configuration.get('hnsw') or {}
+        metadata = self.collection.metadata or {}
+        return {
+            'space': hnsw.get('space') or metadata.get('hnsw:space', 'l2'),
+            'ef_search': hnsw.get('ef_search') or metadata.get('hnsw:search_ef'),
+        }
+
+    def set_search_ef(self, search_ef: int, reopen: bool = True) -> bool:
+        """
+        将HNSW检索的 search_ef 写入集合配置
+
+        已加载的HNSW段不会感知配置变化：reopen 为True时关闭客户端并重新打开集合（只用于调优等独占场景，
+        本进程中没有其他客户端使用同一目录时才会重新加载HNSW段），否则在下次打开集合
+        （如检索进程切换到新的索引代）时生效。
+
+        Args:
+            search_ef: 检索时的候选列表大小
+            reopen: 是否立即重新打开集合
+
+        Returns:
+            集合配置已是（或已改为）该值时返回True，ChromaDB版本不支持修改时返回False
+        """
+        if self.backend == VECTOR_BACKEND_FLAT:
+            return False
+
+        if self._hnsw_config()['ef_search'] != search_ef:
+            try:
+                self.collection.modify(configuration={'hnsw': {'ef_search': search_ef}})
+            except Exception as e:
+                print(f"⚠️  无法修改 search_ef（需要 ChromaDB 1.0 及以上版本）: {e}", file=self.output)
+                return False
+        self.search_ef = search_ef
+
+        if reopen:
+            _close_chroma_client(self.client, self._client_path)
+            self._init_chromadb()
+            self.result_cache.clear()
+        return True
+
+    @property
+    def manifest_path(self) -> Path:
+        """当前所用索引代的索引清单路径"""
+        return self.generation.manifest_path
+
+    def refresh(self) -> bool:
+        """
+        跟随 CURRENT 指针：其他进程激活了新的一代时，打开新一代的数据库和词法索引
+
+        只检查指针文件的签名，指针未变化时开销可以忽略。切换前已开始的检索继续使用旧集合完成。
+        指针被重写但仍指向当前代时（监听进程原地更新了该代），chroma 后端重新打开集合，
+        否则已加载的HNSW段看不到其他进程的写入；flat 后端和词法索引按文件变化自动重新加载。
+
+        Returns:
+            切换了索引代时返回True
+        """
+        if not self.follow_current:
+            return False
+        signature = pointer_signature()
+        if signature == self._current_pointer:
+            return False
+
+        with self._switch_lock:
+            if signature == self._current_pointer:
+                return False
+            generation = current_generation()
+            switched = generation != self.generation
+            if switched:
+                # 切换发生在检索线程中，日志写入 self.output（MCP服务中为标准错误），不重定向全局的标准输出
+                self._open_generation(generation)
+                print(f"🔄 已切换到索引代: {generation.name or 'legacy'}", file=self.output)
+            elif self.backend != VECTOR_BACKEND_FLAT and not published_here(signature):
+                self._reopen()
+            self._current_pointer = signature
+        return switched
+
+    def _reopen(self):
+        """
+        重新打开当前代的集合
+
+        同一目录的客户端共享ChromaDB的System，先释放旧客户端，新客户端才会从磁盘重新加载；
+        旧客户端上正在进行的检索可能失败（失败的结果不缓存）。
+        """
+        self._release_client((self.client, self._client_path))
+        self.client = None
+        self._init_backend()
+        self._lexical_index = None
+        self._lexical_index_version = None
+        self.result_cache.clear()
+
+    def _open_generation(self, generation: IndexGeneration):
+        """打开指定索引代的集合，丢弃旧一代的词法索引和结果缓存"""
+        previous = (self.generation, self.chroma_path, self.flat_index_path, self.lexical_index_path)
+        previous_client = (self.client, self._client_path)
+        self.generation = generation
+        self.chroma_path = generation.chroma_path
+        self.flat_index_path = generation.flat_index_path
+        self.lexical_index_path = generation.lexical_index_path
+        try:
+            self._init_backend()
+        except Exception:
+            self.generation, self.chroma_path, self.flat_index_path, self.lexical_index_path = previous
+            self.client, self._client_path = previous_client
+            raise
+        self._lexical_index = None
+        self._lexical_index_version = None
+        self.result_cache.clear()
+
+        # 再上一代已不会再被检索使用（其目录可能已被垃圾回收删除），释放其客户端；上一代的客户端保留到下一次切换
+        self._release_client(self._retired_client)
+        self._retired_client = previous_client if previous_client[0] is not None else None
+
+    @staticmethod
+    def _release_client(client_and_path: Optional[tuple]):
+        if client_and_path is not None:
+            _close_chroma_client(*client_and_path)
+
+    def close(self):
+        """释放ChromaDB客户端（包括切换索引代后保留的上一代客户端），关闭后不能再使用"""
+        self._release_client(self._retired_client)
+        self._retired_client = None
+        if self.client is not None:
+            self._release_client((self.client, self._client_path))
+            self.client = None
 
     def _init_embedding_model(self):
-        """初始化嵌入模型"""
-        print(f"🔄 加载嵌入模型: {self.embedding_model}")
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=self.embedding_model
-        )
-        print(f"✅ 嵌入模型加载完成")
+        """
+        初始化嵌入引擎，同一进程内的VectorStore实例共享同一个嵌入引擎
+
+        模型在第一次编码（写入或检索）时才加载。
+        """
+        self.embedding_function = get_embedding_engine(self.embedding_model)
 
-    def add_documents(self, documents: List[Dict[str, Any]]):
+    def add_documents(self, documents: Iterable[Dict[str, Any]],
+                      progress_callback: Optional[Callable[[int], None]] = None) -> int:
         """
-        添加文档到向量数据库
+        添加文档到向量数据库（ID已存在的文档被覆盖，重复构建不会失败）
 
         Args:
-            documents: 文档列表，每个文档包含content和metadata
+            documents: 文档列表或生成器，每个文档包含content和metadata
+            progress_callback: 进度回调，参数为已写入的分块数
+
+        Returns:
+            写入的分块数
         """
-        if not documents:
-            print("⚠️  没有文档需要添加")
-            return
+        try:
+            count = self._ingest(documents, self.collection.upsert, progress_callback)
+        except Exception as e:
+            print(f"❌ 添加文档失败: {e}", file=self.output)
+            return 0
 
-        # 准备数据
-        ids = []
-        texts = []
-        metadatas = []
+        if not count:
+            print("⚠️  没有文档需要添加", file=self.output)
+            return 0
 
-        for i, doc in enumerate(documents):
-            # 生成唯一ID
-            doc_id = doc['metadata']['chunk_id']
-            ids.append(doc_id)
+        print(f"✅ 成功添加 {count} 个文档到向量数据库", file=self.output)
+        print(f"📊 数据库现在有 {self.collection.count()} 个文档", file=self.output)
+        return count
 
-            # 文档内容
-            texts.append(doc['content'])
+    def upsert_documents(self, documents: Iterable[Dict[str, Any]],
+                         progress_callback: Optional[Callable[[int], None]] = None) -> int:
+        """
+        插入或更新文档（按chunk_id覆盖已有文档）
 
-            # 元数据
-            metadatas.append(doc['metadata'])
+        Args:
+            documents: 文档列表或生成器，每个文档包含content和metadata
+            progress_callback: 进度回调，参数为已写入的分块数
 
+        Returns:
+            写入的分块数
+        """
         try:
-            # 批量添加文档
-            self.collection.add(
-                ids=ids,
-                documents=texts,
-                metadatas=metadatas
-            )
-            print(f"✅ 成功添加 {len(documents)} 个文档到向量数据库")
-            print(f"📊 数据库现在有 {self.collection.count()} 个文档")
+            return self._ingest(documents, self.collection.upsert, progress_callback)
+        except Exception as e:
+            print(f"❌ 更新文档失败: {e}", file=self.output)
+            raise
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        只更新文档的元数据（内容和向量不变，不需要重新嵌入）
+
+        Args:
+            ids: 文档ID列表
+            metadatas: 与ID一一对应的新元数据
+        """
+        if not ids:
+            return
+
+        try:
+            for start in range(0, len(ids), WRITE_BATCH_SIZE):
+                self.collection.update(
+                    ids=ids[start:start + WRITE_BATCH_SIZE],
+                    metadatas=metadatas[start:start + WRITE_BATCH_SIZE]
+                )
+        except Exception as e:
+            print(f"❌ 更新元数据失败: {e}", file=self.output)
+            raise
+
+    def delete_documents(self, ids: List[str]):
+        """
+        按ID删除文档
+
+        Args:
+            ids: 待删除的文档ID列表
+        """
+        if not ids:
+            return
+
+        try:
+            self.collection.delete(ids=ids)
         except Exception as e:
-            print(f"❌ 添加文档失败: {e}")
+            print(f"❌ 删除文档失败: {e}", file=self.output)
+            raise
+
+    @contextlib.contextmanager
+    def write_batch(self) -> Iterator[None]:
+        """
+        合并期间的写入：flat 后端每次提交都要重写整个索引，批量写入在退出时只提交一次；
+        chroma 后端逐批写入，不受影响
+        """
+        if self.backend == VECTOR_BACKEND_FLAT:
+            with self.collection.batch():
+                yield
+        else:
+            yield
+
+    def _ingest(self, documents: Iterable[Dict[str, Any]], write: Callable,
+                progress_callback: Optional[Callable[[int], None]] = None) -> int:
+        """
+        流式分批写入文档
+
+        每 EMBED_BATCH_SIZE 个分块嵌入一次，累积到 WRITE_BATCH_SIZE 个分块后写入一次，
+        峰值内存只与批大小有关，与语料规模无关。内容已在磁盘缓存中的分块不再重新嵌入。
+
+        Args:
+            documents: 文档可迭代对象
+            write: 写入函数（collection.add 或 collection.upsert）
+            progress_callback: 进度回调，参数为已写入的分块数
 
-    def search(self, query: str, top_k: int = DEFAULT_TOP_K, where: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        Returns:
+            写入的分块数
+        """
+        write_batch_size = WRITE_BATCH_SIZE
+        max_batch_size = getattr(self.client, 'get_max_batch_size', None)
+        if max_batch_size:
+            write_batch_size = min(write_batch_size, max_batch_size())
+
+        written = 0
+        pending = {'ids': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+
+        def flush(limit: int):
+            nonlocal written
+            while len(pending['ids']) >= limit and pending['ids']:
+                size = min(len(pending['ids']), write_batch_size)
+                with metrics.timer('index.write'):
+                    write(**{key: values[:size] for key, values in pending.items()})
+                metrics.incr('index.chunks_written', size)
+                for values in pending.values():
+                    del values[:size]
+                written += size
+                if progress_callback:
+                    progress_callback(written)
+
+        iterator = iter(documents)
+        while True:
+            batch = list(islice(iterator, EMBED_BATCH_SIZE))
+            if not batch:
+                break
+
+            texts = [doc['content'] for doc in batch]
+            pending['ids'].extend(doc['metadata']['chunk_id'] for doc in batch)
+            pending['documents'].extend(texts)
+            pending['metadatas'].extend(doc['metadata'] for doc in batch)
+            pending['embeddings'].extend(self._embed_documents(texts))
+
+            # 凑满一个写入批次再写入
+            flush(write_batch_size)
+
+        # 写入剩余的分块
+        flush(1)
+        if self._document_embedding_cache is not None:
+            self._document_embedding_cache.flush()
+        return written
+
+    def _embed_documents(self, texts: List[str]) -> List[Any]:
+        """嵌入文档内容，优先从磁盘缓存读取，只对未缓存的内容调用模型"""
+        if self._document_embedding_cache is None:
+            self._document_embedding_cache = EmbeddingCache(output=self.output)
+
+        keys = [embedding_cache_key(self.embedding_function.cache_key, text) for text in texts]
+        embeddings = self._document_embedding_cache.get_many(keys)
+        metrics.incr('embedding.document_texts', len(texts))
+
+        # 同一批次内的重复内容只编码一次
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            metrics.incr('embedding.document_cache_misses', len(missing))
+            with metrics.timer('embedding.encode_documents'):
+                encoded = dict(zip(missing, self.embedding_function([texts[i] for i in missing.values()])))
+            self._document_embedding_cache.put_many(list(encoded), list(encoded.values()))
+            embeddings = [
+                embedding if embedding is not None else encoded[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
+        return embeddings
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K, where: Optional[Union[Dict, SearchFilter]] = None,
+               mode: str = DEFAULT_SEARCH_MODE, granularity: str = DEFAULT_GRANULARITY,
+               coarse_top_files: int = COARSE_TO_FINE_TOP_FILES,
+               min_similarity: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         在向量数据库中搜索相似文档
 
+        相同（规范化后）的查询在索引未变化时直接返回缓存结果。
+
         Args:
             query: 查询字符串
             top_k: 返回结果数量
-            where: 元数据过滤条件
+            where: 元数据过滤条件，SearchFilter 或 ChromaDB where 字典
+            mode: 检索模式，vector（向量）、lexical（BM25）或 hybrid（两者倒数排名融合）
+            granularity: 返回结果的分块粒度
+            coarse_top_files: 由粗到细检索时先选出的文件数，0 表示直接检索该粒度的全部分块
+            min_similarity: 向量结果的最低相似度，None 使用 SIMILARITY_THRESHOLD
 
         Returns:
-            搜索结果列表
+            搜索结果列表，向量检索命中的结果带有 distance 和 similarity
         """
-        try:
-            # 构建查询参数
-            query_params = {
-                "query_texts": [query],
-                "n_results": top_k
-            }
+        return self.search_batch([{
+            'query': query, 'top_k': top_k, 'where': where, 'mode': mode,
+            'granularity': granularity, 'coarse_top_files': coarse_top_files,
+            'min_similarity': min_similarity
+        }])[0]
+
+    def search_batch(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索，支持由粗到细检索
+
+        细粒度（章节、段落、句子）查询先在文件级别分块中检索出排名靠前的文件，
+        再只在这些文件内检索该粒度的分块，细粒度分块的检索范围与语料规模无关。
+
+        Args:
+            queries: 查询列表，每项包含 query，可选 top_k、where（SearchFilter 或 where 字典）、mode、
+                granularity、coarse_top_files 和 min_similarity
+
+        Returns:
+            与输入顺序一致的搜索结果列表
+        """
+        self.refresh()
+        metrics.incr('search.queries', len(queries))
+        metrics.incr('search.batches')
+        fine_queries = []
+        coarse_positions = []
+        coarse_queries = []
+
+        for position, item in enumerate(queries):
+            granularity = item.get('granularity') or DEFAULT_GRANULARITY
+            if granularity not in INDEX_GRANULARITIES:
+                raise ValueError(f"未建立索引的粒度: {granularity}")
+
+            where = item.get('where')
+            if isinstance(where, SearchFilter):
+                where = where.to_where()
+
+            coarse_top_files = item.get('coarse_top_files')
+            if coarse_top_files is None:
+                coarse_top_files = COARSE_TO_FINE_TOP_FILES
 
-            # 添加过滤条件
-            if where:
-                query_params["where"] = where
-
-            # 执行搜索
-            results = self.collection.query(**query_params)
-
-            # 格式化结果
-            formatted_results = []
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None
+            fine_queries.append({**item, 'where': where, 'granularity': granularity})
+            if coarse_top_files > 0 and granularity != GRANULARITY_FILE and GRANULARITY_FILE in INDEX_GRANULARITIES:
+                coarse_positions.append(position)
+                # 粗检索只用于圈定文件，不按相似度阈值过滤
+                coarse_queries.append({
+                    **item,
+                    'top_k': coarse_top_files,
+                    'min_similarity': 0.0,
+                    'where': SearchFilter.combine(where, {'granularity': {'$eq': GRANULARITY_FILE}})
                 })
 
-            return formatted_results
+        # 粗检索：选出每个查询排名靠前的文件
+        top_files = {}
+        if coarse_queries:
+            with metrics.timer('search.coarse'):
+                coarse_results = self._search_batch_flat(coarse_queries)
+            for position, results in zip(coarse_positions, coarse_results):
+                top_files[position] = list(dict.fromkeys(result['metadata']['file_path'] for result in results))
 
-        except Exception as e:
-            print(f"❌ 搜索失败: {e}")
-            return []
+        # 细检索：限定粒度，并限定在粗检索选出的文件内（粗检索无结果时不限定文件）
+        for position, item in enumerate(fine_queries):
+            clauses = [{'granularity': {'$eq': item['granularity']}}]
+            if top_files.get(position):
+                clauses.append({'file_path': {'$in': top_files[position]}})
+            item['where'] = SearchFilter.combine(item['where'], clauses[0] if len(clauses) == 1 else {'$and': clauses})
+
+        with metrics.timer('search.fine'):
+            return self._search_batch_flat(fine_queries)
+
+    def _search_batch_flat(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        在整个集合上批量搜索
+
+        未命中缓存的查询一次性向量化编码，相同召回数量和过滤条件的查询合并为一次ChromaDB多向量查询。
+
+        Args:
+            queries: 查询列表，每项包含 query，可选 top_k、where（SearchFilter 或 where 字典）、mode 和 min_similarity
+
+        Returns:
+            与输入顺序一致的搜索结果列表
+        """
+        index_version = self.index_version
+        outputs: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        misses = []
+
+        for position, item in enumerate(queries):
+            mode = item.get('mode') or DEFAULT_SEARCH_MODE
+            if mode not in SEARCH_MODES:
+                raise ValueError(f"不支持的检索模式: {mode}")
+
+            normalized = normalize_query(item['query'])
+            top_k = item.get('top_k') or DEFAULT_TOP_K
+            where = item.get('where')
+            if isinstance(where, SearchFilter):
+                where = where.to_where()
+            where_key = json.dumps(where, sort_keys=True, ensure_ascii=False) if where else None
+            # 规范化会抹去大小写，API名称形态的查询单独缓存（见 _is_exact_term_hit）
+            api_name = _API_NAME_PATTERN.fullmatch(item['query'].strip()) is not None
+            min_similarity = item.get('min_similarity')
+            if min_similarity is None:
+                min_similarity = SIMILARITY_THRESHOLD
+            cache_key = (normalized, top_k, where_key, mode, api_name, min_similarity, index_version)
+
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                metrics.incr('search.result_cache_hits')
+                outputs[position] = cached
+            else:
+                metrics.incr('search.result_cache_misses')
+                misses.append({
+                    'position': position, 'query': normalized, 'api_name': api_name,
+                    'top_k': top_k, 'where': where, 'where_key': where_key,
+                    'mode': mode, 'min_similarity': min_similarity, 'cache_key': cache_key
+                })
+
+        if misses:
+            lexical_index = self._get_lexical_index()
+
+            # 确定每个查询需要的向量召回数量，纯词法查询和精确命中API名称的混合查询不做向量检索
+            for request in misses:
+                request['lexical'] = []
+                request['n_results'] = 0
+                if request['mode'] != SEARCH_MODE_VECTOR and lexical_index is not None:
+                    candidates = request['top_k'] * (
+                        HYBRID_CANDIDATE_MULTIPLIER if request['mode'] == SEARCH_MODE_HYBRID else 1
+                    )
+                    with metrics.timer('search.lexical'):
+                        request['lexical'] = lexical_index.search(request['query'], candidates, request['where'])
+                if request['mode'] == SEARCH_MODE_VECTOR or lexical_index is None:
+                    request['n_results'] = request['top_k']
+                elif request['mode'] == SEARCH_MODE_HYBRID and not self._is_exact_term_hit(
+                        request, lexical_index):
+                    request['n_results'] = request['top_k'] * HYBRID_CANDIDATE_MULTIPLIER
+
+            vector_results = self._vector_query_batch([request for request in misses if request['n_results']])
+
+            for request in misses:
+                vector = vector_results.get(request['position'], [])
+                if request['mode'] == SEARCH_MODE_HYBRID and request['n_results']:
+                    with metrics.timer('search.fuse'):
+                        results = self._fuse(vector, request['lexical'], request['top_k'])
+                elif request['n_results']:
+                    results = vector
+                else:
+                    results = request['lexical'][:request['top_k']]
+
+                # 向量检索失败时不缓存，下次重试
+                vector_failed = request['n_results'] and request['position'] not in vector_results
+                if not vector_failed:
+                    self.result_cache.set(request['cache_key'], results)
+                outputs[request['position']] = results
+
+        return [[dict(result) for result in output] for output in outputs]
+
+    def _vector_query_batch(self, requests: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批量执行向量检索
+
+        Args:
+            requests: 需要向量检索的查询，包含 position、query、n_results、where、min_similarity
+
+        Returns:
+            查询位置到检索结果的映射，检索失败的查询不在结果中
+        """
+        if not requests:
+            return {}
+
+        embeddings = dict(zip(
+            [request['query'] for request in requests],
+            self._embed_queries([request['query'] for request in requests])
+        ))
+
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for request in requests:
+            groups.setdefault((request['n_results'], request['where_key']), []).append(request)
+
+        outputs = {}
+        for (n_results, _), members in groups.items():
+            try:
+                # 构建查询参数
+                query_params = {
+                    "query_embeddings": [embeddings[request['query']] for request in members],
+                    "n_results": n_results
+                }
+
+                # 添加过滤条件
+                where = members[0]['where']
+                if where:
+                    query_params["where"] = where
+
+                # 执行搜索（元数据过滤在ChromaDB内部与HNSW检索一并完成）
+                metrics.incr('search.vector_queries', len(members))
+                with metrics.timer('search.hnsw'):
+                    results = self.collection.query(**query_params)
+            except Exception as e:
+                metrics.incr('search.errors')
+                print(f"❌ 搜索失败: {e}", file=self.output)
+                continue
+
+            # 格式化结果，丢弃相似度低于阈值的结果
+            with metrics.timer('search.format'):
+                for row, request in enumerate(members):
+                    formatted_results = []
+                    for i in range(len(results['ids'][row])):
+                        distance = results['distances'][row][i] if results.get('distances') else None
+                        similarity = distance_to_similarity(distance, self.space) if distance is not None else None
+                        if similarity is not None and similarity < request['min_similarity']:
+                            metrics.incr('search.below_threshold')
+                            continue
+                        formatted_results.append({
+                            'id': results['ids'][row][i],
+                            'content': results['documents'][row][i],
+                            'metadata': results['metadatas'][row][i],
+                            'distance': distance,
+                            'similarity': similarity
+                        })
+                    outputs[request['position']] = formatted_results
+
+        return outputs
+
+    @staticmethod
+    def _is_exact_term_hit(request: Dict[str, Any], lexical_index: BM25Index) -> bool:
+        """
+        查询是否为索引中存在的单个API名称（如 StateFlow、repeatOnLifecycle）
+
+        这类查询词法检索已足够精确，跳过向量编码和HNSW查询。
+        """
+        return (
+            request['api_name']
+            and bool(request['lexical'])
+            and lexical_index.contains_term(request['query'])
+        )
+
+    @staticmethod
+    def _fuse(vector_results: List[Dict[str, Any]], lexical_results: List[Dict[str, Any]],
+              top_k: int) -> List[Dict[str, Any]]:
+        """倒数排名融合（RRF）：score = Σ 1 / (RRF_K + rank)"""
+        fused: Dict[str, Dict[str, Any]] = {}
+        for results in (vector_results, lexical_results):
+            for rank, result in enumerate(results, 1):
+                entry = fused.setdefault(result['id'], {**result, 'score': 0.0})
+                entry['score'] += 1.0 / (RRF_K + rank)
+                if entry.get('distance') is None:
+                    entry['distance'] = result.get('distance')
+                    entry['similarity'] = result.get('similarity')
+
+        return sorted(fused.values(), key=lambda result: result['score'], reverse=True)[:top_k]
+
+    def _embed_queries(self, normalized_queries: List[str]) -> List[Any]:
+        """批量获取查询向量，优先使用缓存，未命中的查询一次性编码"""
+        embeddings = [self.embedding_cache.get((self.embedding_function.cache_key, query)) for query in normalized_queries]
+        missing = list(dict.fromkeys(
+            query for query, embedding in zip(normalized_queries, embeddings) if embedding is None
+        ))
+
+        metrics.incr('search.query_embedding_cache_hits', len(normalized_queries) - len(missing))
+        if missing:
+            metrics.incr('search.embedding_batch_queries', len(missing))
+            with metrics.timer('search.embed_query'):
+                encoded = dict(zip(missing, self.embedding_function(missing)))
+            for query, embedding in encoded.items():
+                self.embedding_cache.set((self.embedding_function.cache_key, query), embedding)
+            embeddings = [
+                embedding if embedding is not None else encoded[query]
+                for query, embedding in zip(normalized_queries, embeddings)
+            ]
+        return embeddings
+
+    def iter_ids(self, page_size: int = WRITE_BATCH_SIZE) -> Iterator[str]:
+        """分页遍历集合中的所有文档ID"""
+        offset = 0
+        while True:
+            page = self.collection.get(include=[], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            yield from page['ids']
+            offset += len(page['ids'])
+
+    def rebuild_lexical_index(self, page_size: int = WRITE_BATCH_SIZE) -> int:
+        """
+        从集合内容重建BM25词法索引并持久化
+
+        Args:
+            page_size: 分页读取集合的页大小
+
+        Returns:
+            索引的文档数
+        """
+        def iter_collection():
+            offset = 0
+            while True:
+                page = self.collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+                if not page['ids']:
+                    break
+                for doc_id, content, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                    yield {'id': doc_id, 'content': content, 'metadata': metadata}
+                offset += len(page['ids'])
+
+        index = BM25Index()
+        index.build(iter_collection())
+        index.save(self.lexical_index_path)
+        return len(index)
+
+    def update_lexical_index(self, documents: List[Dict[str, Any]], removed_ids: List[str],
+                             metadatas: Dict[str, Dict[str, Any]]) -> int:
+        """
+        增量更新BM25词法索引（只对新写入的分块分词）并持久化，索引不存在或与集合不一致时全量重建
+
+        Args:
+            documents: 写入的分块，包含id、content和metadata
+            removed_ids: 删除的分块ID
+            metadatas: 只更新元数据的分块（ID -> 新元数据）
+
+        Returns:
+            索引的文档数
+        """
+        try:
+            index = BM25Index.load(self.lexical_index_path)
+        except Exception:
+            index = None
+        if index is None:
+            return self.rebuild_lexical_index()
+
+        index.update(documents, removed_ids, metadatas)
+        if len(index) != self.collection.count():
+            return self.rebuild_lexical_index()
+        index.save(self.lexical_index_path)
+        return len(index)
+
+    def _get_lexical_index(self) -> Optional[BM25Index]:
+        """获取BM25词法索引，索引版本变化时从磁盘重新加载；尚未构建时返回None"""
+        version = self.index_version
+        if self._lexical_index_version != version:
+            try:
+                self._lexical_index = BM25Index.load(self.lexical_index_path)
+            except Exception as e:
+                print(f"⚠️  加载词法索引失败，仅使用向量检索: {e}", file=self.output)
+                self._lexical_index = None
+            self._lexical_index_version = version
+        return self._lexical_index
+
+    @property
+    def index_version(self) -> str:
+        """
+        当前索引版本
+
+        版本标记文件在激活索引代时更新（写入未激活的代不影响检索结果）；其他进程（如MCP服务）
+        执行构建后，本进程通过文件修改时间感知到变化，结果缓存和词法索引随之失效。
+        """
+        try:
+            mtime = self.index_version_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime != self._index_version_mtime:
+            self._index_version_mtime = mtime
+            self._index_version = (
+                self.index_version_path.read_text(encoding='utf-8').strip() if mtime is not None else "0"
+            )
+            self.result_cache.clear()
+        return self._index_version
 
     def get_document_by_id(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -165,27 +915,47 @@ class VectorStore:
                     'metadata': results['metadatas'][0]
                 }
         except Exception as e:
-            print(f"❌ 获取文档失败: {e}")
+            print(f"❌ 获取文档失败: {e}", file=self.output)
         return None
 
     def get_stats(self) -> Dict[str, Any]:
         """获取数据库统计信息"""
         try:
+            self.refresh()
             count = self.collection.count()
+            metrics.gauge('index.documents', count)
             return {
                 'total_documents': count,
                 'collection_name': self.collection_name,
                 'embedding_model': self.embedding_model,
-                'db_path': str(self.chroma_path)
+                'embedding_backend': self.embedding_function.backend,
+                'backend': self.backend,
+                'db_path': str(self.db_path),
+                'space': self.space,
+                **({'search_ef': self.search_ef} if self.backend != VECTOR_BACKEND_FLAT else {}),
+                'generation': self.generation.name or 'legacy',
+                'index_version': self.index_version,
+                'cache': {
+                    'results': self.result_cache.stats(),
+                    'embeddings': self.embedding_cache.stats(),
+                    **({'document_embeddings': self._document_embedding_cache.stats()}
+                       if self._document_embedding_cache is not None else {}),
+                },
+                'metrics': metrics.snapshot(),
             }
         except Exception as e:
-            print(f"❌ 获取统计信息失败: {e}")
+            print(f"❌ 获取统计信息失败: {e}", file=self.output)
             return {}
 
     def reset_database(self):
-        """重置数据库"""
+        """重置数据库（清空的是当前代时重新发布该代，检索进程的缓存随之失效）"""
         try:
-            self.client.reset()
-            print("🗑️  数据库已重置")
+            if self.backend == VECTOR_BACKEND_FLAT:
+                self.collection.reset()
+            else:
+                self.client.reset()
+            if self.generation == current_generation():
+                activate_generation(self.generation)
+            print("🗑️  数据库已重置", file=self.output)
         except Exception as e:
-            print(f"❌ 重置数据库失败: {e}")
\ No newline at end of file
+            print(f"❌ 重置数据库失败: {e}", file=self.output)
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+知识库文件监听 - 文档变化时自动增量更新索引
+"""
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from config import KNOWLEDGE_DIRS, SUPPORTED_EXTENSIONS, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+
+if TYPE_CHECKING:
+    from vector_store import VectorStore
+
+
+def _is_source_file(path: Path) -> bool:
+    """是否为知识库支持的文件类型（编辑器的临时文件等不会触发重建）"""
+    return path.suffix.lower() in SUPPORTED_EXTENSIONS and not path.name.startswith('.')
+
+
+class KnowledgeWatcher:
+    """
+    知识库目录监听器
+
+    优先使用 watchfiles（基于inotify/FSEvents等系统事件），未安装时回退到定时轮询
+    文件的修改时间和大小。一段时间内的连续变化合并为一批（防抖），
+    以变化的文件路径集合调用回调，回调在监听线程中执行。
+    """
+
+    def __init__(self, directories: Iterable[Path], on_change: Callable[[Set[Path]], None],
+                 debounce: float = WATCH_DEBOUNCE_SECONDS, poll_interval: float = WATCH_POLL_INTERVAL,
+                 on_start: Optional[Callable[[], None]] = None, output: Optional[TextIO] = None):
+        """
+        初始化监听器
+
+        Args:
+            directories: 监听的目录
+            on_change: 变化回调，参数为变化（新增、修改或删除）的文件路径集合
+            debounce: 防抖时间，变化停止该时长后才触发回调
+            poll_interval: 轮询模式下的扫描间隔
+            on_start: 开始监听前在监听线程中执行的回调（如追平监听开始前的变化）
+            output: 日志输出流，None 表示标准输出
+        """
+        self.directories = [Path(directory).resolve() for directory in directories]
+        self.on_change = on_change
+        self.on_start = on_start
+        self.output = output
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """在后台线程中开始监听"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="knowledge-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止监听"""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def run(self):
+        """在当前线程中监听，直到调用 stop"""
+        directories = [directory for directory in self.directories if directory.exists()]
+        if not directories:
+            print("⚠️  没有可监听的知识库目录", file=self.output)
+            return
+
+        if self.on_start:
+            self._dispatch(self.on_start)
+
+        try:
+            import watchfiles
+        except ImportError:
+            watchfiles = None
+
+        if watchfiles is not None:
+            self._run_events(watchfiles, directories)
+        else:
+            self._run_polling(directories)
+
+    def _run_events(self, watchfiles, directories: List[Path]):
+        """基于文件系统事件监听，由 watchfiles 合并变化：安静 debounce 秒后触发，持续变化时最多等待10倍防抖时间"""
+        quiet_ms = max(1, int(self.debounce * 1000))
+        for changes in watchfiles.watch(
+            *directories,
+            watch_filter=lambda change, path: _is_source_file(Path(path)),
+            step=quiet_ms,
+            debounce=quiet_ms * 10,
+            stop_event=self._stop_event,
+            yield_on_timeout=False,
+        ):
+            self._dispatch(self.on_change, {Path(path) for _, path in changes})
+
+    def _run_polling(self, directories: List[Path]):
+        """定时扫描目录，对比文件的修改时间和大小"""
+        snapshot = self._snapshot(directories)
+        changed: Set[Path] = set()
+        last_change = 0.0
+
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._snapshot(directories)
+            diff = {path for path in snapshot.keys() | current.keys() if snapshot.get(path) != current.get(path)}
+            snapshot = current
+
+            if diff:
+                changed |= diff
+                last_change = time.monotonic()
+            elif changed and time.monotonic() - last_change >= self.debounce:
+                self._dispatch(self.on_change, changed)
+                changed = set()
+
+    @staticmethod
+    def _snapshot(directories: List[Path]) -> Dict[Path, Tuple[int, int]]:
+        """目录下所有支持文件的 (修改时间, 大小)"""
+        snapshot = {}
+        for directory in directories:
+            for path in directory.rglob('*'):
+                if not _is_source_file(path):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.is_file():
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _dispatch(self, callback: Callable, *args: Any):
+        """调用回调，回调中的异常不会终止监听"""
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"❌ 处理文件变化失败: {e}", file=self.output)
+
+
+def create_index_watcher(vector_store: "VectorStore", knowledge_dirs: Optional[Iterable[Path]] = None,
+                         output: Optional[TextIO] = None,
+                         on_synced: Optional[Callable[[Dict[str, Any]], None]] = None) -> KnowledgeWatcher:
+    """
+    创建保持索引实时更新的监听器
+
+    监听线程启动后先执行一次全量增量同步，追平监听开始前的变化（与 build 相同，在从当前代复制出的
+    新一代中进行，校验通过后激活）；之后每批文件变化只重新分块和嵌入变化的文件，直接写入当前代并
+    增量更新词法索引，开销与变化的文件大小有关，与语料规模无关。写完后 vector_store 立即刷新。
+
+    Args:
+        vector_store: 检索使用的向量数据库（跟随 CURRENT 指针）
+        knowledge_dirs: 知识库目录，默认为配置中的所有知识库根目录
+        output: 同步过程的日志输出流（如MCP服务中标准输出被协议占用时使用 sys.stderr），None 表示标准输出
+        on_synced: 每次同步完成后的回调，参数为同步统计信息
+
+    Returns:
+        尚未启动的监听器，调用 start() 在后台运行或 run() 在当前线程运行
+    """
+    from document_processor import DocumentProcessor
+    from indexer import sync_generation
+
+    knowledge_dirs = list(knowledge_dirs) if knowledge_dirs is not None else list(KNOWLEDGE_DIRS.values())
+
+    # 监听所在进程通常还有检索线程，不在多线程进程中fork工作进程；每批变化的文件数也很少
+    processor = DocumentProcessor(workers=1)
+
+    def sync(paths: Optional[Set[Path]] = None):
+        # 输出流显式传给同步过程，不重定向全局的标准输出（检索线程可能同时在写日志）
+        result = sync_generation(processor, knowledge_dirs, paths=paths, output=output, in_place=paths is not None)
+        for problem in result['problems']:
+            print(f"❌ 新索引校验失败，继续使用当前索引: {problem}", file=output)
+        if result['activated']:
+            vector_store.refresh()
+        if on_synced:
+            on_synced(result['summary'])
+
+    return KnowledgeWatcher(knowledge_dirs, on_change=sync, on_start=sync, output=output)
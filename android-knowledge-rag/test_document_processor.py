@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+章节分块测试脚本
+
+检查章节分块的标题路径、token预算和代码块完整性：每个分块是原文的连续片段，
+全部内容都被分块覆盖，预算内的代码块不会被拆开，代码块中的 # 注释不被当作标题。
+
+用法: pytest test_document_processor.py
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from config import GRANULARITY_SECTION
+from document_processor import DocumentProcessor, SECTION_PATH_SEPARATOR, estimate_tokens
+
+CODE_BLOCK = """```kotlin
+class CounterViewModel : ViewModel() {
+    # 不是标题
+    private val _count = MutableStateFlow(0)
+    val count: StateFlow<Int> = _count.asStateFlow()
+
+    fun increment() {
+        _count.update { it + 1 }
+    }
+}
+```"""
+
+GUIDE = f"""# ViewModel 指南
+
+## 作用域
+
+viewModelScope 在 ViewModel 清除时取消其中的协程。
+
+### 示例
+
+{CODE_BLOCK}
+
+## 状态
+
+""" + "\n\n".join(f"第 {i} 段：用 StateFlow 暴露界面状态，界面在 repeatOnLifecycle 中收集。" for i in range(12)) + """
+
+## 超长单行
+
+""" + "很长的一行" * 200 + "\n"
+
+
+def _chunks(tmp_path, content=GUIDE, budget=60, overlap=0):
+    processor = DocumentProcessor(
+        granularities=GRANULARITY_SECTION, section_token_budget=budget, section_overlap_tokens=overlap, workers=1,
+        roots={"components": tmp_path / "components"}
+    )
+    return processor.process_file(tmp_path / "components" / "ViewModel.md", content)
+
+
+def _path(*titles):
+    return SECTION_PATH_SEPARATOR.join(titles)
+
+
+def test_heading_paths(tmp_path):
+    """连续的标题合并为一个分块，每个分块记录所在章节的完整标题路径"""
+    chunks = _chunks(tmp_path)
+    paths = [chunk['metadata']['section_path'] for chunk in chunks]
+
+    first = chunks[0]
+    assert first['content'].startswith("# ViewModel 指南\n\n## 作用域")
+    assert first['metadata']['section_path'] == _path("ViewModel 指南", "作用域")
+    assert _path("ViewModel 指南", "作用域", "示例") in paths
+    assert _path("ViewModel 指南", "状态") in paths
+    assert paths[-1] == _path("ViewModel 指南", "超长单行")
+    # 代码块中的 “# 不是标题” 不进入章节路径
+    assert not any("不是标题" in path for path in paths)
+    assert [chunk['metadata']['section_index'] for chunk in chunks] == list(range(1, len(chunks) + 1))
+    assert all(chunk['metadata']['chunk_type'] == "section" for chunk in chunks)
+
+
+@pytest.mark.parametrize("budget", [40, 60, 200])
+def test_token_budget_and_coverage(tmp_path, budget):
+    """分块不超过token预算，是原文的连续片段，按顺序首尾相接覆盖全部内容"""
+    chunks = _chunks(tmp_path, budget=budget)
+    text = GUIDE.strip()
+
+    covered = 0
+    for chunk in chunks:
+        start, end = chunk['metadata']['char_start'], chunk['metadata']['char_end']
+        assert chunk['content'] == text[start:end].strip()
+        assert estimate_tokens(chunk['content']) <= budget
+        # 分块之间只隔着空白
+        assert not text[covered:start].strip()
+        covered = end
+    assert not text[covered:].strip()
+
+
+def test_new_heading_starts_new_chunk(tmp_path):
+    """预算足够时，每个章节恰好一个分块，分块从标题开始"""
+    chunks = _chunks(tmp_path, content=GUIDE.split("## 超长单行")[0], budget=10_000)
+    assert [chunk['content'].splitlines()[0] for chunk in chunks] == ["# ViewModel 指南", "### 示例", "## 状态"]
+
+
+@pytest.mark.parametrize("budget", [estimate_tokens(CODE_BLOCK), 100, 200])
+def test_code_block_not_split(tmp_path, budget):
+    """预算内的代码块完整地出现在一个分块中"""
+    chunks = _chunks(tmp_path, budget=budget)
+    holding = [chunk for chunk in chunks if "```kotlin" in chunk['content']]
+    assert len(holding) == 1
+    assert CODE_BLOCK in holding[0]['content']
+    for chunk in chunks:
+        assert len(re.findall(r"^```", chunk['content'], re.MULTILINE)) % 2 == 0
+
+
+def test_overlap_within_section(tmp_path):
+    """启用重叠时，同一章节内的后一个分块以前一个分块末尾的行开头，不跨章节重叠"""
+    chunks = _chunks(tmp_path, budget=60, overlap=30)
+    state = [chunk for chunk in chunks if chunk['metadata']['section_path'] == _path("ViewModel 指南", "状态")]
+    assert len(state) > 1
+    for previous, chunk in zip(state, state[1:]):
+        first_line = chunk['content'].splitlines()[0]
+        assert first_line in previous['content']
+        assert chunk['metadata']['char_start'] < previous['metadata']['char_end']
+
+    # “示例”章节的第一个分块不带上一章节末尾的内容
+    example = [chunk for chunk in chunks if chunk['metadata']['section_path'].endswith("示例")]
+    assert example[0]['content'].startswith("### 示例")
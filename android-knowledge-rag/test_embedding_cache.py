@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+嵌入向量磁盘缓存测试脚本
+
+覆盖命中与未命中、段文件的持久化和重新加载、最久未使用淘汰与压缩，以及多个进程同时写入
+同一缓存目录时互不覆盖（flush 在文件锁内与磁盘上的索引合并）。
+
+用法: pytest test_embedding_cache.py
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
+DIMENSION = 8
+WRITER_PROCESSES = 4
+WRITER_ROUNDS = 5
+WRITER_KEYS = 20
+
+# 子进程：分多轮写入本进程的键和所有进程共享的键，每轮 flush 一次
+_WRITER = """
+import sys
+import numpy as np
+sys.path.append(sys.argv[1])
+from embedding_cache import EmbeddingCache
+writer, rounds, count = int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+for round_index in range(rounds):
+    cache = EmbeddingCache(sys.argv[2])
+    keys = [f"w{writer}-{round_index}-{i}" for i in range(count)] + [f"shared-{i}" for i in range(count)]
+    cache.put_many(keys, [np.full(8, hash(key) % 1000, dtype=np.float32) for key in keys])
+    cache.flush()
+"""
+
+
+def _vector(key: str) -> np.ndarray:
+    seed = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=DIMENSION).astype(np.float32)
+
+
+def _put(cache: EmbeddingCache, keys):
+    cache.put_many(list(keys), [_vector(key) for key in keys])
+
+
+def _segment_files(cache_dir: Path):
+    return sorted(path.stem for path in (cache_dir / "segments").glob("*.npy"))
+
+
+def test_cache_key_normalization():
+    """NFC规范化和首尾空白不影响缓存键，模型标识不同时缓存键不同"""
+    assert embedding_cache_key("model", "Café ") == embedding_cache_key("model", "Café")
+    assert embedding_cache_key("model", "Café") != embedding_cache_key("other", "Café")
+    assert embedding_cache_key("model", "a b") != embedding_cache_key("model", "ab")
+
+
+def test_hit_and_miss(tmp_path):
+    """未写出的向量和重新加载后的向量都能命中，统计命中和未命中次数"""
+    cache = EmbeddingCache(tmp_path)
+    assert cache.get_many(["a", "b"]) == [None, None]
+
+    _put(cache, ["a", "b"])
+    cached = cache.get_many(["a", "c", "b"])
+    assert cached[1] is None
+    np.testing.assert_array_equal(cached[0], _vector("a"))
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    cache.flush()
+    reopened = EmbeddingCache(tmp_path)
+    assert len(reopened) == 2
+    for key, vector in zip(["b", "a"], reopened.get_many(["b", "a"])):
+        np.testing.assert_array_equal(vector, _vector(key))
+    assert reopened.stats()['hits'] == 2
+
+
+def test_segments_persist(tmp_path):
+    """每次 flush 写出一个只追加的段，已缓存的键不再写入，重新加载后读取所有段"""
+    cache = EmbeddingCache(tmp_path)
+    _put(cache, [f"first-{i}" for i in range(5)])
+    cache.flush()
+    first_segments = _segment_files(tmp_path)
+    assert len(first_segments) == 1
+
+    _put(cache, [f"first-{i}" for i in range(5)] + [f"second-{i}" for i in range(3)])
+    cache.flush()
+    segments = _segment_files(tmp_path)
+    assert len(segments) == 2 and first_segments[0] in segments
+
+    index = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert sorted(index['segments'].values()) == [3, 5]
+
+    # 只刷新最近使用时间的 flush 不写出新段
+    reopened = EmbeddingCache(tmp_path)
+    keys = [f"first-{i}" for i in range(5)] + [f"second-{i}" for i in range(3)]
+    for key, vector in zip(keys, reopened.get_many(keys)):
+        np.testing.assert_array_equal(vector, _vector(key))
+    reopened.flush()
+    assert _segment_files(tmp_path) == segments
+
+
+def test_eviction_and_compaction(tmp_path):
+    """超出上限时淘汰最久未使用的条目，失效的行过多时压缩为一个段并删除旧段"""
+    cache = EmbeddingCache(tmp_path, max_entries=10)
+    old_keys = [f"old-{i}" for i in range(10)]
+    _put(cache, old_keys)
+    cache.flush()
+
+    cache = EmbeddingCache(tmp_path, max_entries=10)
+    new_keys = [f"new-{i}" for i in range(9)]
+    _put(cache, new_keys)
+    # 最近使用时间晚于新写入的键
+    time.sleep(0.01)
+    cache.get_many(old_keys[:3])
+    # 19 个条目淘汰到 9 个（上限再留出 10% 的余量），10 行失效，超过一半时压缩
+    cache.flush()
+
+    reopened = EmbeddingCache(tmp_path, max_entries=10)
+    assert len(reopened) == 9
+    cached = dict(zip(old_keys + new_keys, reopened.get_many(old_keys + new_keys)))
+    assert all(cached[key] is not None for key in old_keys[:3])
+    assert all(cached[key] is None for key in old_keys[3:])
+    assert sum(cached[key] is not None for key in new_keys) == 6
+    for key, vector in cached.items():
+        if vector is not None:
+            np.testing.assert_array_equal(vector, _vector(key))
+
+    index = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert list(index['segments'].values()) == [9]
+    assert _segment_files(tmp_path) == sorted(index['segments'])
+
+
+def test_stale_instance_merges(tmp_path):
+    """两个实例先后 flush 时合并磁盘上的索引，不覆盖对方写入的向量"""
+    first = EmbeddingCache(tmp_path)
+    second = EmbeddingCache(tmp_path)
+    _put(first, ["a", "shared"])
+    _put(second, ["b", "shared"])
+    first.flush()
+    second.flush()
+
+    reopened = EmbeddingCache(tmp_path)
+    assert len(reopened) == 3
+    for key, vector in zip(["a", "b", "shared"], reopened.get_many(["a", "b", "shared"])):
+        np.testing.assert_array_equal(vector, _vector(key))
+
+
+def test_concurrent_processes(tmp_path):
+    """多个进程同时多轮写入同一缓存目录，所有键都保留，段文件与索引一致"""
+    src = str(Path(__file__).parent / "src")
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    writers = [
+        subprocess.Popen([sys.executable, "-c", _WRITER, src, str(tmp_path), str(writer), str(WRITER_ROUNDS),
+                          str(WRITER_KEYS)], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for writer in range(WRITER_PROCESSES)
+    ]
+    for writer in writers:
+        _, stderr = writer.communicate(timeout=120)
+        assert writer.returncode == 0, stderr
+
+    cache = EmbeddingCache(tmp_path)
+    expected = [f"w{writer}-{round_index}-{i}" for writer in range(WRITER_PROCESSES)
+                for round_index in range(WRITER_ROUNDS) for i in range(WRITER_KEYS)]
+    expected += [f"shared-{i}" for i in range(WRITER_KEYS)]
+    assert len(cache) == len(expected)
+    assert all(vector is not None for vector in cache.get_many(expected))
+
+    index = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert _segment_files(tmp_path) == sorted(index['segments'])
+    assert not list((tmp_path / "segments").glob("*.tmp"))
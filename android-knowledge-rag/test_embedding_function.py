@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+ChromaDB嵌入函数注册测试脚本
+
+集合配置中记录的是本项目的嵌入引擎，另一个进程重新打开集合后写入、更新和检索都不会构造
+ChromaDB内置的 SentenceTransformerEmbeddingFunction（离线时会反复重试下载模型）。
+
+建库和重新打开分别在独立的子进程中运行，使用临时数据目录，不影响现有索引。
+
+用法: python test_embedding_function.py
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+DIMENSION = 32
+
+builtin_constructed = []
+
+
+def _refuse_builtin(self, *args, **kwargs):
+    builtin_constructed.append((args, kwargs))
+    raise RuntimeError("不应构造ChromaDB内置的嵌入函数")
+
+
+def _hash_encode(self, texts):
+    """按文本哈希生成的确定性单位向量，测试不需要加载模型"""
+    import numpy as np
+
+    vectors = np.array([
+        np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)[:DIMENSION]
+        for text in texts
+    ], dtype=np.float32) + 1.0
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _document(chunk_id, content):
+    return {
+        'content': content,
+        'metadata': {'chunk_id': chunk_id, 'file_path': f"{chunk_id}.md", 'granularity': "section"},
+    }
+
+
+def _open_vector_store():
+    """在子进程中打开临时数据目录的集合，禁止构造内置嵌入函数"""
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    from embedding_engine import EmbeddingEngine
+    from vector_store import VectorStore
+
+    SentenceTransformerEmbeddingFunction.__init__ = _refuse_builtin
+    EmbeddingEngine.encode = _hash_encode
+    return VectorStore(backend="chroma")
+
+
+def build_collection():
+    """第一个进程：创建集合并写入文档"""
+    vector_store = _open_vector_store()
+    vector_store.upsert_documents([_document("a", "Activity 生命周期"), _document("b", "Fragment 事务")])
+
+
+def reopen_collection():
+    """第二个进程：重新打开集合，写入、更新和检索"""
+    from embedding_engine import EMBEDDING_FUNCTION_NAME, get_embedding_engine
+
+    vector_store = _open_vector_store()
+    configuration = vector_store.collection.configuration_json['embedding_function']
+    assert configuration['name'] == EMBEDDING_FUNCTION_NAME, configuration
+
+    # 写入、只更新元数据、检索都不应构造内置嵌入函数
+    vector_store.upsert_documents([_document("c", "Service 绑定")])
+    vector_store.update_metadatas(["a"], [{'chunk_id': "a", 'file_path': "a.md", 'granularity': "section"}])
+    vector_store.search("Activity", mode="vector", coarse_top_files=0, min_similarity=-1.0)
+
+    # 不传入嵌入函数打开集合（如其他工具），ChromaDB按集合配置构造嵌入函数，得到的是共享的嵌入引擎
+    collection = vector_store.client.get_collection(name=vector_store.collection_name)
+    assert collection.configuration['embedding_function'] is get_embedding_engine()
+    collection.upsert(ids=["d"], documents=["BroadcastReceiver 注册"])
+    assert collection.count() == 4
+
+    assert not builtin_constructed, builtin_constructed
+
+
+def _run_step(step, data_dir):
+    env = dict(os.environ, ANDROID_KNOWLEDGE_DATA_DIR=data_dir)
+    return subprocess.run([sys.executable, __file__, step], env=env, capture_output=True, text=True)
+
+
+def test_reopened_collection_uses_engine():
+    """另一个进程重新打开的集合按名称解析为进程内共享的嵌入引擎"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        for step in ("build", "reopen"):
+            result = _run_step(step, data_dir)
+            assert result.returncode == 0, f"{step} 失败:\n{result.stdout}\n{result.stderr}"
+
+
+def main():
+    """主函数"""
+    steps = {'build': build_collection, 'reopen': reopen_collection}
+    if len(sys.argv) > 1:
+        steps[sys.argv[1]]()
+        return True
+
+    print("🚀 ChromaDB嵌入函数注册测试")
+    print("=" * 50)
+
+    try:
+        test_reopened_collection_uses_engine()
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return False
+
+    print("\n🎊 重新打开的集合始终使用共享的嵌入引擎")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+平面向量索引测试脚本
+
+随机写入、覆盖、更新元数据和删除后，检索结果与按同样操作维护的暴力余弦（以及 l2、ip）计算一致；
+元数据过滤、重新打开索引和批量写入的提交语义也与逐次写入相同。
+
+用法: pytest test_flat_index.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from flat_index import FlatIndex
+
+DIMENSION = 24
+TOP_K = 7
+
+
+class BruteForce:
+    """按ID保存原始向量和元数据的参照实现"""
+
+    def __init__(self, space: str):
+        self.space = space
+        self.rows = {}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        for doc_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            self.rows[doc_id] = (document, dict(metadata), np.asarray(embedding, dtype=np.float64))
+
+    def update(self, ids, metadatas):
+        for doc_id, metadata in zip(ids, metadatas):
+            if doc_id in self.rows:
+                document, _, embedding = self.rows[doc_id]
+                self.rows[doc_id] = (document, dict(metadata), embedding)
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.rows.pop(doc_id, None)
+
+    def distance(self, query, embedding):
+        if self.space == 'cosine':
+            return 1.0 - query @ embedding / (np.linalg.norm(query) * np.linalg.norm(embedding))
+        if self.space == 'ip':
+            return 1.0 - query @ embedding
+        return float(np.sum((query - embedding) ** 2))
+
+    def query(self, query, n_results, component=None):
+        query = np.asarray(query, dtype=np.float64)
+        scored = sorted(
+            (self.distance(query, embedding), doc_id)
+            for doc_id, (_, metadata, embedding) in self.rows.items()
+            if component is None or metadata['component'] == component
+        )[:n_results]
+        return [doc_id for _, doc_id in scored], [distance for distance, _ in scored]
+
+
+def _documents(rng, start, count):
+    ids = [f"doc-{i}" for i in range(start, start + count)]
+    metadatas = [{'component': ("Activity", "Fragment", "ViewModel")[i % 3], 'position': i}
+                 for i in range(start, start + count)]
+    # 不归一化，l2 和 ip 距离依赖原始范数
+    embeddings = rng.normal(size=(count, DIMENSION)).astype(np.float32) * rng.uniform(0.5, 2.0, size=(count, 1))
+    return ids, [f"内容 {doc_id}" for doc_id in ids], metadatas, embeddings
+
+
+def _apply(index, reference, rng):
+    """写入、覆盖、更新元数据和删除，索引与参照实现执行相同的操作"""
+    for start in (0, 40, 80):
+        batch = _documents(rng, start, 40)
+        index.upsert(*batch)
+        reference.upsert(*batch)
+
+    # 覆盖已有ID（内容和向量都变化），批次内重复的ID以最后一次为准
+    ids, documents, metadatas, embeddings = _documents(rng, 20, 30)
+    ids[-1] = ids[0]
+    index.upsert(ids, documents, metadatas, embeddings)
+    reference.upsert(ids, documents, metadatas, embeddings)
+
+    updated_ids = [f"doc-{i}" for i in range(100, 110)] + ["missing"]
+    updated = [{'component': "Service", 'position': -1} for _ in updated_ids]
+    index.update(updated_ids, updated)
+    reference.update(updated_ids, updated)
+
+    removed = [f"doc-{i}" for i in range(0, 120, 7)] + ["missing"]
+    index.delete(removed)
+    reference.delete(removed)
+
+
+def _assert_matches(index, reference, queries, where=None, component=None):
+    results = index.query(queries, n_results=TOP_K, where=where)
+    for row, query in enumerate(queries):
+        expected_ids, expected_distances = reference.query(query, TOP_K, component)
+        assert results['ids'][row] == expected_ids
+        np.testing.assert_allclose(results['distances'][row], expected_distances, rtol=1e-4, atol=1e-4)
+        for doc_id, metadata, document in zip(results['ids'][row], results['metadatas'][row],
+                                              results['documents'][row]):
+            assert (document, metadata) == reference.rows[doc_id][:2]
+
+
+@pytest.mark.parametrize("space", ['cosine', 'l2', 'ip'])
+def test_matches_brute_force(tmp_path, space):
+    """写入、覆盖、更新和删除后的检索结果与暴力计算一致"""
+    rng = np.random.default_rng(7)
+    index = FlatIndex(tmp_path / "flat_index", dtype='float32', space=space)
+    reference = BruteForce(space)
+    _apply(index, reference, rng)
+
+    assert index.count() == len(reference.rows)
+    assert sorted(index.get(include=())['ids']) == sorted(reference.rows)
+    _assert_matches(index, reference, rng.normal(size=(5, DIMENSION)))
+
+
+def test_where_filter(tmp_path):
+    """元数据过滤只在满足条件的行中检索，结果数不超过满足条件的行数"""
+    rng = np.random.default_rng(11)
+    index = FlatIndex(tmp_path / "flat_index", dtype='float32')
+    reference = BruteForce('cosine')
+    _apply(index, reference, rng)
+
+    queries = rng.normal(size=(4, DIMENSION))
+    for component in ("Activity", "Service"):
+        _assert_matches(index, reference, queries, where={'component': component}, component=component)
+
+    results = index.query(queries[:1], n_results=TOP_K, where={'component': "Nothing"})
+    assert results['ids'] == [[]]
+    results = index.query(queries[:1], n_results=100, where={'component': "Service"})
+    assert len(results['ids'][0]) == sum(meta['component'] == "Service" for _, meta, _ in reference.rows.values())
+
+
+def test_persistence_round_trip(tmp_path):
+    """重新打开的索引与写入的实例内容相同，另一个实例的提交在下一次读取时可见"""
+    rng = np.random.default_rng(3)
+    path = tmp_path / "flat_index"
+    index = FlatIndex(path, dtype='float32')
+    reference = BruteForce('cosine')
+    _apply(index, reference, rng)
+
+    reopened = FlatIndex(path, dtype='float32')
+    queries = rng.normal(size=(3, DIMENSION))
+    _assert_matches(reopened, reference, queries)
+    stored = reopened.get(ids=["doc-1", "doc-44"], include=['embeddings'])
+    np.testing.assert_allclose(stored['embeddings'], [reference.rows[doc_id][2] for doc_id in stored['ids']],
+                               rtol=1e-5, atol=1e-5)
+
+    batch = _documents(rng, 500, 5)
+    index.upsert(*batch)
+    reference.upsert(*batch)
+    assert reopened.count() == len(reference.rows)
+    _assert_matches(reopened, reference, queries)
+
+    # 只保留当前版本的向量文件
+    assert len(list(path.glob("vectors-*.npy"))) == 1
+
+    index.reset()
+    assert FlatIndex(path).count() == 0
+
+
+def test_batch_commits_once(tmp_path):
+    """批量写入期间本实例可见、其他实例不可见，退出时提交；异常退出时丢弃"""
+    rng = np.random.default_rng(5)
+    path = tmp_path / "flat_index"
+    index = FlatIndex(path, dtype='float32')
+    reader = FlatIndex(path, dtype='float32')
+    reference = BruteForce('cosine')
+
+    with index.batch():
+        _apply(index, reference, rng)
+        assert index.count() == len(reference.rows)
+        assert reader.count() == 0
+    assert reader.count() == len(reference.rows)
+    _assert_matches(reader, reference, rng.normal(size=(3, DIMENSION)))
+
+    with pytest.raises(RuntimeError):
+        with index.batch():
+            index.delete(list(reference.rows))
+            assert index.count() == 0
+            raise RuntimeError("中断")
+    assert index.count() == reader.count() == len(reference.rows)
+
+
+@pytest.mark.parametrize("dtype", ['float16', 'int8'])
+def test_quantized_storage(tmp_path, dtype):
+    """量化存储的距离误差很小，最近邻与精确结果基本一致"""
+    rng = np.random.default_rng(13)
+    index = FlatIndex(tmp_path / "flat_index", dtype=dtype)
+    reference = BruteForce('cosine')
+    _apply(index, reference, rng)
+
+    queries = rng.normal(size=(20, DIMENSION))
+    results = index.query(queries, n_results=TOP_K)
+    overlap = 0
+    for row, query in enumerate(queries):
+        expected_ids, expected_distances = reference.query(query, TOP_K)
+        overlap += len(set(results['ids'][row]) & set(expected_ids))
+        np.testing.assert_allclose(results['distances'][row], expected_distances, atol=0.02)
+    assert overlap >= 0.9 * TOP_K * len(queries)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+索引代测试脚本
+
+覆盖创建、校验、激活和垃圾回收：名称按创建时间排序、保留最新的代和当前代、
+临时代只在创建进程退出后回收，以及多个粒度的分块向量相同（距离并列）时校验仍然通过。
+
+用法: pytest test_generations.py
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from config import INDEX_VERSION_PATH
+from document_processor import DocumentProcessor
+from generations import (
+    IndexGeneration, SCRATCH_MARKER, activate_generation, collect_garbage, create_generation, current_generation,
+    pointer_signature, published_here, scratch_generation, validate_generation
+)
+from indexer import sync_generation
+from manifest import IndexManifest
+from vector_store import VectorStore
+
+
+def _knowledge_tree(root: Path):
+    """只有一段文本的小知识库：各粒度的分块内容相同，向量也相同"""
+    (root / "components" / "demo").mkdir(parents=True)
+    (root / "components" / "demo" / "guide.md").write_text("Activity 生命周期回调 onCreate onStart", encoding="utf-8")
+    (root / "core").mkdir()
+    (root / "core" / "rules.md").write_text("核心规则", encoding="utf-8")
+    roots = {"core": root / "core", "components": root / "components"}
+    return DocumentProcessor(workers=1, roots=roots), list(roots.values())
+
+
+def test_activate_generation(data_dir):
+    """激活后 CURRENT 指向新的一代，索引版本随之更新"""
+    assert current_generation() == IndexGeneration.legacy()
+    assert pointer_signature() is None
+
+    generation = create_generation()
+    assert current_generation() == IndexGeneration.legacy()
+    assert not INDEX_VERSION_PATH.exists()
+
+    activate_generation(generation)
+    assert current_generation() == generation
+    assert published_here(pointer_signature())
+    version = INDEX_VERSION_PATH.read_text(encoding="utf-8")
+
+    # 重新发布同一代（原地更新）同样更新指针签名和索引版本
+    signature = pointer_signature()
+    activate_generation(generation)
+    assert current_generation() == generation
+    assert pointer_signature() != signature
+    assert INDEX_VERSION_PATH.read_text(encoding="utf-8") != version
+
+
+def test_generation_names_sort_by_creation(data_dir):
+    """连续创建的代名称互不相同，按名称排序即按创建顺序"""
+    names = [create_generation().name for _ in range(20)]
+    assert len(set(names)) == len(names)
+    assert sorted(names) == names
+
+
+def test_collect_garbage_keeps_newest_and_current(data_dir):
+    """保留最新的 keep 代，较旧的当前代也不删除"""
+    generations = [create_generation() for _ in range(5)]
+    activate_generation(generations[0])
+
+    removed = collect_garbage(keep=2)
+
+    assert sorted(removed) == [generation.name for generation in generations[1:3]]
+    assert [generation.root.exists() for generation in generations] == [True, False, False, True, True]
+    assert current_generation() == generations[0]
+
+
+def test_collect_garbage_skips_scratch_in_use(data_dir):
+    """使用中的临时代不删除也不计入 keep，创建进程已退出的临时代被删除"""
+    activate_generation(create_generation())
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    dead = create_generation()
+    (dead.root / SCRATCH_MARKER).write_text(str(finished.pid), encoding="utf-8")
+
+    with scratch_generation() as scratch:
+        assert (scratch.root / SCRATCH_MARKER).exists()
+        newest = create_generation()
+        activate_generation(newest)
+
+        removed = collect_garbage(keep=1)
+
+        assert scratch.root.exists()
+        assert dead.name in removed
+        assert scratch.name not in removed
+        assert current_generation() == newest
+    assert not scratch.root.exists()
+
+
+def test_validate_generation_reports_problems(data_dir, hash_embeddings, tmp_path):
+    """集合分块数与清单不一致时校验失败"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    result = sync_generation(processor, knowledge_dirs, reset=True)
+    assert result['activated'], result['problems']
+
+    vector_store = VectorStore(generation=result['generation'])
+    try:
+        manifest = IndexManifest(result['generation'].manifest_path)
+        assert validate_generation(vector_store, manifest) == []
+
+        chunk_ids = manifest.get(manifest.paths()[0])['chunk_ids']
+        vector_store.delete_documents(chunk_ids[:1])
+        problems = validate_generation(vector_store, manifest)
+        assert problems and "清单" in problems[0]
+    finally:
+        vector_store.close()
+
+
+def test_rebuild_with_tied_vectors(data_dir, hash_embeddings, tmp_path):
+    """各粒度的分块向量完全相同时，无论HNSW返回哪个分块，重复重建都能通过校验并激活"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    previous = None
+    for _ in range(4):
+        result = sync_generation(processor, knowledge_dirs, reset=True)
+        assert result['problems'] == []
+        assert result['activated']
+        assert current_generation() == result['generation'] != previous
+        previous = result['generation']
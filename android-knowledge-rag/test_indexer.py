@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+增量索引测试脚本
+
+对比索引清单检测新增、修改和删除的文件：未变化（或只被touch）的文件不重新分块和嵌入，
+修改的文件只写入内容变化的分块，删除的文件的分块从集合和清单中移除。
+
+用法: pytest test_indexer.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from document_processor import DocumentProcessor
+from generations import current_generation
+from indexer import KnowledgeIndexer, sync_generation
+from manifest import IndexManifest
+from vector_store import VectorStore
+
+GUIDE = "# ViewModel\n\n## 作用域\n\nviewModelScope 随 ViewModel 清除而取消。\n\n## 状态\n\n用 StateFlow 暴露界面状态。\n"
+
+
+def _knowledge_tree(root: Path):
+    (root / "components" / "viewmodel").mkdir(parents=True)
+    (root / "components" / "viewmodel" / "ViewModel.md").write_text(GUIDE, encoding="utf-8")
+    (root / "components" / "flow").mkdir(parents=True)
+    (root / "components" / "flow" / "Flow.md").write_text("# Flow\n\n冷流在收集时才执行。\n", encoding="utf-8")
+    roots = {"components": root / "components"}
+    return DocumentProcessor(workers=1, roots=roots), list(roots.values())
+
+
+class _Sync:
+    """全量构建一代后，在该代上逐次增量同步"""
+
+    def __init__(self, processor, knowledge_dirs):
+        self.processor = processor
+        self.knowledge_dirs = knowledge_dirs
+        result = sync_generation(processor, knowledge_dirs, reset=True)
+        assert result['activated'], result['problems']
+        self.vector_store = VectorStore(generation=current_generation())
+        self.manifest = IndexManifest(current_generation().manifest_path)
+
+    def __call__(self, paths=None):
+        indexer = KnowledgeIndexer(self.processor, self.vector_store, self.manifest)
+        summary = indexer.sync(self.knowledge_dirs, paths=paths)
+        self.manifest = indexer.manifest
+        return summary
+
+    def assert_consistent(self):
+        """集合中的分块正好是清单记录的分块，词法索引与集合一致"""
+        expected = {chunk_id for path in self.manifest.paths() for chunk_id in self.manifest.get(path)['chunk_ids']}
+        assert set(self.vector_store.iter_ids()) == expected
+        lexical_index = self.vector_store._get_lexical_index()
+        assert set(lexical_index.doc_ids) == expected
+
+
+def test_unchanged_files_are_skipped(data_dir, hash_embeddings, tmp_path, monkeypatch):
+    """修改时间和大小未变化时不读取文件，只被touch的文件按内容哈希判断为未变化"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    sync = _Sync(processor, knowledge_dirs)
+    loaded = []
+    load_file = processor.load_file
+    monkeypatch.setattr(processor, "load_file", lambda file_path: loaded.append(file_path) or load_file(file_path))
+    try:
+        changes = KnowledgeIndexer(processor, sync.vector_store, sync.manifest).scan_changes(knowledge_dirs)
+        assert changes == {'changed': [], 'removed': [], 'unchanged': 2, 'consistent': True}
+
+        summary = sync()
+        assert (summary['added'], summary['updated'], summary['removed'], summary['unchanged']) == (0, 0, 0, 2)
+        assert summary['chunks_upserted'] == summary['chunks_deleted'] == summary['chunks_kept'] == 0
+        assert loaded == []
+
+        path = tmp_path / "components" / "flow" / "Flow.md"
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        summary = sync()
+        assert (summary['updated'], summary['unchanged']) == (0, 2)
+        assert summary['chunks_upserted'] == summary['chunks_kept'] == 0
+        assert loaded == [path]
+        assert sync.manifest.get("components/flow/Flow.md")['mtime_ns'] == path.stat().st_mtime_ns
+        sync.assert_consistent()
+    finally:
+        sync.vector_store.close()
+
+
+def test_add_modify_delete(data_dir, hash_embeddings, tmp_path):
+    """新增、修改和删除的文件被检测到，修改的文件只嵌入变化的分块"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    sync = _Sync(processor, knowledge_dirs)
+    try:
+        guide = tmp_path / "components" / "viewmodel" / "ViewModel.md"
+        old_ids = set(sync.manifest.get("components/viewmodel/ViewModel.md")['chunk_ids'])
+        guide.write_text(GUIDE.replace("用 StateFlow 暴露界面状态。", "用 StateFlow 暴露只读的界面状态。"),
+                         encoding="utf-8")
+        added = tmp_path / "components" / "fragment" / "Fragment.md"
+        added.parent.mkdir()
+        added.write_text("# Fragment\n\n视图生命周期短于 Fragment 本身。\n", encoding="utf-8")
+        (tmp_path / "components" / "flow" / "Flow.md").unlink()
+
+        changes = KnowledgeIndexer(processor, sync.vector_store, sync.manifest).scan_changes(knowledge_dirs)
+        assert sorted(changes['changed']) == ["components/fragment/Fragment.md", "components/viewmodel/ViewModel.md"]
+        assert changes['removed'] == ["components/flow/Flow.md"]
+
+        summary = sync()
+        assert (summary['added'], summary['updated'], summary['removed']) == (1, 1, 1)
+        assert sync.manifest.get("components/flow/Flow.md") is None
+
+        new_ids = set(sync.manifest.get("components/viewmodel/ViewModel.md")['chunk_ids'])
+        fragment_ids = sync.manifest.get("components/fragment/Fragment.md")['chunk_ids']
+        # 未变化的分块（如“作用域”章节）只更新元数据，不重新写入和嵌入
+        assert old_ids & new_ids and old_ids - new_ids
+        assert summary['chunks_kept'] == len(old_ids & new_ids)
+        assert summary['chunks_upserted'] == len(new_ids - old_ids) + len(fragment_ids)
+        changed = sync.vector_store.collection.get(ids=list(new_ids - old_ids))['documents']
+        assert all("只读的界面状态" in document for document in changed)
+        sync.assert_consistent()
+    finally:
+        sync.vector_store.close()
+
+
+def test_sync_only_given_paths(data_dir, hash_embeddings, tmp_path):
+    """只同步指定文件时，其他文件的变化不处理；指定的文件已删除时从索引中移除"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    sync = _Sync(processor, knowledge_dirs)
+    try:
+        guide = tmp_path / "components" / "viewmodel" / "ViewModel.md"
+        guide.write_text(GUIDE + "\n## 保存状态\n\nSavedStateHandle 在进程重建后恢复。\n", encoding="utf-8")
+        flow = tmp_path / "components" / "flow" / "Flow.md"
+        flow.unlink()
+
+        summary = sync(paths=[guide])
+        assert (summary['updated'], summary['removed']) == (1, 0)
+        assert sync.manifest.get("components/flow/Flow.md") is not None
+
+        summary = sync(paths=[flow])
+        assert (summary['updated'], summary['removed']) == (0, 1)
+        assert sync.manifest.paths() == ["components/viewmodel/ViewModel.md"]
+        sync.assert_consistent()
+    finally:
+        sync.vector_store.close()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+词法检索测试脚本
+
+覆盖中文单字加双字切分和驼峰拆分、BM25排序、增量更新与重建一致、倒数排名融合（RRF）的排序，
+以及MCP服务使用的 lexical 检索模式（只查BM25索引，不编码查询向量）。
+
+用法: pytest test_lexical_index.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from config import RRF_K, SEARCH_MODE_HYBRID, SEARCH_MODE_LEXICAL
+from document_processor import DocumentProcessor
+from indexer import sync_generation
+from lexical_index import BM25Index, tokenize
+from search_filters import SearchFilter
+from vector_store import VectorStore
+
+DOCUMENTS = [
+    {'id': "lifecycle", 'content': "Activity 生命周期回调：onCreate 之后是 onStart",
+     'metadata': {'component': "Activity"}},
+    {'id': "scattered", 'content': "生成命令，周末的期限", 'metadata': {'component': "Other"}},
+    {'id': "flow", 'content': "StateFlow 配合 repeatOnLifecycle 收集数据", 'metadata': {'component': "Flow"}},
+    {'id': "viewmodel", 'content': "ViewModel 在配置变更后保留数据，生命周期比 Activity 长",
+     'metadata': {'component': "ViewModel"}},
+]
+
+
+def _build(documents=DOCUMENTS):
+    index = BM25Index()
+    index.build(documents)
+    return index
+
+
+def test_tokenize_cjk_bigrams():
+    """中文按单字和相邻双字切分，不需要词典"""
+    assert tokenize("生命周期") == ["生", "命", "周", "期", "生命", "命周", "周期"]
+    assert tokenize("协程") == ["协", "程", "协程"]
+    assert tokenize("栈") == ["栈"]
+
+
+def test_tokenize_identifiers():
+    """ASCII标识符保留完整小写形式，驼峰和下划线命名再拆出子词"""
+    assert tokenize("StateFlow") == ["stateflow", "state", "flow"]
+    assert tokenize("repeatOnLifecycle") == ["repeatonlifecycle", "repeat", "on", "lifecycle"]
+    assert tokenize("MAX_SIZE 42") == ["max_size", "max", "size", "42"]
+    assert tokenize("使用StateFlow") == ["使", "用", "使用", "stateflow", "state", "flow"]
+
+
+def test_bigrams_rank_contiguous_words_first():
+    """连续出现的中文词语命中双字，排在只有零散单字命中的文档之前"""
+    ids = [result['id'] for result in _build().search("生命周期", top_k=10)]
+    assert ids[:2] == ["lifecycle", "viewmodel"]
+    assert ids[-1] == "scattered"
+
+
+def test_exact_api_name_and_where():
+    """API名称精确命中，where 条件过滤结果"""
+    index = _build()
+    assert index.contains_term("stateflow")
+    assert [result['id'] for result in index.search("StateFlow", top_k=3)][0] == "flow"
+    results = index.search("生命周期", top_k=10, where={'component': {'$in': ["ViewModel", "Other"]}})
+    assert [result['id'] for result in results] == ["viewmodel", "scattered"]
+    assert index.search("蓝牙", top_k=3) == []
+
+
+def test_update_matches_rebuild(tmp_path):
+    """增量更新（替换、删除、只改元数据、新增）后的检索结果与重建一致，保存后重新加载不变"""
+    index = _build()
+    replaced = {'id': "flow", 'content': "SharedFlow 没有初始值", 'metadata': {'component': "Flow"}}
+    added = {'id': "fragment", 'content': "Fragment 的视图生命周期", 'metadata': {'component': "Fragment"}}
+    index.update([replaced, added], removed_ids=["scattered"],
+                 metadatas={'lifecycle': {'component': "Activity", 'scope': "components"}})
+
+    expected = _build([
+        {**DOCUMENTS[0], 'metadata': {'component': "Activity", 'scope': "components"}},
+        DOCUMENTS[3], replaced, added,
+    ])
+    path = tmp_path / "bm25_index.json"
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    for query in ("生命周期", "SharedFlow", "StateFlow", "Fragment 视图"):
+        results = expected.search(query, top_k=10)
+        for actual in (index, loaded):
+            assert actual.search(query, top_k=10) == pytest.approx(results)
+    assert len(index) == len(loaded) == 4
+
+
+def test_rrf_ordering():
+    """倒数排名融合：两路都靠前的结果排在只在一路出现的结果之前，向量距离保留在融合结果中"""
+    vector = [{'id': doc_id, 'distance': 0.1 * rank, 'similarity': 1 - 0.1 * rank}
+              for rank, doc_id in enumerate(["a", "b", "c"], 1)]
+    lexical = [{'id': doc_id, 'distance': None, 'score': 10.0 - rank}
+               for rank, doc_id in enumerate(["c", "a", "d"], 1)]
+
+    fused = VectorStore._fuse(vector, lexical, top_k=4)
+
+    assert [result['id'] for result in fused] == ["a", "c", "b", "d"]
+    assert fused[0]['score'] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+    assert fused[1]['distance'] == pytest.approx(0.3)
+    assert fused[3]['distance'] is None
+    assert [result['id'] for result in VectorStore._fuse(vector, lexical, top_k=2)] == ["a", "c"]
+
+
+def _knowledge_tree(root: Path):
+    (root / "components" / "flow").mkdir(parents=True)
+    (root / "components" / "flow" / "StateFlow.md").write_text(
+        "# StateFlow\n\n在界面中用 repeatOnLifecycle 收集 StateFlow。\n", encoding="utf-8")
+    (root / "components" / "activity").mkdir(parents=True)
+    (root / "components" / "activity" / "Activity.md").write_text(
+        "# Activity\n\nActivity 的生命周期回调从 onCreate 开始。\n", encoding="utf-8")
+    roots = {"components": root / "components"}
+    return DocumentProcessor(workers=1, roots=roots), list(roots.values())
+
+
+def test_lexical_mode_skips_embedding(data_dir, hash_embeddings, tmp_path, monkeypatch):
+    """MCP服务按 search(query, top_k, where, mode) 调用：lexical 模式和精确命中API名称的 hybrid 模式不编码查询"""
+    processor, knowledge_dirs = _knowledge_tree(tmp_path)
+    assert sync_generation(processor, knowledge_dirs, reset=True)['activated']
+
+    from embedding_engine import EmbeddingEngine
+
+    def refuse(self, texts):
+        raise AssertionError(f"不应编码查询: {texts}")
+
+    monkeypatch.setattr(EmbeddingEngine, "encode", refuse)
+    vector_store = VectorStore()
+    try:
+        results = vector_store.search("生命周期", 3, SearchFilter(component="Activity"), SEARCH_MODE_LEXICAL)
+        assert results
+        assert {result['metadata']['file_path'] for result in results} == {"components/activity/Activity.md"}
+        assert all(result['metadata']['granularity'] == "section" for result in results)
+
+        results = vector_store.search("生命周期", 3, SearchFilter(component="StateFlow"), SEARCH_MODE_LEXICAL)
+        assert results == []
+
+        results = vector_store.search("StateFlow", 3, None, SEARCH_MODE_HYBRID)
+        assert results[0]['metadata']['file_path'] == "components/flow/StateFlow.md"
+    finally:
+        vector_store.close()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+ONNX嵌入后端一致性测试脚本
+
+对比 torch（sentence-transformers）与 ONNX 后端对同一批文本的向量，
+要求每条文本的余弦相似度不低于 EMBEDDING_ONNX_MIN_COSINE。
+
+用法: python test_onnx_embedding.py [模型名称]
+      pytest test_onnx_embedding.py（只测试已导出的模型，未导出时跳过）
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加源代码路径
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from config import EMBEDDING_MODEL, EMBEDDING_ONNX_MIN_COSINE, KNOWLEDGE_DIRS
+from embedding_engine import EmbeddingEngine
+from onnx_embedding import (
+    OnnxEmbeddingEngine, PARITY_TEXTS, EXPORT_INFO_FILE, cosine_agreement, export_onnx_model, onnx_model_dir
+)
+
+MAX_TEXTS = 300
+
+
+def load_texts():
+    """测试文本：导出校验文本加上知识库文档中的段落"""
+    texts = list(PARITY_TEXTS)
+    for directory in KNOWLEDGE_DIRS.values():
+        for path in sorted(directory.rglob("*.md")):
+            paragraphs = path.read_text(encoding="utf-8").split("\n\n")
+            texts.extend(paragraph for paragraph in paragraphs if paragraph.strip())
+    return texts[:MAX_TEXTS]
+
+
+def check_parity(model_name, model_dir, texts):
+    """逐个模型文件对比torch和ONNX的向量"""
+    print(f"\n🔍 计算torch向量（{len(texts)} 条文本）...")
+    expected = EmbeddingEngine(model_name=model_name).encode(texts)
+
+    ok = True
+    for quantized in (False, True):
+        variant = "int8" if quantized else "float32"
+        engine = OnnxEmbeddingEngine(model_name, model_dir=model_dir, quantized=quantized)
+        if not engine.model_path.exists():
+            print(f"⏭️  {variant}: 未导出，跳过")
+            continue
+
+        agreement = cosine_agreement(expected, engine.encode(texts))
+        worst = int(agreement.argmin())
+        passed = agreement.min() >= EMBEDDING_ONNX_MIN_COSINE
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {variant}: 最低余弦相似度 {agreement.min():.6f}，"
+              f"平均 {agreement.mean():.6f}（要求 ≥ {EMBEDDING_ONNX_MIN_COSINE}）")
+        if not passed:
+            print(f"  📄 差异最大的文本: {texts[worst][:80]!r}")
+    return ok
+
+
+def test_onnx_parity():
+    """已导出的ONNX模型与torch向量一致"""
+    import pytest
+
+    model_dir = onnx_model_dir(EMBEDDING_MODEL)
+    if not (model_dir / EXPORT_INFO_FILE).exists():
+        pytest.skip(f"未导出 {EMBEDDING_MODEL} 的ONNX模型，请先执行 'python src/cli.py export-onnx'")
+    assert check_parity(EMBEDDING_MODEL, model_dir, load_texts())
+
+
+def main():
+    """主函数"""
+    print("🚀 ONNX嵌入后端一致性测试")
+    print("=" * 50)
+
+    model_name = sys.argv[1] if len(sys.argv) > 1 else EMBEDDING_MODEL
+    texts = load_texts()
+
+    # 已导出时直接测试导出的模型，否则导出到临时目录
+    model_dir = onnx_model_dir(model_name)
+    if (model_dir / EXPORT_INFO_FILE).exists():
+        ok = check_parity(model_name, model_dir, texts)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                export_onnx_model(model_name, output_dir=Path(tmp_dir))
+            except Exception as e:
+                print(f"❌ 导出失败: {e}")
+                return False
+            ok = check_parity(model_name, Path(tmp_dir), texts)
+
+    if ok:
+        print("\n🎊 ONNX后端与torch向量一致，可以设置 EMBEDDING_BACKEND = \"onnx\"")
+    else:
+        print("\n⚠️  ONNX后端与torch向量不一致，请检查导出的模型")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)